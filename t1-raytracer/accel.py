@@ -0,0 +1,853 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import math
+
+from instrument import timer
+
+
+"""
+
+Acceleration structures for World.trace.
+
+All accelerators share the interface of Accelerator: trace
+returns the nearest hit, occluded any hit closer than a
+maximum distance. Only bodies whose geometry provides finite
+bounds (geometry.Body.bounds) get organized spatially,
+unbounded geometries (planes) are tested for every ray.
+
+    BruteForce -- tests every body, best for a handful of bodies
+    Grid       -- uniform grid of cells traversed with a 3D-DDA,
+                  suits many bodies of similar size
+    BVH        -- bounding volume hierarchy, suits bodies of very
+                  different sizes (long triangles, large spheres)
+
+choose() picks one of them from the statistics of the bodies,
+build() creates it. Single bodies can be inserted and removed
+in place (e.g. when a scene file gets edited); the structure
+gets worse with every edit though, so too many edits call for
+building it again (@see Accelerator.degraded).
+
+"""
+
+
+EMSG = {
+    "overwrite": "The %s method must be overwritten."
+}
+
+EPSILON = 1e-5
+
+# replaces 1/0 for axis parallel rays in the slab test
+BIG = 1e300
+
+# boxes get enlarged by this amount to compensate
+# rounding errors of the intersection routines
+PADDING = 1e-7
+
+# share of edits relative to the bodies the structure
+# was built over after which it should be rebuilt
+REBUILD = .25
+
+
+class AcceleratorException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _area(lo, hi):
+    dx, dy, dz = hi[0] - lo[0], hi[1] - lo[1], hi[2] - lo[2]
+    return dx * dy + dy * dz + dz * dx
+
+
+def _union(boxes):
+    los, his = zip(*boxes)
+    lo = tuple(map(min, zip(*los)))
+    hi = tuple(map(max, zip(*his)))
+    return lo, hi
+
+
+def _list(seq):
+    """
+    Converts a (numpy) sequence to a list of python numbers.
+    """
+    return seq.tolist() if hasattr(seq, 'tolist') else list(seq)
+
+
+def _group(bodies, offsets, ids):
+    """
+    Splits a flat list of body ids into the lists
+    between consecutive offsets (None if empty).
+    """
+    offsets, ids = _list(offsets), _list(ids)
+    return [
+        [bodies[i] for i in ids[a:b]] if b > a else None
+        for a, b in zip(offsets, offsets[1:])]
+
+
+def _flatten(groups, ids):
+    """
+    Inverse of _group. Returns the offsets and the flat ids.
+    """
+    offsets, flat = [0], []
+    for group in groups:
+        flat.extend(ids(body) for body in group or ())
+        offsets.append(len(flat))
+    return offsets, flat
+
+
+def _classify(bodies):
+    """
+    Separates the bodies into a list of the unbounded ones
+    and a list of (body, bounds) tuples of the bounded ones.
+    The bounds get padded.
+    """
+    unbounded, bounded = [], []
+    for body in bodies:
+        bounds = body.geometry.bounds()
+        if bounds is None:
+            unbounded.append(body)
+            continue
+
+        lo, hi = bounds
+        lo = tuple(c - PADDING for c in lo)
+        hi = tuple(c + PADDING for c in hi)
+        bounded.append((body, (lo, hi)))
+    return unbounded, bounded
+
+
+class Accelerator(object):
+    """
+    Base class of all acceleration structures. Subclasses
+    implement _traverse and count the rays, the traversal
+    steps (nodes, cells...) and the intersection tests.
+    """
+
+    # name of the traversal steps in reports
+    steps = 'steps'
+
+    def __init__(self, bodies):
+        """
+        Builds the structure.
+
+        bodies -- Collection of bodies.Body instances
+        """
+        self.buildtime = 0.
+        self.rays = 0
+        self.nodes = 0
+        self.tests = 0
+
+        # bodies at build time and in place edits since
+        self.size = len(bodies)
+        self.edits = 0
+
+    def trace(self, ray, maxdist=float('inf'), exclude=None):
+        """
+        Returns the nearest body hit by the ray within
+        [EPSILON, maxdist) and the ray parameter of the
+        hit. Same semantics as World.trace.
+
+        ray     -- A geometry.Ray instance
+        maxdist -- Everything out of this range is not considered
+        exclude -- (Optional) Body that is ignored
+        """
+        return self._traverse(ray, maxdist, exclude, False)
+
+    def occluded(self, ray, maxdist=float('inf'), exclude=None):
+        """
+        Returns any body hit by the ray within [EPSILON,
+        maxdist) or None. Stops at the first hit found.
+
+        ray     -- A geometry.Ray instance
+        maxdist -- Everything out of this range is not considered
+        exclude -- (Optional) Body that is ignored
+        """
+        return self._traverse(ray, maxdist, exclude, True)[0]
+
+    def _traverse(self, ray, maxdist, exclude, anyhit):
+        msg = EMSG['overwrite'] % '_traverse'
+        raise AcceleratorException(msg)
+
+    @property
+    def degraded(self):
+        """
+        True if the structure was edited so often that
+        building it again pays off.
+        """
+        return self.edits > REBUILD * self.size
+
+    def insert(self, body):
+        """
+        Adds a body in place. Returns False if the structure
+        can not take it (and has to be built again).
+
+        body -- bodies.Body instance
+        """
+        unbounded, bounded = _classify([body])
+        if unbounded:
+            self.unbounded.append(body)
+        elif not self._insert(*bounded[0]):
+            return False
+        self.edits += 1
+        return True
+
+    def remove(self, body):
+        """
+        Removes a body in place. Returns False if the body
+        was not found (the structure has to be built again).
+
+        body -- bodies.Body instance
+        """
+        if body in self.unbounded:
+            self.unbounded.remove(body)
+        else:
+            # an unbounded body that is not in the structure
+            # has no bounds to look it up by
+            bounded = _classify([body])[1]
+            if not bounded or not self._remove(*bounded[0]):
+                return False
+        self.edits += 1
+        return True
+
+    def _insert(self, body, bounds):
+        return False
+
+    def _remove(self, body, bounds):
+        return False
+
+    def export(self, ids):
+        """
+        Returns the structure as a dictionary of flat lists
+        of numbers that can be stored in a file and passed
+        to restore. Bodies are referenced by their ids.
+
+        ids -- Function that maps a body to its id
+        """
+        return {'unbounded': [ids(body) for body in self.unbounded]}
+
+    @classmethod
+    def restore(cls, bodies, state):
+        """
+        Recreates an exported structure without building it.
+
+        bodies -- Sequence of all bodies indexed by their ids
+        state  -- Dictionary returned by export (the lists
+                  may be replaced by numpy arrays)
+        """
+        self = cls.__new__(cls)
+        Accelerator.__init__(self, bodies)
+        self.unbounded = [bodies[i] for i in _list(state['unbounded'])]
+        self._restore(bodies, state)
+        return self
+
+    def _restore(self, bodies, state):
+        pass
+
+    def _unbounded(self, ray, maxdist, exclude, anyhit):
+        """
+        Tests the unbounded bodies. Returns the nearest
+        (or, for anyhit, the first) one and its distance.
+        """
+        obj, minhit = None, maxdist
+        for elem in self.unbounded:
+            if elem is exclude:
+                continue
+            hit = elem.geometry.intersection(ray)
+            if hit and EPSILON <= hit and hit < minhit:
+                obj, minhit = elem, hit
+                if anyhit:
+                    break
+        return obj, minhit
+
+    def report(self):
+        """
+        Returns a summary of the traversal statistics.
+        """
+        rays = float(max(self.rays, 1))
+        return "%d rays, %.2f %s/ray, %.2f tests/ray" % (
+            self.rays, self.nodes / rays, self.steps, self.tests / rays)
+
+
+class BruteForce(Accelerator):
+    """
+    Tests every ray against every body.
+    """
+
+    steps = 'bodies'
+
+    def __str__(self):
+        return "brute force over %d bodies" % len(self.unbounded)
+
+    def __init__(self, bodies):
+        super(BruteForce, self).__init__(bodies)
+        self.unbounded = list(bodies)
+
+    @property
+    def degraded(self):
+        # a list does not get worse by editing
+        return False
+
+    def insert(self, body):
+        self.unbounded.append(body)
+        self.edits += 1
+        return True
+
+    def remove(self, body):
+        if body not in self.unbounded:
+            return False
+        self.unbounded.remove(body)
+        self.edits += 1
+        return True
+
+    def _traverse(self, ray, maxdist, exclude, anyhit):
+        self.rays += 1
+        self.nodes += len(self.unbounded)
+        self.tests += len(self.unbounded)
+        obj, minhit = self._unbounded(ray, maxdist, exclude, anyhit)
+        return obj, (minhit if obj is not None else None)
+
+
+class Grid(Accelerator):
+    """
+    Uniform grid over the bounds of all bounded bodies. Every
+    cell lists the bodies whose bounds overlap it. Rays walk
+    through the cells they pierce in order (3D-DDA after
+    Amanatides and Woo) and stop as soon as the nearest hit
+    lies within the cells visited so far.
+    """
+
+    # cells per body and the maximum cells per axis
+    DENSITY = 2.
+    MAXRES = 64
+
+    steps = 'cells'
+
+    def __str__(self):
+        return "Grid with %dx%dx%d cells over %d bodies (%d unbounded)" % (
+            self._res + (self._count, len(self.unbounded)))
+
+    def __init__(self, bodies):
+        super(Grid, self).__init__(bodies)
+        start = timer()
+
+        self.unbounded, bounded = _classify(bodies)
+        self._count = len(bounded)
+        self._res = (0, 0, 0)
+        self._cells = []
+        if bounded:
+            self._build(bounded)
+
+        self.buildtime = timer() - start
+
+    def _build(self, bounded):
+        lo, hi = _union([b for body, b in bounded])
+        extent = [max(h - l, PADDING) for l, h in zip(lo, hi)]
+
+        # cubic cells, about DENSITY cells per body
+        volume = extent[0] * extent[1] * extent[2]
+        side = (volume / (self.DENSITY * len(bounded))) ** (1 / 3.)
+        res = tuple(
+            max(1, min(self.MAXRES, int(math.ceil(e / side))))
+            for e in extent)
+
+        self._lo, self._hi, self._res = lo, hi, res
+        self._size = tuple(e / r for e, r in zip(extent, res))
+        self._cells = cells = [None] * (res[0] * res[1] * res[2])
+
+        for body, bounds in bounded:
+            for i in self._overlap(bounds):
+                if cells[i] is None:
+                    cells[i] = []
+                cells[i].append(body)
+
+    def _overlap(self, bounds):
+        """
+        Returns the indices of the cells the bounds overlap.
+        """
+        nx, ny = self._res[0], self._res[1]
+        x0, y0, z0 = self._cell(bounds[0])
+        x1, y1, z1 = self._cell(bounds[1])
+        return [
+            x + nx * (y + ny * z)
+            for z in range(z0, z1 + 1)
+            for y in range(y0, y1 + 1)
+            for x in range(x0, x1 + 1)]
+
+    def _insert(self, body, bounds):
+        # bodies outside of the grid would never be visited
+        lo, hi = bounds
+        if not self._count or \
+                any(l < g for l, g in zip(lo, self._lo)) or \
+                any(h > g for h, g in zip(hi, self._hi)):
+            return False
+
+        cells = self._cells
+        for i in self._overlap(bounds):
+            if cells[i] is None:
+                cells[i] = []
+            cells[i].append(body)
+        self._count += 1
+        return True
+
+    def _remove(self, body, bounds):
+        found, cells = False, self._cells
+        for i in self._overlap(bounds) if self._count else ():
+            if cells[i] is not None and body in cells[i]:
+                cells[i].remove(body)
+                cells[i] = cells[i] or None
+                found = True
+        if found:
+            self._count -= 1
+        return found
+
+    def export(self, ids):
+        state = super(Grid, self).export(ids)
+        state['count'] = [self._count]
+        if self._count:
+            state['lo'], state['hi'] = list(self._lo), list(self._hi)
+            state['res'], state['size'] = list(self._res), list(self._size)
+            state['offsets'], state['cells'] = _flatten(self._cells, ids)
+        return state
+
+    def _restore(self, bodies, state):
+        self._count = _list(state['count'])[0]
+        self._res, self._cells = (0, 0, 0), []
+        if self._count:
+            self._lo, self._hi = (tuple(_list(state['lo'])),
+                                  tuple(_list(state['hi'])))
+            self._res = tuple(_list(state['res']))
+            self._size = tuple(_list(state['size']))
+            self._cells = _group(bodies, state['offsets'], state['cells'])
+
+    def _cell(self, point):
+        return tuple(
+            min(r - 1, max(0, int((c - l) / s)))
+            for c, l, s, r in zip(point, self._lo, self._size, self._res))
+
+    def _traverse(self, ray, maxdist, exclude, anyhit):
+        self.rays += 1
+        obj, minhit = self._unbounded(ray, maxdist, exclude, anyhit)
+        if not self._count or (anyhit and obj is not None):
+            return obj, (minhit if obj is not None else None)
+
+        ox, oy, oz = ray.origin.raw
+        dx, dy, dz = ray.direction.raw
+        ix = 1. / dx if dx else BIG
+        iy = 1. / dy if dy else BIG
+        iz = 1. / dz if dz else BIG
+
+        # clip the ray to the bounds of the grid
+        lo, hi = self._lo, self._hi
+        t1, t2 = (lo[0] - ox) * ix, (hi[0] - ox) * ix
+        tmin, tmax = (t1, t2) if t1 < t2 else (t2, t1)
+        t1, t2 = (lo[1] - oy) * iy, (hi[1] - oy) * iy
+        if t1 > t2:
+            t1, t2 = t2, t1
+        tmin = t1 if t1 > tmin else tmin
+        tmax = t2 if t2 < tmax else tmax
+        t1, t2 = (lo[2] - oz) * iz, (hi[2] - oz) * iz
+        if t1 > t2:
+            t1, t2 = t2, t1
+        tmin = t1 if t1 > tmin else tmin
+        tmax = t2 if t2 < tmax else tmax
+
+        if tmin > tmax or tmax < EPSILON or tmin >= minhit:
+            return obj, (minhit if obj is not None else None)
+
+        # the cell the ray enters the grid at
+        tmin = max(tmin, 0.)
+        x, y, z = self._cell((ox + dx * tmin, oy + dy * tmin, oz + dz * tmin))
+        nx, ny, nz = self._res
+        sx, sy, sz = self._size
+
+        # step direction, ray parameter of the next cell
+        # boundary and distance between two boundaries
+        def axis(cell, o, d, inv, l, s):
+            if d > 0:
+                return 1, (l + (cell + 1) * s - o) * inv, s * inv
+            if d < 0:
+                return -1, (l + cell * s - o) * inv, -s * inv
+            return 0, float('inf'), float('inf')
+
+        stepx, nextx, deltax = axis(x, ox, dx, ix, lo[0], sx)
+        stepy, nexty, deltay = axis(y, oy, dy, iy, lo[1], sy)
+        stepz, nextz, deltaz = axis(z, oz, dz, iz, lo[2], sz)
+
+        cells, tested = self._cells, set()
+        nodes, tests = 0, 0
+        while True:
+            nodes += 1
+
+            items = cells[x + nx * (y + ny * z)]
+            if items is not None:
+                for elem in items:
+                    # bodies spanning several cells get tested once
+                    if elem is exclude or elem in tested:
+                        continue
+                    tested.add(elem)
+                    tests += 1
+                    hit = elem.geometry.intersection(ray)
+                    if hit and EPSILON <= hit and hit < minhit:
+                        obj, minhit = elem, hit
+                        if anyhit:
+                            break
+
+            # every hit closer than the exit of this cell
+            # lies within the cells visited so far
+            exit = min(nextx, nexty, nextz)
+            if (anyhit and obj is not None) or minhit <= exit:
+                break
+
+            if nextx <= nexty and nextx <= nextz:
+                x += stepx
+                if not 0 <= x < nx:
+                    break
+                nextx += deltax
+            elif nexty <= nextz:
+                y += stepy
+                if not 0 <= y < ny:
+                    break
+                nexty += deltay
+            else:
+                z += stepz
+                if not 0 <= z < nz:
+                    break
+                nextz += deltaz
+
+        self.nodes += nodes
+        self.tests += tests
+        return obj, (minhit if obj is not None else None)
+
+
+class BVH(Accelerator):
+    """
+    Bounding volume hierarchy constructed with the binned
+    surface area heuristic. The tree is stored flat: node i
+    has the bounds lo[i], hi[i] and either two children
+    (left[i], right[i]) or, if left[i] is -1, the bodies
+    in items[i].
+    """
+
+    BINS = 12
+    LEAFSIZE = 4
+
+    # relative cost of one box test compared
+    # to one body intersection test
+    TRAVERSALCOST = 0.5
+
+    steps = 'nodes'
+
+    def __str__(self):
+        return "BVH with %d nodes over %d bodies (%d unbounded)" % (
+            len(self._left), self._count, len(self.unbounded))
+
+    def __init__(self, bodies):
+        super(BVH, self).__init__(bodies)
+        start = timer()
+        self._lo, self._hi = [], []
+        self._left, self._right = [], []
+        self._axis, self._items = [], []
+
+        self.unbounded, bounded = _classify(bodies)
+        primitives = [
+            (body, (lo, hi), tuple((a + b) / 2. for a, b in zip(lo, hi)))
+            for body, (lo, hi) in bounded]
+
+        self._count = len(primitives)
+        if primitives:
+            self._build(primitives)
+
+        self.buildtime = timer() - start
+
+    def export(self, ids):
+        state = super(BVH, self).export(ids)
+        state['count'] = [self._count]
+        state['lo'] = [c for lo in self._lo for c in lo]
+        state['hi'] = [c for hi in self._hi for c in hi]
+        state['left'], state['right'] = self._left, self._right
+        state['axis'] = self._axis
+        state['offsets'], state['items'] = _flatten(self._items, ids)
+        return state
+
+    def _restore(self, bodies, state):
+        self._count = _list(state['count'])[0]
+        lo, hi = _list(state['lo']), _list(state['hi'])
+        self._lo = [tuple(lo[i:i + 3]) for i in range(0, len(lo), 3)]
+        self._hi = [tuple(hi[i:i + 3]) for i in range(0, len(hi), 3)]
+        self._left, self._right = _list(state['left']), _list(state['right'])
+        self._axis = _list(state['axis'])
+        self._items = _group(bodies, state['offsets'], state['items'])
+
+    def _insert(self, body, bounds):
+        if not self._left:
+            return False
+
+        # descend into the child whose box grows least
+        # and enlarge all boxes along the way
+        node = 0
+        while True:
+            self._lo[node], self._hi[node] = _union(
+                [(self._lo[node], self._hi[node]), bounds])
+            if self._left[node] < 0:
+                break
+
+            growth = []
+            for child in (self._left[node], self._right[node]):
+                box = (self._lo[child], self._hi[child])
+                growth.append(_area(*_union([box, bounds])) - _area(*box))
+            node = self._left[node] if growth[0] <= growth[1] \
+                else self._right[node]
+
+        self._items[node] = (self._items[node] or []) + [body]
+        self._count += 1
+        return True
+
+    def _remove(self, body, bounds):
+        lo, hi = bounds
+        stack = [0] if self._left else []
+        while stack:
+            node = stack.pop()
+            l, h = self._lo[node], self._hi[node]
+            if any(a < b for a, b in zip(lo, l)) or \
+                    any(a > b for a, b in zip(hi, h)):
+                continue
+
+            if self._left[node] >= 0:
+                stack.extend((self._left[node], self._right[node]))
+            elif body in (self._items[node] or ()):
+                # the boxes stay as they are, they still
+                # enclose all the remaining bodies
+                self._items[node] = [
+                    elem for elem in self._items[node] if elem is not body]
+                self._count -= 1
+                return True
+        return False
+
+    def _node(self, bounds):
+        self._lo.append(bounds[0])
+        self._hi.append(bounds[1])
+        self._left.append(-1)
+        self._right.append(-1)
+        self._axis.append(0)
+        self._items.append(None)
+        return len(self._left) - 1
+
+    def _split(self, primitives):
+        """
+        Searches for the cheapest partition of the primitives
+        along all three axes using binned SAH. Returns the
+        cost, the split axis and a predicate that tells if a
+        primitive belongs to the left partition.
+        """
+        centroids = [p[2] for p in primitives]
+        cmin = tuple(map(min, zip(*centroids)))
+        cmax = tuple(map(max, zip(*centroids)))
+
+        best = None
+        for axis in range(3):
+            extent = cmax[axis] - cmin[axis]
+            if extent <= 0:
+                continue
+
+            binof = self._binning(cmin[axis], extent)
+            bins = [[] for i in range(self.BINS)]
+            for p in primitives:
+                bins[binof(p[2][axis])].append(p[1])
+
+            # collapse every bin to its bounds and size
+            bins = [(_union(b), len(b)) if b else None for b in bins]
+
+            # sweep from the right to get all right side costs
+            right = [None] * self.BINS
+            boxes, count = [], 0
+            for i in range(self.BINS - 1, 0, -1):
+                if bins[i]:
+                    boxes.append(bins[i][0])
+                    count += bins[i][1]
+                if count:
+                    right[i] = _area(*_union(boxes)) * count
+
+            boxes, count = [], 0
+            for i in range(1, self.BINS):
+                if bins[i - 1]:
+                    boxes.append(bins[i - 1][0])
+                    count += bins[i - 1][1]
+                if not count or right[i] is None:
+                    continue
+
+                cost = _area(*_union(boxes)) * count + right[i]
+                if best is None or cost < best[0]:
+                    best = (cost, axis, i, binof)
+
+        if best is None:
+            return None, None, None
+
+        cost, axis, split, binof = best
+        return cost, axis, lambda p: binof(p[2][axis]) < split
+
+    def _binning(self, start, extent):
+        """
+        Returns a function that maps a centroid
+        coordinate to its bin.
+        """
+        scale = self.BINS / extent
+        last = self.BINS - 1
+        return lambda c: min(last, int((c - start) * scale))
+
+    def _build(self, primitives):
+        root = self._node(_union([p[1] for p in primitives]))
+        stack = [(root, primitives)]
+
+        while stack:
+            node, primitives = stack.pop()
+            bounds = self._lo[node], self._hi[node]
+
+            cost, axis, isleft = None, None, None
+            if len(primitives) > 1:
+                cost, axis, isleft = self._split(primitives)
+
+            leafcost = len(primitives) * _area(*bounds)
+            if cost is not None:
+                cost = self.TRAVERSALCOST * _area(*bounds) + cost
+
+            if cost is None or (len(primitives) <= self.LEAFSIZE
+                                and cost >= leafcost):
+                self._items[node] = [p[0] for p in primitives]
+                continue
+
+            left = [p for p in primitives if isleft(p)]
+            right = [p for p in primitives if not isleft(p)]
+
+            self._axis[node] = axis
+            for side, children in ((self._left, left), (self._right, right)):
+                child = self._node(_union([p[1] for p in children]))
+                side[node] = child
+                stack.append((child, children))
+
+    def _traverse(self, ray, maxdist, exclude, anyhit):
+        self.rays += 1
+        obj, minhit = self._unbounded(ray, maxdist, exclude, anyhit)
+        if anyhit and obj is not None:
+            return obj, minhit
+
+        if not self._left:
+            return obj, (minhit if obj is not None else None)
+
+        ox, oy, oz = ray.origin.raw
+        dx, dy, dz = ray.direction.raw
+        ix = 1. / dx if dx else BIG
+        iy = 1. / dy if dy else BIG
+        iz = 1. / dz if dz else BIG
+
+        lo, hi = self._lo, self._hi
+        left, right, items = self._left, self._right, self._items
+        axes, direction = self._axis, (dx, dy, dz)
+
+        nodes, tests = 0, 0
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+
+            l, h = lo[node], hi[node]
+            t1, t2 = (l[0] - ox) * ix, (h[0] - ox) * ix
+            tmin, tmax = (t1, t2) if t1 < t2 else (t2, t1)
+            t1, t2 = (l[1] - oy) * iy, (h[1] - oy) * iy
+            if t1 > t2:
+                t1, t2 = t2, t1
+            tmin = t1 if t1 > tmin else tmin
+            tmax = t2 if t2 < tmax else tmax
+            t1, t2 = (l[2] - oz) * iz, (h[2] - oz) * iz
+            if t1 > t2:
+                t1, t2 = t2, t1
+            tmin = t1 if t1 > tmin else tmin
+            tmax = t2 if t2 < tmax else tmax
+
+            if tmin > tmax or tmax < EPSILON or tmin >= minhit:
+                continue
+
+            if left[node] < 0:
+                for elem in items[node] or ():
+                    if elem is exclude:
+                        continue
+                    tests += 1
+                    hit = elem.geometry.intersection(ray)
+                    if hit and EPSILON <= hit and hit < minhit:
+                        obj, minhit = elem, hit
+                        if anyhit:
+                            stack = None
+                            break
+                if stack is None:
+                    break
+                continue
+
+            # visit the child nearer to the ray origin first,
+            # the right child holds the greater centroids
+            if direction[axes[node]] < 0:
+                stack.append(left[node])
+                stack.append(right[node])
+            else:
+                stack.append(right[node])
+                stack.append(left[node])
+
+        self.nodes += nodes
+        self.tests += tests
+
+        return obj, (minhit if obj is not None else None)
+
+
+ACCELERATORS = {
+    'bruteforce': BruteForce,
+    'grid': Grid,
+    'bvh': BVH
+}
+
+# below this number of bounded bodies testing all of
+# them is as cheap as any traversal
+BRUTEFORCE = 2
+
+# a grid only pays off for that many bounded bodies, fewer
+# ones are culled better by the boxes of a hierarchy
+GRID = 32
+
+# bodies larger than this multiple of the median size
+# would be listed in a lot of cells of a grid
+UNIFORMITY = 4.
+
+
+def choose(bodies):
+    """
+    Picks the name of the accelerator that suits the bodies
+    best: brute force for a single body, a grid for a lot of
+    bodies of roughly the same size and a hierarchy otherwise.
+
+    bodies -- Collection of bodies.Body instances
+    """
+    unbounded, bounded = _classify(bodies)
+    if len(bounded) < BRUTEFORCE:
+        return 'bruteforce'
+    if len(bounded) < GRID:
+        return 'bvh'
+
+    sizes = sorted(
+        max(h - l for l, h in zip(lo, hi)) for body, (lo, hi) in bounded)
+    if sizes[-1] <= UNIFORMITY * sizes[len(sizes) // 2]:
+        return 'grid'
+    return 'bvh'
+
+
+def build(bodies, name=None):
+    """
+    Builds an accelerator over the bodies.
+
+    bodies -- Collection of bodies.Body instances
+    name   -- (Optional) Key of ACCELERATORS; chosen
+              from the bodies if None or "auto"
+    """
+    if name is None or name == 'auto':
+        name = choose(bodies)
+    return ACCELERATORS[name](bodies)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import math
+import random
+
+from framebuffer import Framebuffer
+
+
+"""
+
+Adaptive anti-aliasing.
+
+Every pixel gets traced once through its center. Pixels that
+differ noticeably from their right or lower neighbour, or that
+show another body than their neighbour, lie on an edge. Only
+those pixels receive additional samples on a jittered (n x n)
+grid within the pixel. Their color is the mean of all samples.
+
+"""
+
+
+SAMPLES = 4
+THRESHOLD = 24
+
+
+class Antialiasing(object):
+    """
+    Adaptive supersampling of pictures. Configured by the
+    optional "antialiasing" section of the scene:
+
+        "antialiasing": {"samples": 9, "threshold": 24}
+
+    samples   -- Additional samples per edge pixel (rounded
+                 to the next square number)
+    threshold -- Color difference (0 - 255 in any channel)
+                 of neighbours that marks an edge
+    """
+
+    def __str__(self):
+        return "adaptive anti-aliasing with %d samples per edge pixel" % (
+            self.grid ** 2)
+
+    def __init__(self, samples=SAMPLES, threshold=THRESHOLD, seed=0):
+        self.grid = max(1, int(math.ceil(math.sqrt(samples))))
+        self.threshold = threshold
+        self.seed = seed
+
+        # statistics of the last picture
+        self.pixels = 0
+        self.edgecount = 0
+        self.refined = 0
+
+    def edges(self, res, colors, ids):
+        """
+        Returns the indices of all pixels that lie on an edge.
+
+        res    -- Tuple of width and height
+        colors -- Flat array of rgb values (one per pixel)
+        ids    -- Body ids (one per pixel)
+        """
+        width, height = res
+        threshold = self.threshold
+        marked = set()
+
+        def differ(a, b):
+            if ids[a] != ids[b]:
+                return True
+            a, b = a * 3, b * 3
+            return (abs(colors[a] - colors[b]) > threshold or
+                    abs(colors[a + 1] - colors[b + 1]) > threshold or
+                    abs(colors[a + 2] - colors[b + 2]) > threshold)
+
+        for y in range(height):
+            for x in range(width):
+                i = y * width + x
+                if x + 1 < width and differ(i, i + 1):
+                    marked.update((i, i + 1))
+                if y + 1 < height and differ(i, i + width):
+                    marked.update((i, i + width))
+
+        return sorted(marked)
+
+    def offsets(self, x, y):
+        """
+        Returns the jittered, stratified sample positions
+        within the pixel. The jitter only depends on the
+        pixel, so pictures are reproducible.
+        """
+        rnd = random.Random(hash((self.seed, x, y)))
+        n = self.grid
+        return [
+            (x + (i + rnd.random()) / n - .5, y + (j + rnd.random()) / n - .5)
+            for j in range(n) for i in range(n)]
+
+    def shoot(self, renderer, eye, up, framebuffer=None, limit=None):
+        """
+        Shoots an anti-aliased picture.
+
+        renderer    -- raytracer.Camera or parallel.TileRenderer
+        eye         -- Point to look from
+        up          -- The cameras tilt
+        framebuffer -- (Optional) Framebuffer instance
+        limit       -- (Optional) Callable that receives the number
+                       of edge pixels and returns how many of them
+                       may be refined (spread over the picture)
+        """
+        res = width, height = renderer.resolution
+        if framebuffer is None:
+            framebuffer = Framebuffer(res)
+
+        centers = [(x, y) for y in range(height) for x in range(width)]
+        colors, ids = renderer.shootSamples(eye, up, centers)
+
+        edges = self.edges(res, colors, ids)
+        self.edgecount = len(edges)
+        if limit is not None:
+            n = max(0, min(len(edges), limit(len(edges))))
+            edges = [edges[i * len(edges) // n] for i in range(n)]
+
+        points = []
+        for i in edges:
+            points.extend(self.offsets(*centers[i]))
+        extra, _ = renderer.shootSamples(eye, up, points)
+
+        count = self.grid ** 2
+        for n, i in enumerate(edges):
+            for c in range(3):
+                total = colors[i * 3 + c] + sum(
+                    extra[(n * count + k) * 3 + c] for k in range(count))
+                colors[i * 3 + c] = total / (count + 1)
+
+        framebuffer.raw[:] = bytes(map(int, colors))
+
+        self.pixels = width * height
+        self.refined = len(edges)
+        return framebuffer
+
+    def report(self):
+        """
+        Returns a summary of the last picture.
+        """
+        return "refined %d/%d pixels (%.1f%%) with %d samples each" % (
+            self.refined, self.pixels,
+            100. * self.refined / max(self.pixels, 1), self.grid ** 2)
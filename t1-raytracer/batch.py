@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import glob
+import math
+import json
+import argparse
+import multiprocessing as mp
+
+import instrument
+
+
+"""
+
+Batch rendering of many scene files.
+
+    ./raytracer.py batch worlds -o out --workers 8
+    ./raytracer.py batch 'worlds/*.json' -o out
+
+Every picture of every scene is a job for a pool of worker
+processes. The jobs are started longest first, so a large
+picture does not end up as the last one while the other
+workers are idle. The length of a job is estimated from its
+scene without importing it:
+
+    width * height * bodies * (recdepth + 1)
+
+A mesh counts as many bodies as the depth of its hierarchy
+(log2 of its triangles). The pictures of a scene have the
+same estimate and run one after another, so a worker usually
+prepares a scene (@see raytracer.prepare) only once for all of
+its pictures. Pictures are saved to the target directory as
+<scene>.png (or <scene>-<n>.png for scenes with several
+pictures); scenes of the same name in different directories
+get their relative path in front (<dir>-<scene>.png). A scene
+that can not be rendered (or whose pictures would overwrite
+the ones of another scene) is reported in the summary without
+stopping the others.
+
+"""
+
+
+# the scene prepared last by this worker (@see _render)
+_prepared = {}
+
+
+class Job(object):
+    """
+    One picture of a scene.
+    """
+
+    def __str__(self):
+        return "%s picture %d" % (self.scene, self.index + 1)
+
+    def __init__(self, scene, index, cost, output):
+        """
+        scene  -- File name of the json configuration
+        index  -- Position of the picture in the scene
+        cost   -- Estimated cost (@see estimate)
+        output -- File name of the picture
+        """
+        self.scene = scene
+        self.index = index
+        self.cost = cost
+        self.output = output
+
+
+class Result(object):
+    """
+    Timings of a finished (or failed) job.
+    """
+
+    def __init__(self, job, prepare=0., render=0., error=None):
+        """
+        job     -- The Job instance
+        prepare -- Seconds to import the scene (0 if the
+                   worker had it prepared already)
+        render  -- Seconds to render and save the picture
+        error   -- (Optional) Message why the job failed
+        """
+        self.job = job
+        self.prepare = prepare
+        self.render = render
+        self.error = error
+
+
+def scenes(pattern):
+    """
+    Returns the sorted file names of the json scenes
+    in a directory or matching a glob pattern.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.json')
+    return sorted(glob.glob(pattern))
+
+
+def _triangles(fname):
+    with open(fname) as f:
+        return sum(1 for line in f if line.startswith('f '))
+
+
+def estimate(config, path=''):
+    """
+    Returns the estimated cost of one picture of a scene.
+
+    config -- The parsed json configuration
+    path   -- (Optional) Directory the obj files are relative to
+    """
+    bodies = 0
+    for raw in config['bodies']:
+        if raw['type'] == 'mesh':
+            triangles = _triangles(os.path.join(path, raw['file']))
+            bodies += math.log(max(2, triangles), 2)
+        else:
+            bodies += 1
+
+    width, height = config['camera']['resolution']
+    return width * height * max(1, bodies) * (config.get('recdepth', 0) + 1)
+
+
+def jobs(fnames, target):
+    """
+    Returns the jobs of all pictures of the scenes, the
+    longest first, and a list of Results of the scenes
+    that could not be read.
+
+    fnames -- File names of the json configurations
+    target -- Directory the pictures get saved to
+    """
+    from raytracer import outputname
+
+    names = _names(fnames)
+    todo, failed, outputs = [], [], {}
+    for fname in fnames:
+        try:
+            with open(fname) as f:
+                config = json.load(f)
+            cost = estimate(config, os.path.dirname(fname))
+            count = len(config['pictures'])
+        except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+            failed.append(
+                Result(Job(fname, 0, 0, None), error=str(e) or repr(e)))
+            continue
+
+        name = os.path.join(target, names[fname] + '.png')
+        scene = [Job(fname, index, cost, outputname(name, index, count))
+                 for index in range(count)]
+
+        # e.g. the second picture of "a.json" and "a-2.json"
+        taken = [job.output for job in scene if job.output in outputs]
+        if taken:
+            failed.append(Result(Job(fname, 0, cost, None), error=(
+                '%s is written by %s' % (taken[0], outputs[taken[0]]))))
+            continue
+        outputs.update((job.output, fname) for job in scene)
+        todo.extend(scene)
+
+    todo.sort(key=_order)
+    return todo, failed
+
+
+def _names(fnames):
+    """
+    Returns the names of the pictures of the scenes (without
+    extension): the name of the scene file or, for scenes of
+    the same name in different directories, its path relative
+    to the directories of all scenes (a/task.json -> a-task).
+    """
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in fnames]
+    if not fnames:
+        return {}
+    common = os.path.commonpath(
+        [os.path.dirname(os.path.abspath(f)) for f in fnames])
+
+    names = {}
+    for fname, stem in zip(fnames, stems):
+        if stems.count(stem) > 1:
+            path = os.path.relpath(os.path.abspath(fname), common)
+            stem = os.path.splitext(path)[0].replace(os.sep, '-')
+        names[fname] = stem
+    return names
+
+
+def _order(job):
+    return (-job.cost, job.scene, job.index)
+
+
+def _init():
+    import raytracer
+    # only the main process reports
+    raytracer.VERBOSE = False
+
+
+def _render(args):
+    from raytracer import prepare
+
+    job, engine, cache = args
+    start = instrument.timer()
+    key = (job.scene, engine)
+    try:
+        if key not in _prepared:
+            _prepared.clear()
+            _prepared[key] = prepare(job.scene, engine, cache)[:3]
+        camera, positions, antialiasing = _prepared[key]
+        prepared = instrument.timer()
+
+        eye, up = positions[job.index]
+        if antialiasing is not None:
+            framebuffer = antialiasing.shoot(camera, eye, up)
+        else:
+            framebuffer = camera.shoot(eye, up)
+        framebuffer.image().save(job.output)
+    except Exception as e:
+        # a broken scene must not end the batch
+        _prepared.clear()
+        return Result(
+            job, instrument.timer() - start, error=str(e) or repr(e))
+
+    return Result(job, prepared - start, instrument.timer() - prepared)
+
+
+def _compile(fnames):
+    """
+    Compiles the missing or outdated caches of the scenes
+    before the workers start. The pictures of a scene run at
+    the same time, every worker would compile it otherwise.
+    """
+    import scenecache
+
+    for fname in fnames:
+        try:
+            if scenecache.load(fname) is None:
+                scenecache.compile(fname)
+        except Exception:
+            # reported by the jobs of the scene
+            pass
+
+
+def render(todo, workers=1, engine='scalar', cache=False):
+    """
+    Generator that renders the jobs in the given order
+    and yields their Results as they get finished.
+
+    todo    -- List of Job instances (@see jobs)
+    workers -- (Optional) Number of processes
+    engine  -- (Optional) Name of the shading engine
+    cache   -- (Optional) Use the compiled scenes
+    """
+    args = [(job, engine, cache) for job in todo]
+    if workers <= 1:
+        for arg in args:
+            yield _render(arg)
+        return
+
+    if cache:
+        _compile(sorted(set(job.scene for job in todo)))
+
+    pool = mp.Pool(workers, _init)
+    try:
+        # chunks of one job keep the longest first order
+        for result in pool.imap_unordered(_render, args, 1):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def summary(results, seconds):
+    """
+    Returns a table of the timings of all jobs.
+
+    results -- Result instances in the order of the jobs
+    seconds -- Wall-clock seconds of the whole batch
+    """
+    rows = [('scene', 'picture', 'cost', 'prepare', 'render', 'output')]
+    for result in results:
+        job = result.job
+        times = ('%.3fs' % result.prepare, '%.3fs' % result.render)
+        if result.error is not None:
+            times = ('failed', result.error)
+        rows.append((job.scene, str(job.index + 1), '%.3g' % job.cost) +
+                    times + (job.output or '',))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(5)]
+    lines = ['  '.join(cell.ljust(width) for cell, width in
+                       zip(row, widths)) + '  ' + row[5] for row in rows]
+    lines.insert(1, '-' * len(lines[0]))
+
+    done = [r for r in results if r.error is None]
+    lines.append('%d of %d pictures in %.3fs (%.3fs of work)' % (
+        len(done), len(results), seconds,
+        sum(r.prepare + r.render for r in done)))
+    return '\n'.join(line.rstrip() for line in lines)
+
+
+def main(argv=None):
+    """
+    Command line of "raytracer.py batch".
+    """
+    import raytracer
+
+    parser = argparse.ArgumentParser(
+        prog='raytracer.py batch',
+        description='Render all pictures of many scenes.')
+    parser.add_argument(
+        'scenes', help='directory or glob pattern of json scenes')
+    parser.add_argument(
+        '-o', '--output', metavar='DIR', required=True,
+        help='directory the pictures are saved to')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=mp.cpu_count(),
+        help='number of rendering processes')
+    parser.add_argument(
+        '-e', '--engine', choices=sorted(raytracer.ENGINES),
+        default='scalar', help='trace rays one by one or in numpy batches')
+    parser.add_argument(
+        '-c', '--cache', action='store_true',
+        help='load the scenes from their compiled caches')
+    args = parser.parse_args(argv)
+    raytracer.VERBOSE = True
+
+    fnames = scenes(args.scenes)
+    if not fnames:
+        parser.error('no scenes in %s' % args.scenes)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    start = instrument.timer()
+    todo, results = jobs(fnames, args.output)
+    raytracer.log('rendering %d pictures of %d scenes with %d workers' % (
+        len(todo), len(fnames), args.workers))
+
+    finished = []
+    for count, result in enumerate(
+            render(todo, args.workers, args.engine, args.cache), 1):
+        raytracer.log('%s %s (%d/%d)' % (
+            result.job, 'failed' if result.error else 'finished',
+            count, len(todo)))
+        finished.append(result)
+
+    finished.sort(key=lambda result: _order(result.job))
+    print(summary(results + finished, instrument.timer() - start))
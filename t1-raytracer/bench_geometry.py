@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import math
+import timeit
+import operator as op
+
+import geometry as gm
+
+
+"""
+
+Microbenchmark of the vector operations.
+
+Compares the three dimensional fast paths of geometry.Point
+and geometry.Vector with the generic, tuple based component
+wise implementation (Point._compwise) they replaced.
+
+    ./bench_geometry.py [repetitions]
+
+"""
+
+
+a = gm.Vector((1.5, -2.25, 3.))
+b = gm.Vector((-.5, 4., 2.75))
+p = gm.Point((3., 1., -7.))
+
+
+#
+#   REFERENCE IMPLEMENTATION
+#
+
+def _add(u, v):
+    return gm.Vector(u._compwise(v.raw, op.add))
+
+
+def _sub(u, v):
+    return gm.Vector(u._compwise(v.raw, op.sub))
+
+
+def _psub(u, v):
+    return gm.Vector(u._compwise(v.raw, op.sub))
+
+
+def _dot(u, v):
+    return sum(u._compwise(v.raw, op.mul))
+
+
+def _scale(u, s):
+    return gm.Vector(u._compwise(tuple([s for x in range(3)]), op.mul))
+
+
+def _div(u, s):
+    return gm.Vector(u._compwise(tuple([s for x in range(3)]), op.truediv))
+
+
+def _neg(u):
+    return gm.Vector(u._compwise(None, lambda t: -1 * t))
+
+
+def _cross(u, v):
+    flatten = lambda l: [c for t in l for c in t]
+
+    l1 = list(zip(u.raw, v.raw))
+    l2 = list(zip(v.raw, u.raw))
+
+    l1 = flatten(l1[1:] + l1[:1])
+    l2 = flatten(l2[2:] + l2[:2])
+
+    w = list(map(lambda t: op.mul(*t), zip(l1, l2)))
+    w = map(lambda t: op.sub(*t), list(zip(w, w[1:]))[::2])
+    return gm.Vector(tuple(w))
+
+
+def _length(u):
+    length = 0
+    for x in u.raw:
+        length += math.pow(x, 2)
+    return math.sqrt(length)
+
+
+def _normalize(u):
+    return _div(u, _length(u))
+
+
+def _mirror(u, axis):
+    f = 2 * _dot(u, axis)
+    return _neg(_sub(u, _scale(axis, f)))
+
+
+OPERATIONS = [
+    ('add', lambda: _add(a, b), lambda: a + b),
+    ('sub', lambda: _sub(a, b), lambda: a - b),
+    ('point sub', lambda: _psub(p, p), lambda: p - p),
+    ('dot', lambda: _dot(a, b), lambda: a * b),
+    ('scale', lambda: _scale(a, 2.5), lambda: a * 2.5),
+    ('div', lambda: _div(a, 2.5), lambda: a / 2.5),
+    ('neg', lambda: _neg(a), lambda: -a),
+    ('cross', lambda: _cross(a, b), lambda: a ** b),
+    ('normalize', lambda: _normalize(a), lambda: a.normalize()),
+    ('mirror', lambda: _mirror(a, b), lambda: a.mirror(b)),
+]
+
+
+def main():
+    import sys
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print('%-10s %12s %12s %8s' % ('operation', 'generic/us', 'fast/us', 'speedup'))
+    for name, generic, fast in OPERATIONS:
+        assert generic() == fast(), name
+
+        tgen = min(timeit.repeat(generic, number=number, repeat=3))
+        tfast = min(timeit.repeat(fast, number=number, repeat=3))
+
+        us = 1e6 / number
+        print('%-10s %12.3f %12.3f %7.1fx' % (
+            name, tgen * us, tfast * us, tgen / tfast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from contextlib import contextmanager
+
+import instrument
+import raytracer as rt
+import vectorized as vc
+from shader import Phong
+
+
+"""
+
+End-to-end rendering benchmark.
+
+Renders the scenes of the worlds directory and synthetic
+worlds with a growing number of spheres, triangles and
+lights through raytracer.raytrace. The rays get counted by
+wrapping the shader and world methods that cast them, so
+the renderer itself stays untouched:
+
+    primary    -- one ray per pixel (Phong.sample)
+    shadow     -- one ray per hit and light (World.occluded)
+    reflection -- one ray per recursion step (Phong.colorize)
+
+    ./benchmark.py [-e numpy] [-o results.json] [-c old.json]
+
+The results are written to a json file; a previous result
+file can be passed to compare the runs.
+
+"""
+
+
+WORLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worlds')
+
+# synthetic worlds: (name, spheres, triangles, lights)
+SYNTHETIC = [
+    ('spheres-%d' % n, n, 0, 1) for n in (10, 100, 1000)
+] + [
+    ('triangles-%d' % n, 0, n, 1) for n in (10, 100, 1000)
+] + [
+    ('lights-%d' % n, 50, 50, n) for n in (1, 2, 4)
+]
+
+RESOLUTION = (160, 120)
+
+
+class Counter(object):
+    """
+    Counts the rays cast while it is active.
+    """
+
+    def __init__(self):
+        self.primary = 0
+        self.shadow = 0
+        self.reflection = 0
+
+    @property
+    def total(self):
+        return self.primary + self.shadow + self.reflection
+
+    def asdict(self):
+        return {
+            'primary': self.primary,
+            'shadow': self.shadow,
+            'reflection': self.reflection
+        }
+
+
+def _counting(count):
+    def wrap(method):
+        def wrapper(*args, **kwargs):
+            count(args)
+            return method(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+@contextmanager
+def counting():
+    """
+    Context manager that patches the methods casting rays
+    of both engines and yields a Counter. The original
+    methods are restored afterwards (@see instrument.patch).
+    """
+    counter = Counter()
+
+    def add(attr, n):
+        setattr(counter, attr, getattr(counter, attr) + n)
+
+    patches = [
+        # scalar engine, one ray per call
+        (Phong, 'sample', lambda a: add('primary', 1)),
+        (Phong, 'colorize', lambda a: add('reflection', 1)),
+        (rt.World, 'occluded', lambda a: add('shadow', 1)),
+        # numpy engine, the origins hold one row per ray
+        (vc.Phong, 'sample', lambda a: add('primary', len(a[1]))),
+        (vc.Phong, 'colorize', lambda a: add('reflection', len(a[1]))),
+        (vc.Phong, 'occluded', lambda a: add('shadow', len(a[1]))),
+    ]
+
+    originals = []
+    for cls, name, count in patches:
+        instrument.patch(cls, name, _counting(count), originals)
+    try:
+        yield counter
+    finally:
+        instrument.restore(originals)
+
+
+def synthetic(spheres, triangles, lights, resolution=RESOLUTION, seed=0):
+    """
+    Generates the json configuration of a random world
+    with the given number of bodies in front of the
+    camera, standing on a checkerboard plane.
+
+    spheres    -- Number of spheres
+    triangles  -- Number of triangles
+    lights     -- Number of light sources
+    resolution -- (Optional) Resolution of the picture
+    seed       -- (Optional) Seed of the random generator
+    """
+    rnd = random.Random(seed)
+    color = lambda: '%06x' % rnd.randrange(0x1000000)
+    coord = lambda: [rnd.uniform(-10, 10), rnd.uniform(0, 10),
+                     rnd.uniform(-35, -15)]
+
+    # keep the scene density roughly constant
+    size = 2. / max(1, (spheres + triangles) / 50.) ** (1 / 3.)
+
+    def material(raw):
+        raw.update({
+            'color': color(),
+            'shininess': round(rnd.uniform(0, .6), 2),
+            'smoothness': rnd.randrange(1, 20)
+        })
+        return raw
+
+    bodies = [material({
+        'type': 'sphere',
+        'position': coord(),
+        'radius': rnd.uniform(.3, 1.) * size
+    }) for i in range(spheres)]
+
+    for i in range(triangles):
+        center = coord()
+        bodies.append(material({
+            'type': 'triangle',
+            'vertices': [
+                [c + rnd.uniform(-1, 1) * size for c in center]
+                for j in range(3)]
+        }))
+
+    bodies.append({
+        'type': 'plane',
+        'texture': {
+            'type': 'checkerboard',
+            'size': 2,
+            'colors': ['ffffff', '333333']
+        },
+        'shininess': 0.4,
+        'smoothness': 5,
+        'point': [0, -1, 0],
+        'norm': [0, 1, 0]
+    })
+
+    return {
+        'recdepth': 2,
+        'world': {
+            'center': [0, 4, -25],
+            'background': '000000',
+            'lightness': 0.3,
+            'maxdist': 200
+        },
+        'camera': {'resolution': list(resolution), 'angleofview': 45},
+        'pictures': [{'eye': [0, 6, 10], 'up': [0, 1, 0]}],
+        'bodies': bodies,
+        'lights': [{
+            'position': [rnd.uniform(-30, 30), 30, rnd.uniform(-20, 10)],
+            'color': 'ffffff',
+            'lightness': 1
+        } for i in range(lights)]
+    }
+
+
+def run(name, config, engine='scalar'):
+    """
+    Renders all pictures of a scene and returns the
+    measurements as a dictionary.
+
+    name   -- Name of the benchmark
+    config -- json configuration of the scene
+    engine -- (Optional) Name of the shading engine
+    """
+    fd, fname = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(config, f)
+
+    try:
+        with counting() as counter:
+            start = instrument.timer()
+            pictures = sum(1 for fb in rt.raytrace(fname, engine, raw=True))
+            wall = instrument.timer() - start
+    finally:
+        os.remove(fname)
+
+    result = {
+        'name': name,
+        'engine': engine,
+        'resolution': list(config['camera']['resolution']),
+        'pictures': pictures,
+        'bodies': len(config['bodies']),
+        'lights': len(config['lights']),
+        'wall': wall,
+        'rays': counter.total,
+        'rays/s': counter.total / wall if wall else 0.
+    }
+    result.update(counter.asdict())
+    return result
+
+
+def scenes(resolution=None):
+    """
+    Generator that yields the (name, configuration) tuples
+    of all benchmarks.
+
+    resolution -- (Optional) Overrides the resolution of
+                  the scenes from the worlds directory
+    """
+    for fname in ('task.json', 'balls.json'):
+        with open(os.path.join(WORLDS, fname)) as f:
+            config = json.load(f)
+        if resolution is not None:
+            config['camera']['resolution'] = list(resolution)
+        yield os.path.splitext(fname)[0], config
+
+    for name, spheres, triangles, lights in SYNTHETIC:
+        res = resolution or RESOLUTION
+        yield name, synthetic(spheres, triangles, lights, res)
+
+
+def compare(results, previous):
+    """
+    Returns a line per benchmark that relates the
+    rays per second to the ones of a previous run.
+    """
+    old = dict((r['name'], r) for r in previous['results'])
+    lines = []
+    for r in results:
+        if r['name'] not in old or not old[r['name']]['rays/s']:
+            continue
+        speedup = r['rays/s'] / old[r['name']]['rays/s']
+        lines.append('%-14s %7.2fx' % (r['name'], speedup))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Raytracer benchmark.')
+    parser.add_argument(
+        '-e', '--engine', choices=sorted(rt.ENGINES), default='scalar',
+        help='shading engine to measure')
+    parser.add_argument(
+        '-r', '--resolution', type=int, nargs=2, metavar=('W', 'H'),
+        help='render every scene with this resolution')
+    parser.add_argument(
+        '-k', '--only', nargs='*', default=None, metavar='NAME',
+        help='run only the named benchmarks')
+    parser.add_argument(
+        '-o', '--output', default='benchmark.json',
+        help='file the results are written to')
+    parser.add_argument(
+        '-c', '--compare', metavar='JSON',
+        help='results of a previous run to compare with')
+    args = parser.parse_args()
+
+    print('%-14s %9s %9s %9s %10s %8s %11s' % (
+        'benchmark', 'primary', 'shadow', 'reflect', 'rays/s',
+        'wall/s', 'bodies'))
+
+    results = []
+    for name, config in scenes(args.resolution):
+        if args.only is not None and name not in args.only:
+            continue
+
+        try:
+            r = run(name, config, args.engine)
+        except vc.VectorizedException as e:
+            print('%-14s skipped: %s' % (name, e))
+            continue
+
+        results.append(r)
+        print('%-14s %9d %9d %9d %10.0f %8.2f %11d' % (
+            name, r['primary'], r['shadow'], r['reflection'],
+            r['rays/s'], r['wall'], r['bodies']))
+
+    report = {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'engine': args.engine,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('wrote %s' % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print('\nrays/s compared to %s:' % args.compare)
+        for line in compare(results, previous):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 
 
 import geometry as gm
+import meshes
 
 
 class Body(object):
@@ -73,6 +74,16 @@ class Material(Body):
     def __init__(self, geometry):
         super(Material, self).__init__(geometry)
 
+    @classmethod
+    def fromgeometry(cls, geometry):
+        """
+        Creates the body of an already built geometry
+        (e.g. a loaded meshes.Mesh).
+        """
+        body = cls.__new__(cls)
+        Material.__init__(body, geometry)
+        return body
+
     @property
     def shininess(self):
         return self._shininess
@@ -115,6 +126,13 @@ class Triangle(Material):
         super(Triangle, self).__init__(geometry)
 
 
+class Mesh(Material):
+
+    def __init__(self, fname, position=(0, 0, 0), scale=1.):
+        geometry = meshes.load(fname, position, scale)
+        super(Mesh, self).__init__(geometry)
+
+
 class CheckerboardTexture(object):
 
     def __init__(self, checksize, colors):
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+from instrument import timer
+from progressive import Refinement, STEP
+
+
+"""
+
+Rendering within a time budget.
+
+Every picture gets a number of seconds. A sparse probe of the
+picture, traced once without and once with all reflections,
+estimates the cost of a pixel for every recursion depth. The
+best quality level that fits into the budget is chosen:
+
+    1. full recursion depth and anti-aliasing
+    2. full recursion depth
+    3. every reflection less, down to none at all
+
+The picture is then traced progressively (@see progressive.py),
+blocks with the highest contrast first. When the time runs out
+the refinement stops and the preview is returned, so there is
+always a complete frame, even if it is coarser than intended.
+
+"""
+
+
+# distance of the probed pixels
+PROBE = 16
+
+# share of the remaining time that gets planned,
+# the rest covers errors of the estimation
+MARGIN = .8
+
+# expected share of edge pixels that get anti-aliased
+EDGES = .2
+
+
+class Budget(object):
+    """
+    Shoots pictures of a camera within a given time. The
+    quality level reached by the last picture is kept in
+    the level dictionary:
+
+        depth        -- Recursion depth the picture was traced with
+        maxdepth     -- Recursion depth of the shader
+        antialiasing -- Share of the edge pixels that got
+                        anti-aliased (None if it was skipped)
+        traced       -- Share of the pixels that got traced
+        seconds      -- Time the picture took
+        budget       -- Time the picture was given
+    """
+
+    def __str__(self):
+        return "time budget"
+
+    def __init__(self, camera, antialiasing=None):
+        """
+        camera       -- raytracer.Camera instance with a shader
+        antialiasing -- (Optional) antialias.Antialiasing instance
+                        that gets applied if there is enough time
+        """
+        self._camera = camera
+        self._antialiasing = antialiasing
+        self.maxdepth = camera.shader.depth
+        self.level = None
+
+    def probe(self, eye, up):
+        """
+        Returns a function that estimates the seconds
+        a pixel takes with the given recursion depth.
+        """
+        width, height = self._camera.resolution
+        pixels = [
+            (x, y) for y in range(PROBE // 2, height, PROBE)
+            for x in range(PROBE // 2, width, PROBE)] or [(0, 0)]
+
+        costs = {}
+        for depth in sorted(set((0, self.maxdepth))):
+            self._camera.shader.depth = depth
+            start = timer()
+            self._camera.shootPixels(eye, up, pixels)
+            costs[depth] = (timer() - start) / len(pixels)
+
+        low, high = costs[0], costs[self.maxdepth]
+        return lambda depth: low + (high - low) * depth / max(self.maxdepth, 1)
+
+    def _limit(self, end, count, start):
+        """
+        Returns a limit for progressive.Refinement.passes that
+        grants as many pixels as fit into the remaining time.
+        The cost of a pixel is measured while rendering.
+        """
+        traced = [count]
+
+        def limit(n):
+            cost = (timer() - start) / traced[0]
+            if cost:
+                n = min(n, int((end - timer()) * MARGIN / cost))
+            traced[0] += max(n, 0)
+            return n
+
+        return limit, traced
+
+    def shoot(self, eye, up, seconds):
+        """
+        Shoots a picture within the given seconds.
+
+        eye     -- Point to look from
+        up      -- The cameras tilt
+        seconds -- Wall-clock time the picture may take
+        """
+        start = timer()
+        end = start + seconds
+        camera, shader = self._camera, self._camera.shader
+        width, height = camera.resolution
+        count = width * height
+
+        try:
+            cost = self.probe(eye, up)
+            available = (end - timer()) * MARGIN
+
+            level = {
+                'maxdepth': self.maxdepth,
+                'antialiasing': None,
+                'traced': 1.,
+                'budget': seconds
+            }
+
+            aa = self._antialiasing
+            extra = 1 + EDGES * aa.grid ** 2 if aa is not None else None
+            if aa is not None and \
+                    count * cost(self.maxdepth) * extra <= available:
+                level['depth'] = shader.depth = self.maxdepth
+
+                # the edges may only take the time that is left
+                # after the centers of all pixels got traced
+                def limit(n):
+                    persample = (timer() - begin) / count
+                    return int((end - timer()) / (persample * aa.grid ** 2))
+
+                begin = timer()
+                framebuffer = aa.shoot(camera, eye, up, limit=limit)
+                level['antialiasing'] = \
+                    float(aa.refined) / aa.edgecount if aa.edgecount else 1.
+            else:
+                depths = range(self.maxdepth, -1, -1)
+                level['depth'] = shader.depth = next(
+                    (d for d in depths if count * cost(d) <= available), 0)
+
+                first = len(range(0, width, STEP)) * len(range(0, height, STEP))
+                limit, traced = self._limit(end, first, timer())
+                for framebuffer in Refinement(camera, eye, up).passes(limit):
+                    pass
+                level['traced'] = float(traced[0]) / count
+        finally:
+            shader.depth = self.maxdepth
+
+        level['seconds'] = timer() - start
+        self.level = level
+        return framebuffer
+
+    def report(self):
+        """
+        Returns a summary of the quality level of the last picture.
+        """
+        level = self.level
+        if level['antialiasing'] is None:
+            aa = 'no anti-aliasing'
+        else:
+            aa = '%.0f%% of the edges anti-aliased' % (
+                100 * level['antialiasing'])
+        return ("quality: recursion depth %d/%d, %s, %.0f%% of the pixels "
+                "traced in %.2fs of %.2fs" % (
+                    level['depth'], level['maxdepth'], aa,
+                    100 * level['traced'], level['seconds'], level['budget']))
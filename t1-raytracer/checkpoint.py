@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import pickle
+
+from instrument import timer
+
+
+"""
+
+Checkpoints of long renders.
+
+Pictures with a checkpoint get rendered tile by tile. Every
+finished tile is kept together with its coordinates and all
+tiles are written to the checkpoint file periodically (and
+whenever a picture is complete). The file gets replaced
+atomically, so a killed process leaves either the previous
+or the new checkpoint behind, never a broken one.
+
+A checkpoint is keyed to the hash of the scene file and the
+obj files it was rendered from (@see scenecache.scenehash).
+Resuming from the checkpoint of another version of the scene
+(or of one of its meshes) is refused.
+
+"""
+
+
+EMSG = {
+    'stale': "%s: The checkpoint belongs to another version of the scene.",
+    'format': "%s: Not a checkpoint file."
+}
+
+VERSION = 1
+
+# edge length of the tiles in pixels
+TILESIZE = 64
+
+# seconds between two writes of the checkpoint file
+INTERVAL = 30.
+
+
+class CheckpointException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class Picture(object):
+    """
+    The finished tiles of one picture.
+    """
+
+    def __init__(self, checkpoint, tiles):
+        self._checkpoint = checkpoint
+        # (x0, y0, x1, y1) -> rgb values row by row
+        self.tiles = tiles
+
+    @property
+    def tilesize(self):
+        return self._checkpoint.tilesize
+
+    def add(self, tile, data):
+        """
+        Records a finished tile. The checkpoint gets written
+        if the last write is long enough ago.
+
+        tile -- Tuple (x0, y0, x1, y1)
+        data -- Rgb values of the tile row by row
+        """
+        self.tiles[tuple(tile)] = bytes(data)
+        self._checkpoint.tick()
+
+
+class Checkpoint(object):
+    """
+    Finished tiles of all pictures of a scene, written to a
+    file next to the output (@see raytracer.raytrace).
+    """
+
+    def __str__(self):
+        done = sum(len(tiles) for tiles in self._pictures.values())
+        return "checkpoint %s (%d tiles)" % (self.fname, done)
+
+    def __init__(self, fname, key, tilesize=TILESIZE, interval=INTERVAL):
+        """
+        fname    -- File name of the checkpoint
+        key      -- Hash of the scene (@see scenecache.scenehash)
+        tilesize -- (Optional) Edge length of the tiles
+        interval -- (Optional) Seconds between two writes
+        """
+        self.fname = fname
+        self.key = key
+        self.tilesize = tilesize
+        self.interval = interval
+        self._pictures = {}
+        self._saved = timer()
+
+    @classmethod
+    def load(cls, fname, key, interval=INTERVAL):
+        """
+        Reads a checkpoint file. Raises a CheckpointException
+        if it was written for another version of the scene.
+
+        fname    -- File name of the checkpoint
+        key      -- Hash of the scene the checkpoint must match
+        interval -- (Optional) Seconds between two writes
+        """
+        with open(fname, 'rb') as f:
+            try:
+                raw = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, ValueError):
+                raise CheckpointException(EMSG['format'] % fname)
+
+        if not isinstance(raw, dict) or raw.get('version') != VERSION:
+            raise CheckpointException(EMSG['format'] % fname)
+        if raw['key'] != key:
+            raise CheckpointException(EMSG['stale'] % fname)
+
+        checkpoint = cls(fname, key, raw['tilesize'], interval)
+        checkpoint._pictures = raw['pictures']
+        return checkpoint
+
+    def picture(self, index):
+        """
+        Returns the finished tiles of a picture.
+
+        index -- Position of the picture in the scene
+        """
+        return Picture(self, self._pictures.setdefault(index, {}))
+
+    def tick(self):
+        """
+        Writes the checkpoint if the interval passed.
+        """
+        if timer() - self._saved >= self.interval:
+            self.save()
+
+    def save(self):
+        """
+        Atomically replaces the checkpoint file.
+        """
+        raw = {
+            'version': VERSION,
+            'key': self.key,
+            'tilesize': self.tilesize,
+            'pictures': self._pictures
+        }
+
+        tmp = self.fname + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(raw, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.fname)
+        self._saved = timer()
+
+    def remove(self):
+        """
+        Deletes the checkpoint file (if it was written).
+        """
+        if os.path.exists(self.fname):
+            os.remove(self.fname)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import io
+import sys
+import json
+import stat
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+
+
+"""
+
+Render daemon.
+
+Every run of raytracer.py pays for starting the interpreter,
+importing numpy and PIL, parsing the scene and building the
+acceleration structure before the first ray is traced. The
+daemon pays that once: it listens on a unix socket and keeps
+the prepared scenes (world, acceleration structure, camera
+and shader, @see raytracer.prepare) of the last requests in
+memory.
+
+    ./daemon.py --socket /tmp/rt.sock serve &
+    ./daemon.py --socket /tmp/rt.sock render worlds/task.json -o task.png
+
+Scenes are cached by the sha256 of the json and its obj files
+(@see scenecache.scenehash) and the engine, so an edited scene
+is prepared again and the least recently used one is dropped
+once there are too many.
+
+Protocol: a client sends one json object per line
+
+    {"scene": "/abs/path.json", "picture": 0, "engine": "numpy"}
+
+with optional "eye" and "up" lists instead of the picture
+index. Every request is answered with a json line, either
+{"size": n, "cached": true, "seconds": s} followed by n bytes
+of png or {"error": "..."}. A connection can carry any number
+of requests. Requests are rendered one at a time.
+
+The client side (render, main) gets along without importing
+the raytracer.
+
+"""
+
+
+EMSG = {
+    'request': "Invalid request: %s",
+    'picture': "%s: There is no picture %s.",
+    'closed': "The daemon closed the connection.",
+    'render': "The daemon could not render the scene: %s",
+    'exists': "%s: The file exists and is not a socket.",
+    'running': "%s: Another daemon is listening on the socket."
+}
+
+# default path of the socket
+SOCKET = '/tmp/raytracer.sock'
+
+# prepared scenes kept in memory
+SCENES = 8
+
+
+class DaemonException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _throw(fmt, *args):
+    raise DaemonException(EMSG[fmt] % tuple(args))
+
+
+class Scenes(object):
+    """
+    Least recently used cache of prepared scenes.
+    """
+
+    def __str__(self):
+        return "%d of %d scenes (%d hits, %d misses)" % (
+            len(self._scenes), self.size, self.hits, self.misses)
+
+    def __init__(self, size=SCENES, cache=False):
+        """
+        size  -- Maximum number of scenes kept
+        cache -- (Optional) Import scenes from their compiled
+                 cache (@see scenecache.py)
+        """
+        self.size = size
+        self.cache = cache
+        # (scene hash, engine) -> camera, positions, anti-aliasing
+        self._scenes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def get(self, fname, engine):
+        """
+        Returns the prepared scene of a file and a flag
+        if it was in memory already.
+
+        fname  -- File name of the json configuration
+        engine -- Name of the shading engine
+        """
+        import scenecache
+        from raytracer import prepare
+
+        with open(fname) as f:
+            config = json.load(f)
+        key = (scenecache.scenehash(
+            fname, scenecache.dependencies(config)), engine)
+
+        scene = self._scenes.pop(key, None)
+        cached = scene is not None
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+            scene = prepare(fname, engine, self.cache)[:3]
+
+        self._scenes[key] = scene
+        while len(self._scenes) > self.size:
+            self._scenes.popitem(last=False)
+        return scene, cached
+
+
+class Renderer(object):
+    """
+    Renders the requests of the clients.
+    """
+
+    def __init__(self, scenes, engine='scalar'):
+        """
+        scenes -- Scenes instance
+        engine -- Engine of requests that name none
+        """
+        self.scenes = scenes
+        self.engine = engine
+        self._lock = threading.Lock()
+
+    def render(self, request):
+        """
+        Renders one request. Returns the png bytes
+        and a flag if the scene was in memory.
+
+        request -- Dictionary parsed from the request line
+        """
+        from raytracer import ENGINES
+
+        if not isinstance(request, dict) or \
+                not isinstance(request.get('scene'), str):
+            _throw('request', 'no scene given')
+        fname = request['scene']
+        engine = request.get('engine', self.engine)
+        if engine not in ENGINES:
+            _throw('request', 'unknown engine %r' % engine)
+
+        with self._lock:
+            (camera, positions, antialiasing), cached = \
+                self.scenes.get(fname, engine)
+
+            if 'eye' in request or 'up' in request:
+                try:
+                    eye, up = tuple(request['eye']), tuple(request['up'])
+                except (KeyError, TypeError):
+                    _throw('request', 'eye and up belong together')
+            else:
+                index = request.get('picture', 0)
+                if not isinstance(index, int) or \
+                        not 0 <= index < len(positions):
+                    _throw('picture', fname, index)
+                eye, up = positions[index]
+
+            if antialiasing is not None:
+                framebuffer = antialiasing.shoot(camera, eye, up)
+            else:
+                framebuffer = camera.shoot(eye, up)
+
+        png = io.BytesIO()
+        framebuffer.image().save(png, 'PNG')
+        return png.getvalue(), cached
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """
+    Answers the requests of one connection.
+    """
+
+    def handle(self):
+        from instrument import timer
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            start = timer()
+            try:
+                data, cached = self.server.renderer.render(
+                    json.loads(line.decode('utf-8')))
+            except Exception as e:
+                # a broken request or scene must not end the
+                # connection (nor the daemon)
+                self._answer({'error': str(e) or repr(e)})
+                continue
+
+            self._answer({'size': len(data), 'cached': cached,
+                          'seconds': round(timer() - start, 6)}, data)
+
+    def _answer(self, header, data=b''):
+        self.wfile.write(json.dumps(header).encode('utf-8') + b'\n')
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server of the daemon.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, renderer):
+        """
+        path     -- File name of the socket
+        renderer -- Renderer instance
+        """
+        if os.path.lexists(path):
+            self._stale(path)
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+        self.path = path
+        self.renderer = renderer
+
+    def _stale(self, path):
+        """
+        Removes the socket of a daemon that is gone. Anything
+        else at the path (a file, a running daemon) is kept.
+        """
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            _throw('exists', path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+        finally:
+            probe.close()
+        _throw('running', path)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def render(scene, picture=0, eye=None, up=None, engine=None, path=SOCKET):
+    """
+    Lets the daemon render a picture. Returns the png bytes.
+
+    scene   -- File name of the json configuration
+    picture -- (Optional) Index of the picture in the scene
+    eye, up -- (Optional) Camera position instead of the picture
+    engine  -- (Optional) Shading engine (the daemons default)
+    path    -- (Optional) File name of the socket
+    """
+    if (eye is None) != (up is None):
+        _throw('request', 'eye and up belong together')
+    request = {'scene': os.path.abspath(scene), 'picture': picture}
+    if eye is not None:
+        request.update(eye=list(eye), up=list(up))
+    if engine is not None:
+        request['engine'] = engine
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+        stream = conn.makefile('rwb')
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+
+        line = stream.readline()
+        if not line:
+            _throw('closed')
+        header = json.loads(line.decode('utf-8'))
+        if 'error' in header:
+            _throw('render', header['error'])
+        data = stream.read(header['size'])
+        if len(data) != header['size']:
+            _throw('closed')
+        return data
+    finally:
+        conn.close()
+
+
+def serve(path=SOCKET, size=SCENES, engine='scalar', cache=False):
+    """
+    Runs the daemon until it gets interrupted.
+
+    path   -- (Optional) File name of the socket
+    size   -- (Optional) Number of scenes kept in memory
+    engine -- (Optional) Engine of requests that name none
+    cache  -- (Optional) Import scenes from their compiled cache
+    """
+    import raytracer
+
+    scenes = Scenes(size, cache)
+    server = Server(path, Renderer(scenes, engine))
+    raytracer.log('listening on %s' % path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        raytracer.log('served %s' % scenes)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Keep scenes in memory and render them on request.')
+    parser.add_argument(
+        '-s', '--socket', default=SOCKET,
+        help='unix socket of the daemon')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    daemon = commands.add_parser('serve', help='run the daemon')
+    daemon.add_argument(
+        '-n', '--scenes', type=int, default=SCENES,
+        help='number of prepared scenes kept in memory')
+    daemon.add_argument(
+        '-e', '--engine', choices=('numpy', 'scalar'), default='scalar',
+        help='engine of requests that name none')
+    daemon.add_argument(
+        '-c', '--cache', action='store_true',
+        help='import scenes from their compiled cache')
+
+    client = commands.add_parser('render', help='render a picture')
+    client.add_argument('scene', help='scene configuration (json)')
+    client.add_argument(
+        '-p', '--picture', type=int, default=0,
+        help='index of the picture in the scene')
+    client.add_argument(
+        '-e', '--engine', choices=('numpy', 'scalar'),
+        help='shading engine (defaults to the one of the daemon)')
+    client.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='write the png to FILE instead of stdout')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        import raytracer
+        raytracer.VERBOSE = True
+        try:
+            serve(args.socket, args.scenes, args.engine, args.cache)
+        except DaemonException as e:
+            sys.exit(str(e))
+        return
+
+    try:
+        data = render(args.scene, args.picture, engine=args.engine,
+                      path=args.socket)
+    except (IOError, OSError, DaemonException) as e:
+        sys.exit(str(e))
+    if args.output is None:
+        sys.stdout.buffer.write(data)
+    else:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    main()
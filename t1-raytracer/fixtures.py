@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+from raytracer import Importer, Camera, ENGINES
+
+
+"""
+
+Scenes shared by the test_*-files.
+
+"""
+
+
+WORLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worlds')
+
+
+def setup(fname, engine='scalar', res=(48, 32), accelerate=False):
+    """
+    Imports a scene of the worlds directory. Returns a camera
+    with the shader of the engine and the first position.
+
+    fname      -- Name of the json file in worlds/
+    engine     -- (Optional) Name of the shading engine
+    res        -- (Optional) Resolution of the camera
+    accelerate -- (Optional) Build the acceleration structure
+                  (the bodies get traced brute force otherwise)
+    """
+    imp = Importer(os.path.join(WORLDS, fname))
+    world = imp.world
+    imp.bodies()
+    imp.lights()
+    if accelerate:
+        world.accelerate()
+
+    camera = Camera(world, tuple(res), imp.json['camera']['angleofview'])
+    camera.shader = ENGINES[engine](world, imp.recdepth)
+    eye, up = next(imp.positions)
+    return camera, eye, up
+
+
+def copy(fname, directory, name=None, res=(32, 24), edit=None):
+    """
+    Writes a scene of the worlds directory with a smaller
+    resolution to another one. Returns the new file name
+    and the configuration.
+
+    fname     -- Name of the json file in worlds/
+    directory -- Directory to write to
+    name      -- (Optional) File name of the copy
+    res       -- (Optional) Resolution of the camera
+    edit      -- (Optional) Callable that changes the parsed
+                 configuration before it gets written
+    """
+    with open(os.path.join(WORLDS, fname)) as f:
+        raw = json.load(f)
+    raw['camera']['resolution'] = list(res)
+    if edit is not None:
+        edit(raw)
+
+    target = os.path.join(directory, name or fname)
+    with open(target, 'w') as f:
+        json.dump(raw, f)
+    return target, raw
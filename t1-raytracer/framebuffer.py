@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class Framebuffer(object):
+    """
+    Rgb picture stored as one contiguous buffer (row by
+    row, one byte per channel). Cameras render into it
+    directly; the raw buffer can be handed to other
+    libraries or written to disk without using PIL.
+    """
+
+    def __init__(self, res, buf=None):
+        """
+        res -- Tuple of width and height
+        buf -- (Optional) Writable buffer of width * height * 3
+               bytes to render into (e.g. shared memory)
+        """
+        self._res = tuple(res)
+        if buf is None:
+            buf = bytearray(self.width * self.height * 3)
+        self._buf = buf
+
+    @property
+    def resolution(self):
+        return self._res
+
+    @property
+    def width(self):
+        return self._res[0]
+
+    @property
+    def height(self):
+        return self._res[1]
+
+    @property
+    def raw(self):
+        return self._buf
+
+    def put(self, x, y, color):
+        """
+        Sets one pixel.
+
+        x, y  -- Pixel coordinates
+        color -- Normalized rgb values (0 - 255)
+        """
+        i = (y * self._res[0] + x) * 3
+        r, g, b = color
+        self._buf[i:i + 3] = bytes((int(r), int(g), int(b)))
+
+    def blit(self, tile, data):
+        """
+        Copies the rgb rows of a tile into the buffer.
+
+        tile -- Tuple (x0, y0, x1, y1)
+        data -- Rgb values of the tile row by row
+        """
+        x0, y0, x1, y1 = tile
+        view = memoryview(self._buf).cast('B')
+        rowlen = (x1 - x0) * 3
+        for row, y in enumerate(range(y0, y1)):
+            i = (y * self.width + x0) * 3
+            view[i:i + rowlen] = data[row * rowlen:(row + 1) * rowlen]
+
+    def crop(self, tile):
+        """
+        Returns the rgb rows of a tile as bytes.
+
+        tile -- Tuple (x0, y0, x1, y1)
+        """
+        x0, y0, x1, y1 = tile
+        view = memoryview(self._buf).cast('B')
+        rows = []
+        for y in range(y0, y1):
+            i = (y * self.width + x0) * 3
+            rows.append(view[i:i + (x1 - x0) * 3].tobytes())
+        return b''.join(rows)
+
+    def fill(self, tile, color):
+        """
+        Sets all pixels of a tile to the same color.
+
+        tile  -- Tuple (x0, y0, x1, y1)
+        color -- Rgb values as bytes
+        """
+        x0, y0, x1, y1 = tile
+        row = bytes(color) * (x1 - x0)
+        for y in range(y0, y1):
+            i = (y * self.width + x0) * 3
+            self._buf[i:i + len(row)] = row
+
+    def tobytes(self):
+        return bytes(self._buf)
+
+    def image(self):
+        """
+        Returns the picture as a PIL Image.
+        """
+        from PIL import Image
+
+        return Image.frombuffer(
+            'RGB', self._res, self.tobytes(), 'raw', 'RGB', 0, 1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import numpy as np
+
+from framebuffer import Framebuffer
+
+
+"""
+
+Geometry buffers.
+
+Shooting a picture with a G-buffer records the first hit of
+every primary ray: the id of the body (@see World.bodyid),
+the hit point, the surface normal, the base color of the
+body at that point and the direction of the ray. That is
+everything the phong shader derives from the primary ray,
+so a picture can be shaded again from the buffer after the
+lights or the materials changed (@see shader.Phong.relight)
+without tracing a single primary ray. Only shadow and
+reflection rays are traced.
+
+The buffer can be written as depth, normal and albedo images
+as well, e.g. for compositing or to debug a scene.
+
+"""
+
+
+class GBuffer(object):
+    """
+    First hits of the primary rays of a picture. All
+    attributes are flat numpy arrays indexed by
+    y * width + x, pixels without a hit have the id -1.
+    """
+
+    def __str__(self):
+        return "G-buffer %dx%d (%d hits)" % (
+            self.width, self.height, int(self.hits.sum()))
+
+    def __init__(self, resolution):
+        """
+        resolution -- Tuple of width and height
+        """
+        self.resolution = tuple(resolution)
+        count = self.width * self.height
+
+        # point the primary rays start from
+        self.eye = (0., 0., 0.)
+
+        self.ids = np.full(count, -1, np.int64)
+        self.points = np.zeros((count, 3))
+        self.normals = np.zeros((count, 3))
+        self.colors = np.zeros((count, 3))
+        self.directions = np.zeros((count, 3))
+
+    @property
+    def width(self):
+        return self.resolution[0]
+
+    @property
+    def height(self):
+        return self.resolution[1]
+
+    @property
+    def hits(self):
+        """
+        Boolean array of the pixels that hit a body.
+        """
+        return self.ids >= 0
+
+    def put(self, x, y, bodyid, point, normal, color, direction):
+        """
+        Records the hit of one pixel.
+
+        x, y      -- Pixel coordinates
+        bodyid    -- Id of the body hit (@see World.bodyid)
+        point     -- Tuple of the hit point
+        normal    -- Tuple of the surface normal
+        color     -- Tuple of the base color (0 - 255)
+        direction -- Tuple of the normalized ray direction
+        """
+        i = y * self.width + x
+        self.ids[i] = bodyid
+        self.points[i] = point
+        self.normals[i] = normal
+        self.colors[i] = color
+        self.directions[i] = direction
+
+    def store(self, xs, ys, ids, points, normals, colors, directions):
+        """
+        Batched self.put. All arguments are numpy arrays
+        with one entry (or row) per pixel.
+        """
+        i = np.asarray(ys) * self.width + np.asarray(xs)
+        self.ids[i] = ids
+        self.points[i] = points
+        self.normals[i] = normals
+        self.colors[i] = colors
+        self.directions[i] = directions
+
+    def depths(self):
+        """
+        Returns the distances of the hit points to
+        the eye. Pixels without a hit are infinite.
+        """
+        v = self.points - self.eye
+        return np.where(
+            self.hits, np.sqrt((v * v).sum(axis=1)), np.inf)
+
+    def _framebuffer(self, rgb):
+        pixels = np.clip(rgb, 0, 255).astype(np.uint8)
+        return Framebuffer(self.resolution, bytearray(pixels.tobytes()))
+
+    def depthImage(self):
+        """
+        Returns the depths as a gray framebuffer, near
+        hits bright, far ones dark and misses black.
+        """
+        depths = self.depths()
+        gray = np.zeros(len(depths))
+        hits = self.hits
+        if hits.any():
+            near, far = depths[hits].min(), depths[hits].max()
+            span = far - near or 1.
+            gray[hits] = 255 - 200 * (depths[hits] - near) / span
+        return self._framebuffer(np.repeat(gray[:, None], 3, axis=1))
+
+    def normalImage(self):
+        """
+        Returns the normals as a framebuffer, every
+        component mapped from -1 - 1 to 0 - 255.
+        """
+        rgb = (self.normals + 1) * 127.5
+        rgb[~self.hits] = 0
+        return self._framebuffer(rgb)
+
+    def albedoImage(self):
+        """
+        Returns the base colors of the bodies
+        (without any lighting) as a framebuffer.
+        """
+        return self._framebuffer(self.colors)
@@ -25,7 +25,38 @@ class GeometryException(Exception):
         self.msg = msg
 
 
+_new = object.__new__
+
+
+def _point(x, y, z):
+    """
+    Creates a three dimensional Point without
+    validating (and converting) the components.
+    """
+    p = _new(Point)
+    p.x, p.y, p.z, p._raw = x, y, z, None
+    return p
+
+
+def _vector(x, y, z):
+    """
+    Creates a three dimensional Vector without
+    validating (and converting) the components.
+    """
+    v = _new(Vector)
+    v.x, v.y, v.z, v._raw = x, y, z, None
+    return v
+
+
 class Point(object):
+    """
+    Point of arbitrary dimension. Three dimensional
+    points store their components in the fields x, y
+    and z and take fast paths for all operations. The
+    field x is None for all other dimensions.
+    """
+
+    __slots__ = ('x', 'y', 'z', '_raw')
 
     def _compwise(self, other, fn):
         try:
@@ -52,18 +83,28 @@ class Point(object):
         return "Point: %s" % str(self.raw)
 
     def __add__(self, v):
-        if type(v) is Vector and self.dimension == v.dimension:
-            return Point(self._compwise(v.raw, op.add))
+        if type(v) is Vector:
+            if self.x is not None and v.x is not None:
+                return _point(self.x + v.x, self.y + v.y, self.z + v.z)
+            if self.dimension == v.dimension:
+                return Point(self._compwise(v.raw, op.add))
         raise GeometryException(EMSG['point_add'] % type(v))
 
     def __sub__(self, p):
+        if self.x is not None and p.x is not None:
+            return _vector(self.x - p.x, self.y - p.y, self.z - p.z)
         if self.dimension == p.dimension:
             return Vector(self._compwise(p.raw, op.sub))
         raise GeometryException(EMSG['point_sub'])
 
     def __init__(self, p):
         if type(p) is tuple:
-            self._raw = tuple(map(float, p))
+            raw = tuple(map(float, p))
+            self._raw = raw
+            if len(raw) == 3:
+                self.x, self.y, self.z = raw
+            else:
+                self.x = self.y = self.z = None
             return
 
         msg = EMSG['point_init'] % type(p)
@@ -71,21 +112,30 @@ class Point(object):
 
     @property
     def raw(self):
-        return self._raw
+        raw = self._raw
+        if raw is None:
+            raw = self._raw = (self.x, self.y, self.z)
+        return raw
 
     @property
     def dimension(self):
+        if self.x is not None:
+            return 3
         return len(self._raw)
 
     def clone(self):
         """
         Returns a new Point with the same properties.
         """
+        if self.x is not None:
+            return _point(self.x, self.y, self.z)
         return Point(self.raw)
 
 
 class Vector(Point):
 
+    __slots__ = ()
+
     def __repr__(self):
         return "%s(%s)" % ("Vector", self.raw)
 
@@ -96,6 +146,8 @@ class Vector(Point):
         """
         Invert the vector.
         """
+        if self.x is not None:
+            return _vector(-self.x, -self.y, -self.z)
         op = lambda t: -1 * t
         return Vector(self._compwise(None, op))
 
@@ -105,6 +157,8 @@ class Vector(Point):
 
         v - Another geometry.Vector instance
         """
+        if self.x is not None and v.x is not None:
+            return _vector(self.x + v.x, self.y + v.y, self.z + v.z)
         return Vector(self._compwise(v.raw, op.add))
 
     def __sub__(self, v):
@@ -113,6 +167,8 @@ class Vector(Point):
 
         v -- Another geometry.Vector instance
         """
+        if self.x is not None and v.x is not None:
+            return _vector(self.x - v.x, self.y - v.y, self.z - v.z)
         return Vector(self._compwise(v.raw, op.sub))
 
     def __div__(self, s):
@@ -121,9 +177,13 @@ class Vector(Point):
 
         s -- Scale factor as scalar value
         """
+        if self.x is not None:
+            return _vector(self.x / s, self.y / s, self.z / s)
         v = [s for x in range(self.dimension)]
         return Vector(self._compwise(tuple(v), op.truediv))
 
+    __truediv__ = __div__
+
     def __mul__(self, e):
         """
         Either scales the vector if e is a scalar
@@ -132,12 +192,15 @@ class Vector(Point):
 
         e -- Either a vector or scalar
         """
-        if (type(e) == type(self)):
+        if type(e) is Vector:
+            if self.x is not None and e.x is not None:
+                return self.x * e.x + self.y * e.y + self.z * e.z
             t = self._compwise(e.raw, op.mul)
             return sum(t)
-        else:
-            v = [e for x in range(self.dimension)]
-            return Vector(self._compwise(tuple(v), op.mul))
+        if self.x is not None:
+            return _vector(self.x * e, self.y * e, self.z * e)
+        v = [e for x in range(self.dimension)]
+        return Vector(self._compwise(tuple(v), op.mul))
 
     def __pow__(self, v):
         """
@@ -145,26 +208,20 @@ class Vector(Point):
 
         v -- Another geometry.Vector instance
         """
-        if self.dimension != 3:
+        if self.x is None or v.x is None:
             raise GeometryException(EMSG['vector_prod'])
 
-        flatten = lambda l: [c for t in l for c in t]
-
-        l1 = list(zip(self.raw, v.raw))
-        l2 = list(zip(v.raw, self.raw))
-
-        l1 = flatten(l1[1:] + l1[:1])
-        l2 = flatten(l2[2:] + l2[:2])
-
-        w = list(map(lambda t: op.mul(*t), zip(l1, l2)))
-        w = map(lambda t: op.sub(*t), list(zip(w, w[1:]))[::2])
-        return Vector(tuple(w))
+        ax, ay, az = self.x, self.y, self.z
+        bx, by, bz = v.x, v.y, v.z
+        return _vector(ay * bz - by * az, az * bx - bz * ax, ax * by - bx * ay)
 
     def __init__(self, v):
         super(Vector, self).__init__(v)
 
     @property
     def length(self):
+        if self.x is not None:
+            return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
         length = 0
         for x in self.raw:
             length += math.pow(x, 2)
@@ -174,12 +231,18 @@ class Vector(Point):
         """
         Returns a vector with length 1.
         """
+        if self.x is not None:
+            x, y, z = self.x, self.y, self.z
+            length = math.sqrt(x * x + y * y + z * z)
+            return _vector(x / length, y / length, z / length)
         return self / self.length
 
     def clone(self):
         """
         Returns a new vector with the same properties.
         """
+        if self.x is not None:
+            return _vector(self.x, self.y, self.z)
         return Vector(self.raw)
 
     def map(self, fn):
@@ -198,6 +261,12 @@ class Vector(Point):
 
         axis -- Mostly the normal of a body
         """
+        if self.x is not None and axis.x is not None:
+            x, y, z = self.x, self.y, self.z
+            f = 2 * (x * axis.x + y * axis.y + z * axis.z)
+            return _vector(
+                -(x - axis.x * f), -(y - axis.y * f), -(z - axis.z * f))
+
         f = 2 * (self * axis)
         axis *= f
         return -(self - axis)
@@ -210,6 +279,8 @@ class Vector(Point):
         v  -- Another Vector instance
         fn -- Function that awaits two parameters
         """
+        if self.x is not None and v.x is not None:
+            return _vector(fn(self.x, v.x), fn(self.y, v.y), fn(self.z, v.z))
         med = zip(self.raw, v.raw)
         med = map(lambda t: fn(*t), med)
         return Vector(tuple(med))
@@ -289,6 +360,11 @@ class Body(object):
     """
     Base class for all renderable entities.
     """
+
+    # convex bodies can't be hit by rays that leave
+    # their own surface and get skipped by those rays
+    convex = True
+
     def intersection(self, ray):
         """
         Returns the parameter to which the ray
@@ -309,6 +385,14 @@ class Body(object):
         msg = EMSG['body_overwrite'] % 'normal'
         raise GeometryException(msg)
 
+    def bounds(self):
+        """
+        Returns the axis aligned bounding box of the
+        body as a tuple of its minimum and maximum
+        corner. Returns None for unbounded bodies.
+        """
+        return None
+
 
 class Sphere(Body):
 
@@ -361,6 +445,12 @@ class Sphere(Body):
     def normal(self, p):
         return (p - self.center).normalize()
 
+    def bounds(self):
+        r = self.radius
+        lo = tuple(c - r for c in self.center.raw)
+        hi = tuple(c + r for c in self.center.raw)
+        return lo, hi
+
     def intersection(self, ray):
         co = self.center - ray.origin
         f = co * ray.direction
@@ -404,6 +494,21 @@ class Plane(Body):
         self.point = point
         self.norm = norm
 
+    @classmethod
+    def restore(cls, point, norm):
+        """
+        Recreates a plane of a norm that was normalized
+        already (@see scenecache.py) without normalizing
+        it again.
+        """
+        self = cls.__new__(cls)
+        self.point = point
+        if type(norm) is not Vector:
+            msg = EMSG['setter'] % ("Plane", type(Vector), type(norm))
+            raise GeometryException(msg)
+        self._norm = norm
+        return self
+
     @property
     def point(self):
         return self._point
@@ -466,8 +571,6 @@ class Triangle(Body):
 
     def __init__(self, a, b, c):
         self.vertices = (a, b, c)
-        self.u = b - a
-        self.v = c - a
 
     @property
     def vertices(self):
@@ -489,28 +592,60 @@ class Triangle(Body):
 
             self._vertices = t
             self.a, self.b, self.c = t
+            self._precompute()
 
         else:
             msg = EMSG['setter'] % ("Triangle", type(tuple), type(t))
             raise GeometryException(msg)
 
+    def _precompute(self):
+        """
+        Derives everything from the vertices that does not
+        depend on the rays: the edges u = b - a, v = c - a,
+        the normal and the compact form packed, a tuple of
+        the coordinates of a, u and v that the intersection
+        routines (scalar and batched) work on.
+        """
+        self.u = self.b - self.a
+        self.v = self.c - self.a
+        normal = self.u ** self.v
+        # degenerate (collinear) triangles are never hit
+        # and keep the zero normal
+        self._normal = normal.normalize() if normal.length else normal
+        self.packed = self.a.raw + self.u.raw + self.v.raw
+
     def normal(self, p):
-        return (self.u ** self.v).normalize()
+        return self._normal
+
+    def bounds(self):
+        raw = [p.raw for p in self.vertices]
+        return tuple(map(min, zip(*raw))), tuple(map(max, zip(*raw)))
 
     def intersection(self, ray):
-        w = ray.origin - self.a
-        dv = ray.direction ** self.v
-        cosalpha = dv * self.u
+        # Möller-Trumbore on the packed components, the same
+        # operations as with vectors: w = o - a, dv = d ** v,
+        # wu = w ** u and the dot products with them
+        ax, ay, az, ux, uy, uz, vx, vy, vz = self.packed
+        o, d = ray.origin, ray.direction
+        dx, dy, dz = d.x, d.y, d.z
+
+        px = dy * vz - vy * dz
+        py = dz * vx - vz * dx
+        pz = dx * vy - vx * dy
+        cosalpha = px * ux + py * uy + pz * uz
 
         if cosalpha == 0:
             return None
 
-        wu = w ** self.u
-        r = (dv * w) / cosalpha
-        s = (wu * ray.direction) / cosalpha
+        wx, wy, wz = o.x - ax, o.y - ay, o.z - az
+        qx = wy * uz - uy * wz
+        qy = wz * ux - uz * wx
+        qz = wx * uy - ux * wy
+        r = (px * wx + py * wy + pz * wz) / cosalpha
+        s = (qx * dx + qy * dy + qz * dz) / cosalpha
 
         if 0 <= r and r <= 1 and 0 <= s and s <= 1 and r + s <= 1:
-            return (wu * self.v) / cosalpha
+            return (qx * vx + qy * vy + qz * vz) / cosalpha
 
     def clone(self):
         return Triangle(*self.vertices)
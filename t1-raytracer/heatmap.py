@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import instrument
+from framebuffer import Framebuffer
+
+
+"""
+
+Per pixel cost heatmaps.
+
+Every pixel of a picture gets shaded on its own while its
+cost is measured, either as the number of intersection
+tests (@see instrument.py) or as the time spent shading it.
+The costs are tone mapped to a color ramp from black (cheap)
+over blue, cyan, green and yellow to red and white (most
+expensive), which shows at a glance which bodies dominate
+the render time.
+
+"""
+
+
+EMSG = {
+    'metric': "Unknown heatmap metric %s, expected one of %s."
+}
+
+METRICS = ('tests', 'time')
+
+RAMP = [
+    (0, 0, 0),
+    (0, 0, 255),
+    (0, 255, 255),
+    (0, 255, 0),
+    (255, 255, 0),
+    (255, 0, 0),
+    (255, 255, 255)
+]
+
+# costs above this quantile get clipped so that
+# single outliers don't darken the whole map
+QUANTILE = .99
+
+
+def ramp(value):
+    """
+    Maps a value of [0, 1] to a color of the ramp.
+    """
+    value = min(1., max(0., value)) * (len(RAMP) - 1)
+    i = min(int(value), len(RAMP) - 2)
+    f = value - i
+    a, b = RAMP[i], RAMP[i + 1]
+    return tuple(int(ca + (cb - ca) * f + .5) for ca, cb in zip(a, b))
+
+
+def tonemap(res, costs, quantile=QUANTILE):
+    """
+    Translates the costs (row by row) to a Framebuffer.
+    Returns the framebuffer and the cost mapped to the
+    end of the ramp.
+
+    res      -- Tuple of width and height
+    costs    -- Sequence of one cost per pixel
+    quantile -- (Optional) Quantile of the costs that is
+                mapped to the end of the ramp
+    """
+    ordered = sorted(costs)
+    top = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+    scale = 1. / top if top > 0 else 0.
+
+    framebuffer = Framebuffer(res)
+    raw = framebuffer.raw
+    for i, cost in enumerate(costs):
+        raw[i * 3:i * 3 + 3] = bytes(ramp(cost * scale))
+    return framebuffer, top
+
+
+class HeatmapException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class Heatmap(object):
+    """
+    Renders pictures together with their cost heatmaps.
+    """
+
+    def __str__(self):
+        unit = 'intersection tests' if self.metric == 'tests' else 'time'
+        return "heatmap of the %s per pixel" % unit
+
+    def __init__(self, metric='tests'):
+        """
+        metric -- Either "tests" to count the intersection
+                  tests or "time" to measure the shading time
+        """
+        if metric not in METRICS:
+            msg = EMSG['metric'] % (metric, ', '.join(METRICS))
+            raise HeatmapException(msg)
+        self.metric = metric
+
+        # statistics of the last picture
+        self.total = 0
+        self.peak = 0
+        self.top = 0
+        self.pixels = 0
+
+    def shoot(self, camera, eye, up):
+        """
+        Shoots a picture and returns its framebuffer and
+        the framebuffer of the heatmap.
+
+        camera -- raytracer.Camera with a scalar shader
+        eye    -- Point to look from
+        up     -- The cameras tilt
+        """
+        if self.metric == 'time':
+            counter = instrument.timer
+            enabled = False
+        else:
+            enabled = instrument.enabled()
+            tests = instrument.enable().tests
+            counter = lambda: sum(entry[0] for entry in tests.values())
+
+        try:
+            framebuffer, costs = camera.shootCosts(eye, up, counter)
+        finally:
+            if self.metric == 'tests' and not enabled:
+                instrument.disable()
+
+        heatmap, self.top = tonemap(camera.resolution, costs)
+        self.total = sum(costs)
+        self.peak = max(costs) if costs else 0
+        self.pixels = len(costs)
+        return framebuffer, heatmap
+
+    def report(self):
+        """
+        Returns a summary of the last picture.
+        """
+        if self.metric == 'time':
+            fmt = lambda v: '%.1fus' % (v * 1e6)
+        else:
+            fmt = lambda v: '%.1f tests' % v
+        mean = self.total / float(max(self.pixels, 1))
+        return "pixel costs: mean %s, peak %s, ramp ends at %s" % (
+            fmt(mean), fmt(self.peak), fmt(self.top))
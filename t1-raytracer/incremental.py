@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import hashlib
+
+import numpy as np
+
+import geometry as gm
+from framebuffer import Framebuffer
+
+
+"""
+
+Incremental re-rendering.
+
+While a picture is shot every pixel records the bodies its
+ray tree touched: the body hit by the primary ray, the bodies
+blocking its shadow rays and the bodies hit by its reflections.
+The sets are kept as bit masks (one bit per body id, @see
+World.bodyid).
+
+When the same picture is shot again after the materials of
+some bodies changed (color, texture, shininess, smoothness),
+only the pixels whose masks contain one of these bodies are
+traced again, all others are taken from the previous picture.
+Any other change (moved, added or removed bodies, lights,
+camera, shader) can affect pixels that never touched the body,
+so the picture is rendered from scratch.
+
+The result equals a full render unless reflections are
+terminated by russian roulette, which draws its random
+numbers in another order.
+
+"""
+
+
+class Dependencies(object):
+    """
+    Bit masks of the bodies the ray tree of every pixel
+    touched, one row of bytes per pixel (y * width + x).
+    """
+
+    def __str__(self):
+        return "dependencies %dx%d (%d bodies)" % (
+            self.resolution + (self.count,))
+
+    def __init__(self, resolution, count):
+        """
+        resolution -- Tuple of width and height
+        count      -- Number of body ids (the highest id + 1)
+        """
+        self.resolution = tuple(resolution)
+        self.count = count
+        self._size = max(1, -(-count // 8))
+        width, height = self.resolution
+        self.masks = np.zeros((width * height, self._size), np.uint8)
+
+    def put(self, x, y, mask):
+        """
+        Sets the bodies of one pixel.
+
+        x, y -- Pixel coordinates
+        mask -- Integer with the bit of every body id set
+        """
+        row = np.frombuffer(mask.to_bytes(self._size, 'little'), np.uint8)
+        self.masks[y * self.resolution[0] + x] = row
+
+    def store(self, xs, ys, touched):
+        """
+        Batched self.put.
+
+        xs, ys  -- Integer arrays of the pixel coordinates
+        touched -- (N, count) boolean matrix of the bodies
+        """
+        rows = np.asarray(ys) * self.resolution[0] + np.asarray(xs)
+        bits = np.packbits(touched, axis=1, bitorder='little')
+        self.masks[rows, :bits.shape[1]] = bits
+
+    def mask(self, ids):
+        """
+        Returns the bit mask of the given body ids as a row.
+        """
+        mask = np.zeros(self._size, np.uint8)
+        for i in ids:
+            if 0 <= i < self.count:
+                mask[i >> 3] |= 1 << (i & 7)
+        return mask
+
+    def affected(self, ids):
+        """
+        Returns a boolean array of the pixels that
+        depend on any of the given body ids.
+        """
+        return (self.masks & self.mask(ids)).any(axis=1)
+
+
+def _geometry(body):
+    geometry = body.geometry
+    if type(geometry) is gm.Sphere:
+        return ('sphere', geometry.center.raw, geometry.radius)
+    if type(geometry) is gm.Plane:
+        return ('plane', geometry.point.raw, geometry.norm.raw)
+    if type(geometry) is gm.Triangle:
+        return ('triangle',) + tuple(p.raw for p in geometry.vertices)
+
+    digest = hashlib.sha1()
+    for name, array in sorted(geometry.export().items()):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return (type(geometry).__name__, digest.hexdigest())
+
+
+def _material(body):
+    texture = body.texture
+    if texture is not None:
+        paint = (texture.checksize, texture.color1.raw, texture.color2.raw)
+    else:
+        paint = body.color.raw
+    return (paint, body.shininess, body.smoothness)
+
+
+def snapshot(camera):
+    """
+    Returns the state of everything a picture of the
+    camera depends on: the settings of the camera, its
+    shader and world and the geometry and material of
+    every body (by id).
+    """
+    world, shader = camera.world, camera.shader
+    settings = (
+        camera.resolution, camera.width, camera.height,
+        type(shader).__name__, shader.depth, shader.threshold,
+        shader.roulette, world.center.raw, world.background.raw,
+        world.lightness, world.maxdist,
+        tuple((l.geometry.raw, l.color.raw) for l in world.lights))
+
+    bodies = dict(
+        (world.bodyid(body), (_geometry(body), _material(body)))
+        for body in world.bodies)
+    return settings, bodies
+
+
+def changes(old, new):
+    """
+    Compares two snapshots. Returns the ids of the bodies
+    whose materials changed or None if anything else did.
+    """
+    if old[0] != new[0] or set(old[1]) != set(new[1]):
+        return None
+
+    changed = set()
+    for bodyid, (geometry, material) in new[1].items():
+        before = old[1][bodyid]
+        if before[0] != geometry:
+            return None
+        if before[1] != material:
+            changed.add(bodyid)
+    return changed
+
+
+class Incremental(object):
+    """
+    Shoots pictures of a camera and keeps every picture
+    together with its dependencies. Shooting a picture
+    again retraces only the pixels that depend on bodies
+    whose materials changed since.
+
+    With the numpy engine the shader has to be created
+    again after changing materials, since it copies them
+    on construction (@see vectorized.Phong).
+    """
+
+    def __str__(self):
+        return "incremental renderer (%d pictures)" % len(self._pictures)
+
+    def __init__(self, camera):
+        """
+        camera -- raytracer.Camera instance with a shader
+        """
+        self._camera = camera
+        # (eye, up) -> framebuffer, dependencies and snapshot
+        self._pictures = {}
+
+        # bodies whose materials changed and pixels
+        # traced by the last picture
+        self.changed = None
+        self.retraced = 0
+
+    def shoot(self, eye, up):
+        """
+        Shoots a picture, reusing the previous one from the
+        same position as far as possible. Returns a new
+        framebuffer.
+
+        eye -- Point to look from
+        up  -- The cameras tilt
+        """
+        camera = self._camera
+        world = camera.world
+        width, height = camera.resolution
+
+        key = (tuple(eye), tuple(up))
+        state = snapshot(camera)
+        previous = self._pictures.get(key)
+        changed = None if previous is None else changes(previous[2], state)
+
+        if changed is None:
+            count = max([world.bodyid(b) for b in world.bodies] + [-1]) + 1
+            dependencies = Dependencies(camera.resolution, count)
+            framebuffer = camera.shoot(eye, up, dependencies=dependencies)
+            self.retraced = width * height
+        else:
+            framebuffer, dependencies = previous[:2]
+            framebuffer = Framebuffer(
+                camera.resolution, bytearray(framebuffer.raw))
+
+            rows = np.flatnonzero(dependencies.affected(changed))
+            ys, xs = np.divmod(rows, width)
+            if len(rows):
+                data = camera.shootPixels(
+                    eye, up, list(zip(xs.tolist(), ys.tolist())),
+                    dependencies)
+                view = np.frombuffer(framebuffer.raw, np.uint8)
+                view.reshape(-1, 3)[rows] = \
+                    np.frombuffer(data, np.uint8).reshape(-1, 3)
+            self.retraced = len(rows)
+
+        self.changed = changed
+        self._pictures[key] = (framebuffer, dependencies, state)
+        return framebuffer
+
+    def report(self):
+        """
+        Returns a summary of the last picture.
+        """
+        width, height = self._camera.resolution
+        if self.changed is None:
+            reason = 'rendered from scratch'
+        else:
+            reason = '%d bodies changed' % len(self.changed)
+        return "retraced %d of %d pixels (%s)" % (
+            self.retraced, width * height, reason)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import time
+import inspect
+import functools
+
+
+"""
+
+Optional instrumentation of the hot paths.
+
+The renderer itself does not contain any counters. enable()
+replaces the methods of interest by wrappers that count
+and time their calls, disable() puts the originals back.
+As long as it is disabled there is no overhead at all.
+
+Collected are intersection tests (and hits) per geometry
+type, shadow rays per light source, the recursion depth
+of the shaded rays and the time spent in the stages of
+the scalar and the numpy engine. Only the process calling
+enable() is instrumented, the workers of a
+parallel.TileRenderer are not.
+
+patch() and restore() are the one way of wrapping methods
+for measurements; benchmark.counting uses them, too.
+
+"""
+
+
+# the clock of all measurements of the renderer
+timer = getattr(time, 'perf_counter', time.time)
+
+# the active Stats instance and the replaced methods
+_stats = None
+_patches = []
+
+
+class Stats(object):
+    """
+    Counters of one instrumented session.
+    """
+
+    def __init__(self):
+        # geometry name -> [tests, hits]
+        self.tests = {}
+        # light -> [rays, blocked]
+        self.shadows = {}
+        # recursion level -> shaded rays
+        self.depths = {}
+        # stage name -> [calls, seconds]
+        self.stages = {}
+        self.started = timer()
+
+    @property
+    def maxdepth(self):
+        return max(self.depths) if self.depths else None
+
+    def summary(self):
+        """
+        Returns a multi line report of all counters.
+        """
+        lines = ['profile (%.2fs):' % (timer() - self.started)]
+
+        if any(tests for tests, hits in self.tests.values()):
+            lines.append('  intersection tests:')
+            for name, (tests, hits) in sorted(self.tests.items()):
+                if not tests:
+                    continue
+                lines.append('    %-10s %10d tests %10d hits %10d misses' % (
+                    name, tests, hits, tests - hits))
+
+        if self.shadows:
+            lines.append('  shadow rays:')
+            for light, (rays, blocked) in self.shadows.items():
+                position = ', '.join('%g' % c for c in light.geometry.raw)
+                lines.append('    light (%s) %10d rays %10d blocked' % (
+                    position, rays, blocked))
+
+        if self.depths:
+            levels = ', '.join(
+                '%d: %d' % item for item in sorted(self.depths.items()))
+            lines.append('  shaded rays per recursion level: %s' % levels)
+            lines.append('  recursion depth reached: %d' % self.maxdepth)
+
+        if any(calls for calls, seconds in self.stages.values()):
+            lines.append('  stages (calls, inclusive time):')
+            for name, (calls, seconds) in self.stages.items():
+                if calls:
+                    lines.append('    %-30s %10d %9.3fs' % (
+                        name, calls, seconds))
+
+        return '\n'.join(lines)
+
+
+def patch(owner, name, wrap, patches):
+    """
+    Replaces a method by a wrapper around it.
+
+    owner   -- Class of the method
+    name    -- Name of the method
+    wrap    -- Callable that returns the wrapper of a method
+    patches -- List that keeps what restore() puts back
+    """
+    method = getattr(owner, name)
+    original = owner.__dict__.get(name)
+    setattr(owner, name, functools.update_wrapper(wrap(method), method))
+    patches.append((owner, name, original))
+
+
+def restore(patches):
+    """
+    Puts back the methods replaced by patch(), the
+    last replaced first, and empties the list.
+    """
+    while patches:
+        owner, name, original = patches.pop()
+        if original is None:
+            # the method was inherited
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+
+def _counted(stats, key):
+    entry = stats.tests.setdefault(key, [0, 0])
+
+    def wrap(intersection):
+        def wrapper(self, ray):
+            hit = intersection(self, ray)
+            entry[0] += 1
+            if hit:
+                entry[1] += 1
+            return hit
+        return wrapper
+    return wrap
+
+
+def _timed(stats, key):
+    entry = stats.stages.setdefault(key, [0, 0.])
+
+    def wrap(method):
+        # recursive calls (reflections) are part of
+        # the outermost one and are not timed twice
+        active = [False]
+
+        def wrapper(*args, **kwargs):
+            entry[0] += 1
+            if active[0]:
+                return method(*args, **kwargs)
+
+            active[0] = True
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                entry[1] += timer() - start
+                active[0] = False
+        return wrapper
+    return wrap
+
+
+def _shadows(stats):
+    def wrap(occluded):
+        def wrapper(self, point, light, exclude=None):
+            blocker = occluded(self, point, light, exclude)
+            entry = stats.shadows.get(light)
+            if entry is None:
+                entry = stats.shadows[light] = [0, 0]
+            entry[0] += 1
+            if blocker is not None:
+                entry[1] += 1
+            return blocker
+        return wrapper
+    return wrap
+
+
+def _depths(stats, batched):
+    def wrap(illuminate):
+        signature = inspect.signature(illuminate)
+
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs).arguments
+            level = self.depth - bound['d']
+            rays = len(bound['origins']) if batched else 1
+            stats.depths[level] = stats.depths.get(level, 0) + rays
+            return illuminate(self, *args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def enabled():
+    return _stats is not None
+
+
+def enable():
+    """
+    Instruments the renderer and returns the Stats
+    instance that collects the counters. Enabling
+    it twice returns the active instance.
+    """
+    global _stats
+    if _stats is not None:
+        return _stats
+
+    import geometry as gm
+    import bodies as bd
+    import meshes
+    import shader
+    import vectorized as vc
+    import raytracer as rt
+
+    stats = Stats()
+    for geometry in (gm.Sphere, gm.Plane, gm.Triangle, meshes.Mesh):
+        patch(geometry, 'intersection',
+              _counted(stats, geometry.__name__), _patches)
+
+    patch(rt.World, 'occluded', _shadows(stats), _patches)
+    patch(shader.Phong, 'illuminate', _depths(stats, False), _patches)
+    patch(vc.Phong, 'illuminate', _depths(stats, True), _patches)
+
+    stages = [
+        ('Phong.sample', shader.Phong, 'sample'),
+        ('World.trace', rt.World, 'trace'),
+        ('World.occluded', rt.World, 'occluded'),
+        ('Phong.colorize', shader.Phong, 'colorize'),
+        ('CheckerboardTexture.colorAt', bd.CheckerboardTexture, 'colorAt'),
+        ('vectorized.Phong.sample', vc.Phong, 'sample'),
+        ('vectorized.Phong.trace', vc.Phong, 'trace'),
+        ('vectorized.Phong.occluded', vc.Phong, 'occluded'),
+        ('vectorized.Phong.colorize', vc.Phong, 'colorize'),
+    ]
+    for key, owner, name in stages:
+        patch(owner, name, _timed(stats, key), _patches)
+
+    _stats = stats
+    return stats
+
+
+def disable():
+    """
+    Restores the original methods. Returns the Stats
+    instance of the session (or None).
+    """
+    global _stats
+    restore(_patches)
+    stats, _stats = _stats, None
+    return stats
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import math
+from array import array
+
+import numpy as np
+
+import geometry as gm
+
+
+"""
+
+Triangle meshes loaded from wavefront obj files.
+
+A mesh is a single body of the world. Its vertices, normals
+and face indices are kept in flat arrays instead of one
+geometry.Triangle per face, so models with tens of thousands
+of faces neither need tens of thousands of python objects
+nor bloat the worlds acceleration structure. Rays get tested
+against the faces with a bounding volume hierarchy of its
+own that is built with numpy.
+
+"""
+
+
+EMSG = {
+    'index': "%s:%d: Face references the missing %s %d.",
+    'empty': "%s: The file does not contain any faces."
+}
+
+EPSILON = 1e-5
+
+# replaces 1/0 for axis parallel rays in the slab test
+BIG = 1e300
+
+# boxes get enlarged by this amount to compensate
+# rounding errors of the intersection routine
+PADDING = 1e-7
+
+
+class MeshException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _index(token, count):
+    """
+    Translates a (one based, possibly negative)
+    obj index to a zero based one.
+    """
+    i = int(token)
+    return i - 1 if i > 0 else count + i
+
+
+def read(fname):
+    """
+    Parses the v, vn and f directives of a wavefront
+    obj file. Polygons get split into triangle fans.
+    Returns the flat arrays of vertex coordinates,
+    normal coordinates, vertex indices (three per face)
+    and normal indices (three per face, empty if the
+    faces do not reference normals).
+
+    fname -- File name of the obj file
+    """
+    vertices, normals = array('d'), array('d')
+    faces, fnormals = array('l'), array('l')
+    withnormals = True
+
+    with open(fname) as f:
+        for lineno, line in enumerate(f, 1):
+            parts = line.split()
+            if not parts:
+                continue
+
+            directive = parts[0]
+            if directive == 'v':
+                vertices.extend(map(float, parts[1:4]))
+            elif directive == 'vn':
+                normals.extend(map(float, parts[1:4]))
+            elif directive == 'f':
+                vcount, ncount = len(vertices) // 3, len(normals) // 3
+                vs, ns = [], []
+                for token in parts[1:]:
+                    refs = token.split('/')
+                    vs.append(_index(refs[0], vcount))
+                    if len(refs) > 2 and refs[2]:
+                        ns.append(_index(refs[2], ncount))
+
+                for i in vs:
+                    if not 0 <= i < vcount:
+                        msg = EMSG['index'] % (fname, lineno, 'vertex', i + 1)
+                        raise MeshException(msg)
+                for i in ns:
+                    if not 0 <= i < ncount:
+                        msg = EMSG['index'] % (fname, lineno, 'normal', i + 1)
+                        raise MeshException(msg)
+
+                withnormals = withnormals and len(ns) == len(vs)
+                for k in range(1, len(vs) - 1):
+                    faces.extend((vs[0], vs[k], vs[k + 1]))
+                    if withnormals:
+                        fnormals.extend((ns[0], ns[k], ns[k + 1]))
+
+    if not faces:
+        raise MeshException(EMSG['empty'] % fname)
+
+    if not withnormals:
+        fnormals = array('l')
+    return vertices, normals, faces, fnormals
+
+
+def _frombuffer(typecode, data):
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(data).tobytes())
+    return result
+
+
+def _view(typecode, data):
+    """
+    Returns a flat memoryview over a numpy array without
+    copying it. Indexing it yields python numbers like an
+    array.array does.
+    """
+    data = np.ascontiguousarray(data).reshape(-1)
+    return memoryview(data).cast('B').cast(typecode)
+
+
+class Mesh(gm.Body):
+    """
+    Triangle mesh geometry. The faces get reordered by the
+    hierarchy; every node stores its bounds, the split axis
+    and either the index of its first child (the second one
+    follows directly) or the range of its faces.
+
+    The mesh keeps no state of the rays tested against it;
+    normal() looks up the face that contains the point in the
+    hierarchy. Unlike the other geometries a mesh may occlude
+    itself, so rays leaving its surface must not exclude it.
+    """
+
+    LEAFSIZE = 4
+
+    convex = False
+
+    def __str__(self):
+        return "Mesh: (%d vertices, %d faces)" % (
+            len(self.vertices) // 3, len(self.faces) // 3)
+
+    def __init__(self, vertices, faces, normals=None, fnormals=None):
+        """
+        vertices -- Flat array of vertex coordinates
+        faces    -- Flat array of vertex indices, three per face
+        normals  -- (Optional) Flat array of normal coordinates
+        fnormals -- (Optional) Flat array of normal indices
+                    per face vertex that get interpolated
+        """
+        self.vertices = vertices
+        self.faces = faces
+        self.normals = normals if normals is not None else array('d')
+        self.fnormals = fnormals if fnormals is not None else array('l')
+        self._build()
+
+    def _build(self):
+        """
+        Builds the hierarchy by splitting the faces at the
+        median centroid along the axis of greatest extent.
+        """
+        vertices = np.frombuffer(self.vertices, float).reshape(-1, 3)
+        faces = np.frombuffer(self.faces, np.dtype('l')).reshape(-1, 3)
+        a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], \
+            vertices[faces[:, 2]]
+
+        tlo = np.minimum(np.minimum(a, b), c)
+        thi = np.maximum(np.maximum(a, b), c)
+        centroids = (tlo + thi) / 2.
+
+        order = np.arange(len(faces))
+        bounds, first, count, axes = [], [], [], []
+
+        def node():
+            bounds.append(None)
+            first.append(0)
+            count.append(0)
+            axes.append(0)
+            return len(first) - 1
+
+        stack = [(node(), 0, len(faces))]
+        while stack:
+            current, start, end = stack.pop()
+            idx = order[start:end]
+            lo = tlo[idx].min(axis=0) - PADDING
+            hi = thi[idx].max(axis=0) + PADDING
+            bounds[current] = np.concatenate((lo, hi))
+
+            axis, extent = 0, 0.
+            if end - start > self.LEAFSIZE:
+                cent = centroids[idx]
+                extents = cent.max(axis=0) - cent.min(axis=0)
+                axis = int(extents.argmax())
+                extent = extents[axis]
+
+            if extent <= 0:
+                first[current], count[current] = start, end - start
+                continue
+
+            mid = (end - start) // 2
+            part = np.argpartition(centroids[idx, axis], mid)
+            order[start:end] = idx[part]
+
+            left = node()
+            node()
+            first[current], axes[current] = left, axis
+            stack.append((left + 1, start + mid, end))
+            stack.append((left, start, start + mid))
+
+        # a, u = b - a and v = c - a of every face in tree order
+        packed = np.hstack((a, b - a, c - a))[order]
+
+        self._bounds = _frombuffer('d', np.array(bounds))
+        self._first = array('l', first)
+        self._count = array('l', count)
+        self._axis = array('b', axes)
+        self._order = _frombuffer('l', order.astype(np.dtype('l')))
+        self._packed = _frombuffer('d', packed)
+        self._lo = tuple(map(float, tlo.min(axis=0)))
+        self._hi = tuple(map(float, thi.max(axis=0)))
+
+    # flat arrays that make up a mesh and their typecodes
+    ARRAYS = (
+        ('vertices', 'd'), ('faces', 'l'), ('normals', 'd'),
+        ('fnormals', 'l'), ('_bounds', 'd'), ('_first', 'l'),
+        ('_count', 'l'), ('_axis', 'b'), ('_order', 'l'),
+        ('_packed', 'd'))
+
+    def export(self):
+        """
+        Returns the arrays of the mesh and its hierarchy
+        as a dictionary of numpy arrays (@see restore).
+        """
+        state = dict(
+            (name, np.frombuffer(getattr(self, name), np.dtype(code))
+             if len(getattr(self, name)) else np.zeros(0, np.dtype(code)))
+            for name, code in self.ARRAYS)
+        state['bounds'] = np.array(self._lo + self._hi)
+        return state
+
+    @classmethod
+    def restore(cls, state):
+        """
+        Recreates an exported mesh without reading the obj
+        file or building the hierarchy. The arrays are not
+        copied; the mesh keeps views over memory mapped ones.
+
+        state -- Dictionary returned by export (the arrays
+                 may be memory mapped)
+        """
+        self = cls.__new__(cls)
+        for name, code in self.ARRAYS:
+            setattr(self, name, _view(code, state[name]))
+        bounds = tuple(map(float, state['bounds']))
+        self._lo, self._hi = bounds[:3], bounds[3:]
+        return self
+
+    def __getstate__(self):
+        # views can not be pickled, the worker
+        # processes get copies of the arrays
+        state = self.__dict__.copy()
+        for name, code in self.ARRAYS:
+            if isinstance(state[name], memoryview):
+                state[name] = _frombuffer(code, state[name])
+        return state
+
+    @property
+    def nodes(self):
+        return len(self._first)
+
+    def bounds(self):
+        return self._lo, self._hi
+
+    def intersection(self, ray):
+        ox, oy, oz = ray.origin.raw
+        dx, dy, dz = direction = ray.direction.raw
+        ix = 1. / dx if dx else BIG
+        iy = 1. / dy if dy else BIG
+        iz = 1. / dz if dz else BIG
+
+        bounds, first, count = self._bounds, self._first, self._count
+        axes, packed = self._axis, self._packed
+
+        minhit = float('inf')
+        stack = [0]
+        while stack:
+            node = stack.pop()
+
+            i = node * 6
+            t1, t2 = (bounds[i] - ox) * ix, (bounds[i + 3] - ox) * ix
+            tmin, tmax = (t1, t2) if t1 < t2 else (t2, t1)
+            t1, t2 = (bounds[i + 1] - oy) * iy, (bounds[i + 4] - oy) * iy
+            if t1 > t2:
+                t1, t2 = t2, t1
+            tmin = t1 if t1 > tmin else tmin
+            tmax = t2 if t2 < tmax else tmax
+            t1, t2 = (bounds[i + 2] - oz) * iz, (bounds[i + 5] - oz) * iz
+            if t1 > t2:
+                t1, t2 = t2, t1
+            tmin = t1 if t1 > tmin else tmin
+            tmax = t2 if t2 < tmax else tmax
+
+            if tmin > tmax or tmax < EPSILON or tmin >= minhit:
+                continue
+
+            n = count[node]
+            if not n:
+                # the second child holds the greater centroids
+                child = first[node]
+                if direction[axes[node]] < 0:
+                    stack.append(child)
+                    stack.append(child + 1)
+                else:
+                    stack.append(child + 1)
+                    stack.append(child)
+                continue
+
+            # Möller-Trumbore
+            for k in range(first[node], first[node] + n):
+                j = k * 9
+                ax, ay, az = packed[j], packed[j + 1], packed[j + 2]
+                ux, uy, uz = packed[j + 3], packed[j + 4], packed[j + 5]
+                vx, vy, vz = packed[j + 6], packed[j + 7], packed[j + 8]
+
+                px = dy * vz - dz * vy
+                py = dz * vx - dx * vz
+                pz = dx * vy - dy * vx
+                det = ux * px + uy * py + uz * pz
+                if det == 0:
+                    continue
+                inv = 1. / det
+
+                sx, sy, sz = ox - ax, oy - ay, oz - az
+                r = (sx * px + sy * py + sz * pz) * inv
+                if r < 0 or r > 1:
+                    continue
+
+                qx = sy * uz - sz * uy
+                qy = sz * ux - sx * uz
+                qz = sx * uy - sy * ux
+                s = (dx * qx + dy * qy + dz * qz) * inv
+                if s < 0 or r + s > 1:
+                    continue
+
+                t = (vx * qx + vy * qy + vz * qz) * inv
+                if EPSILON <= t < minhit:
+                    minhit = t
+
+        if minhit == float('inf'):
+            return None
+        return minhit
+
+    def _locate(self, point):
+        """
+        Returns the face (in tree order) that contains the
+        point and the barycentric coordinates of the point
+        on it. Faces the point lies on within the rounding
+        errors of intersection are preferred by distance.
+        """
+        px, py, pz = point
+        bounds, first, count = self._bounds, self._first, self._count
+        packed = self._packed
+
+        best, found = None, (float('inf'), float('inf'))
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            i = node * 6
+            if px < bounds[i] - PADDING or px > bounds[i + 3] + PADDING or \
+                    py < bounds[i + 1] - PADDING or \
+                    py > bounds[i + 4] + PADDING or \
+                    pz < bounds[i + 2] - PADDING or \
+                    pz > bounds[i + 5] + PADDING:
+                continue
+
+            n = count[node]
+            if not n:
+                stack.append(first[node])
+                stack.append(first[node] + 1)
+                continue
+
+            for k in range(first[node], first[node] + n):
+                j = k * 9
+                wx, wy, wz = px - packed[j], py - packed[j + 1], \
+                    pz - packed[j + 2]
+                ux, uy, uz = packed[j + 3], packed[j + 4], packed[j + 5]
+                vx, vy, vz = packed[j + 6], packed[j + 7], packed[j + 8]
+
+                uu = ux * ux + uy * uy + uz * uz
+                uv = ux * vx + uy * vy + uz * vz
+                vv = vx * vx + vy * vy + vz * vz
+                wu = wx * ux + wy * uy + wz * uz
+                wv = wx * vx + wy * vy + wz * vz
+                det = uu * vv - uv * uv
+                if det <= 0:
+                    continue
+                r = (vv * wu - uv * wv) / det
+                s = (uu * wv - uv * wu) / det
+
+                # distances outside of the face and to its plane
+                outside = max(0., -r, -s, r + s - 1.)
+                nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, \
+                    ux * vy - uy * vx
+                dist = abs(wx * nx + wy * ny + wz * nz) / math.sqrt(det)
+                key = (max(0., outside - PADDING), dist)
+                if key < found:
+                    best, found = (k, r, s), key
+        return best
+
+    def normal(self, point):
+        """
+        Returns the normal of the face that contains the
+        point. It is interpolated from the vertex normals
+        if the obj file provided them.
+        """
+        k, r, s = self._locate(point.raw)
+        if self.fnormals:
+            face = self._order[k] * 3
+            normals, w = self.normals, 1. - r - s
+            n0, n1, n2 = (self.fnormals[face + i] * 3 for i in range(3))
+            raw = tuple(
+                w * normals[n0 + c] + r * normals[n1 + c] + s * normals[n2 + c]
+                for c in range(3))
+        else:
+            j = k * 9
+            ux, uy, uz = self._packed[j + 3:j + 6]
+            vx, vy, vz = self._packed[j + 6:j + 9]
+            raw = (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+        length = math.sqrt(raw[0] ** 2 + raw[1] ** 2 + raw[2] ** 2)
+        return gm.Vector(tuple(c / length for c in raw))
+
+
+def load(fname, position=(0, 0, 0), scale=1.):
+    """
+    Loads an obj file as Mesh. The model gets scaled
+    uniformly and moved by position.
+
+    fname    -- File name of the obj file
+    position -- (Optional) Translation of all vertices
+    scale    -- (Optional) Scaling factor of all vertices
+    """
+    vertices, normals, faces, fnormals = read(fname)
+
+    coords = np.frombuffer(vertices, float).reshape(-1, 3)
+    coords = coords * scale + np.array(position, float)
+    vertices = _frombuffer('d', coords)
+
+    return Mesh(vertices, faces, normals, fnormals)
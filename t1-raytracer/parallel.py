@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import multiprocessing as mp
+from array import array
+
+from framebuffer import Framebuffer
+
+
+"""
+
+Multi process rendering.
+
+The picture gets split into square tiles that are rendered
+by a pool of worker processes. Every worker receives the
+camera (and with it the world and the shader) exactly once
+when it is started and writes finished tiles directly into
+a framebuffer in shared memory.
+
+"""
+
+
+# state of a worker process (@see _init)
+_camera = None
+_framebuffer = None
+_antialiasing = None
+
+
+def _morton(x, y):
+    """
+    Interleaves the bits of x and y.
+    """
+    key = 0
+    for bit in range(16):
+        key |= ((x >> bit) & 1) << (2 * bit)
+        key |= ((y >> bit) & 1) << (2 * bit + 1)
+    return key
+
+
+def tiles(res, size):
+    """
+    Splits an image of the given resolution into tiles
+    of (at most) size x size pixels. The tiles are
+    returned as (x0, y0, x1, y1) tuples in Z-order so
+    that consecutive tiles lie next to each other.
+
+    res  -- Tuple of image width and height
+    size -- Edge length of a tile
+    """
+    width, height = res
+    cols = (width + size - 1) // size
+    rows = (height + size - 1) // size
+
+    order = sorted(
+        ((tx, ty) for tx in range(cols) for ty in range(rows)),
+        key=lambda t: _morton(*t))
+
+    return [
+        (tx * size, ty * size,
+         min(width, (tx + 1) * size), min(height, (ty + 1) * size))
+        for tx, ty in order]
+
+
+def _init(camera, framebuffer, antialiasing=None):
+    global _camera, _framebuffer, _antialiasing
+    _camera = camera
+    _framebuffer = framebuffer
+    _antialiasing = antialiasing
+
+
+def _render(job):
+    eye, up, tile = job
+    data = _camera.shootTile(eye, up, tile)
+    _framebuffer.blit(tile, data)
+    return tile
+
+
+def _renderPixels(job):
+    eye, up, pixels = job
+    return _camera.shootPixels(eye, up, pixels)
+
+
+def _renderSamples(job):
+    eye, up, points = job
+    return _camera.shootSamples(eye, up, points)
+
+
+def _renderPicture(job):
+    index, eye, up = job
+    if _antialiasing is not None:
+        framebuffer = _antialiasing.shoot(_camera, eye, up)
+        return index, framebuffer.raw, _antialiasing.report()
+    return index, _camera.shoot(eye, up).raw, None
+
+
+class PictureRenderer(object):
+    """
+    Renders all pictures of a scene at once. Every worker
+    process receives the camera (with the world, its
+    acceleration structure and the shader) exactly once and
+    renders whole pictures, one position after another.
+    """
+
+    def __init__(self, camera, workers, antialiasing=None):
+        """
+        Starts the worker processes.
+
+        camera       -- raytracer.Camera instance with a shader
+        workers      -- Number of processes
+        antialiasing -- (Optional) antialias.Antialiasing instance
+        """
+        self._camera = camera
+        self._pool = mp.Pool(
+            workers, _init, (camera, None, antialiasing))
+
+        # summaries of the anti-aliasing per picture
+        self.reports = {}
+
+    @property
+    def resolution(self):
+        return self._camera.resolution
+
+    def shootAll(self, positions):
+        """
+        Generator that yields (index, Framebuffer) tuples in
+        the order the pictures get finished.
+
+        positions -- Sequence of (eye, up) tuples
+        """
+        jobs = [(i, eye, up) for i, (eye, up) in enumerate(positions)]
+        results = self._pool.imap_unordered(_renderPicture, jobs)
+        for index, data, report in results:
+            if report is not None:
+                self.reports[index] = report
+            yield index, Framebuffer(self._camera.resolution, data)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
+
+
+class TileRenderer(object):
+    """
+    Renders pictures of a camera with a pool of processes.
+    Offers the same shoot method as raytracer.Camera.
+    """
+
+    def __init__(self, camera, workers, tilesize):
+        """
+        Starts the worker processes.
+
+        camera   -- raytracer.Camera instance with a shader
+        workers  -- Number of processes
+        tilesize -- Edge length of the tiles in pixels
+        """
+        self._camera = camera
+        self._workers = workers
+        self._tiles = tiles(camera.resolution, tilesize)
+
+        width, height = camera.resolution
+        shared = mp.RawArray('B', width * height * 3)
+        self._framebuffer = Framebuffer(camera.resolution, shared)
+        self._pool = mp.Pool(
+            workers, _init, (camera, self._framebuffer))
+
+    @property
+    def resolution(self):
+        return self._camera.resolution
+
+    def shoot(self, eye, up, framebuffer=None, checkpoint=None):
+        """
+        Shoots a picture from the world (@see Camera.shoot).
+
+        eye         -- Point to look from
+        up          -- The cameras tilt
+        framebuffer -- (Optional) Framebuffer instance
+        checkpoint  -- (Optional) checkpoint.Picture that
+                       receives every finished tile and
+                       whose tiles are not rendered again
+        """
+        if checkpoint is None:
+            jobs = [(eye, up, tile) for tile in self._tiles]
+        else:
+            jobs = []
+            for tile in tiles(self._camera.resolution, checkpoint.tilesize):
+                data = checkpoint.tiles.get(tile)
+                if data is None:
+                    jobs.append((eye, up, tile))
+                else:
+                    self._framebuffer.blit(tile, data)
+
+        for tile in self._pool.imap_unordered(_render, jobs):
+            if checkpoint is not None:
+                checkpoint.add(tile, self._framebuffer.crop(tile))
+
+        if framebuffer is None:
+            framebuffer = Framebuffer(self._camera.resolution)
+        framebuffer.raw[:] = self._framebuffer.raw
+        return framebuffer
+
+    def _jobs(self, eye, up, pixels):
+        size = max(1, len(pixels) // (self._workers * 4) + 1)
+        return [
+            (eye, up, pixels[i:i + size])
+            for i in range(0, len(pixels), size)]
+
+    def shootPixels(self, eye, up, pixels):
+        """
+        Shoots single pixels of the picture by distributing
+        them over the workers (@see Camera.shootPixels).
+
+        eye    -- Point to look from
+        up     -- The cameras tilt
+        pixels -- Sequence of (x, y) tuples
+        """
+        jobs = self._jobs(eye, up, pixels)
+        return b''.join(self._pool.imap(_renderPixels, jobs))
+
+    def shootSamples(self, eye, up, points):
+        """
+        Shoots rays through arbitrary points of the picture
+        on the workers (@see Camera.shootSamples).
+
+        eye    -- Point to look from
+        up     -- The cameras tilt
+        points -- Sequence of (x, y) tuples in pixel coordinates
+        """
+        colors, ids = array('d'), array('l')
+        for c, i in self._pool.imap(_renderSamples, self._jobs(eye, up, points)):
+            colors.extend(c)
+            ids.extend(i)
+        return colors, ids
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+from framebuffer import Framebuffer
+
+
+"""
+
+Progressive rendering.
+
+A picture is first sampled on a coarse grid (every STEP'th
+pixel in both directions) and every sample is stretched over
+its whole block. Every following pass halves the grid size and
+only traces the pixels that are new on the finer grid, so every
+pixel is traced exactly once and the last pass is exactly the
+directly rendered picture.
+
+Within a pass the blocks get refined adaptively: blocks whose
+corner samples differ the most (edges, shadows, reflections)
+are subdivided first and a preview is emitted before the
+uniform blocks are refined.
+
+"""
+
+
+STEP = 8
+
+# blocks whose corners differ by more than this
+# (in any channel) are refined first
+THRESHOLD = 16
+
+
+class Refinement(object):
+    """
+    State of the progressive rendering of one picture.
+    The samples traced so far are kept in one framebuffer,
+    the preview (every sample stretched over its block of
+    the grid it was traced for) in another.
+    """
+
+    def __init__(self, renderer, eye, up, step=STEP):
+        """
+        renderer -- raytracer.Camera or parallel.TileRenderer
+        eye      -- Point to look from
+        up       -- The cameras tilt
+        step     -- Grid size of the first pass (power of two)
+        """
+        self._renderer = renderer
+        self._eye, self._up = eye, up
+        self._step = step
+        self._samples = Framebuffer(renderer.resolution)
+        self._preview = Framebuffer(renderer.resolution)
+
+    @property
+    def samples(self):
+        """
+        Framebuffer holding all traced pixels.
+        """
+        return self._samples
+
+    def _trace(self, pixels, step):
+        data = self._renderer.shootPixels(self._eye, self._up, pixels)
+        raw, preview = self._samples.raw, self._preview.raw
+        width, height = self._samples.resolution
+        for i, (x, y) in enumerate(pixels):
+            j = (y * width + x) * 3
+            color = data[i * 3:i * 3 + 3]
+            raw[j:j + 3] = color
+
+            if step == 1:
+                preview[j:j + 3] = color
+            else:
+                tile = (x, y, min(width, x + step), min(height, y + step))
+                self._preview.fill(tile, color)
+
+    def _color(self, x, y):
+        i = (y * self._samples.width + x) * 3
+        return self._samples.raw[i:i + 3]
+
+    def preview(self):
+        """
+        Returns a copy of the current preview.
+        """
+        raw = bytearray(self._preview.raw)
+        return Framebuffer(self._preview.resolution, raw)
+
+    def contrast(self, x, y, step):
+        """
+        Maximal channel difference of the corner
+        samples of a block of the given grid size.
+        """
+        width, height = self._samples.resolution
+        corners = [
+            self._color(cx, cy)
+            for cx in (x, x + step) if cx < width
+            for cy in (y, y + step) if cy < height]
+
+        return max(
+            max(channel) - min(channel)
+            for channel in zip(*corners))
+
+    def blocks(self, step):
+        """
+        Returns the new pixels of the grid with half the
+        given size, grouped by the blocks of the current
+        grid and sorted by descending contrast.
+        """
+        width, height = self._samples.resolution
+        half = step // 2
+
+        blocks = []
+        for y in range(0, height, step):
+            for x in range(0, width, step):
+                pixels = [
+                    (px, py) for px, py in (
+                        (x + half, y), (x, y + half), (x + half, y + half))
+                    if px < width and py < height]
+                if pixels:
+                    blocks.append((self.contrast(x, y, step), pixels))
+
+        blocks.sort(key=lambda b: -b[0])
+        return blocks
+
+    def passes(self, limit=None):
+        """
+        Generator that traces the picture pass by pass and
+        yields a preview framebuffer after every refinement.
+        The last framebuffer holds the complete picture.
+
+        limit -- (Optional) Callable that receives the number
+                 of pixels of the next batch and returns how
+                 many of them may be traced. The blocks with
+                 the highest contrast come first; the rest of
+                 a batch that got cut short is offered again
+                 until the limit grants no pixel at all. The
+                 first pass is always traced completely.
+        """
+        width, height = self._samples.resolution
+        step = self._step
+
+        self._trace([
+            (x, y) for y in range(0, height, step)
+            for x in range(0, width, step)], step)
+        yield self.preview()
+
+        while step > 1:
+            blocks = self.blocks(step)
+            edges = [p for c, pixels in blocks if c > THRESHOLD for p in pixels]
+            rest = [p for c, pixels in blocks if c <= THRESHOLD for p in pixels]
+            step //= 2
+
+            batches = [edges, rest] if edges and rest else [edges + rest]
+            for batch in batches:
+                while batch:
+                    count = len(batch)
+                    if limit is not None:
+                        count = min(count, limit(count))
+                    if count <= 0:
+                        return
+                    self._trace(batch[:count], step)
+                    yield self.preview()
+                    batch = batch[count:]
+
+
+def refine(renderer, eye, up, step=STEP):
+    """
+    Generator that yields progressively refined
+    framebuffers of one picture (@see Refinement).
+
+    renderer -- raytracer.Camera or parallel.TileRenderer
+    eye      -- Point to look from
+    up       -- The cameras tilt
+    step     -- Grid size of the first pass (power of two)
+    """
+    return Refinement(renderer, eye, up, step).passes()
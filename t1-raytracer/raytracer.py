@@ -2,13 +2,22 @@
 # -*- coding: utf-8 -*-
 
 
+import os
+import sys
 import math
 import json
-
-from PIL import Image
+import time
+import argparse
+from array import array
 
 import geometry as gm
 import bodies as bd
+import accel
+import parallel
+import instrument
+from antialias import Antialiasing
+from framebuffer import Framebuffer
+import vectorized as vc
 from shader import Phong as Shader
 
 
@@ -18,7 +27,10 @@ from shader import Phong as Shader
 
 VERBOSE = False
 EMSG = {
-    'setter': '%s: Expected %s, got %s'
+    'setter': '%s: Expected %s, got %s',
+    'costs': 'Per pixel costs can not be measured with the %s',
+    'record': 'G-buffers and dependencies can not be recorded for '
+              'checkpointed pictures'
 }
 
 
@@ -71,6 +83,11 @@ class World(Raytracer):
         self.center = center
         self._bodies = set()
         self._lights = []
+        self._accel = None
+        self._accelerator = 'auto'
+        self._occluders = {}
+        self._ids = {}
+        self._nextid = 0
 
     @property
     def background(self):
@@ -106,7 +123,95 @@ class World(Raytracer):
     def addBodies(self, *objs):
         for obj in objs:
             self._instancecheck('World.addBodies', obj, bd.Body)
+        self._identify(objs)
         self._bodies.update(objs)
+        self._accel = None
+        self._occluders = {}
+
+    def _identify(self, objs):
+        for obj in objs:
+            if obj not in self._ids:
+                self._ids[obj] = self._nextid
+                self._nextid += 1
+
+    def updateBodies(self, added=(), removed=()):
+        """
+        Adds and removes bodies without discarding the
+        acceleration structure: it gets edited in place or,
+        if that fails or it degraded too much, built again.
+        Removed bodies lose their ids. Returns True if the
+        structure was edited in place.
+
+        added   -- Bodies to add
+        removed -- Bodies to remove
+        """
+        for obj in added:
+            self._instancecheck('World.updateBodies', obj, bd.Body)
+        for obj in removed:
+            self._bodies.discard(obj)
+            self._ids.pop(obj, None)
+        self._identify(added)
+        self._bodies.update(added)
+        self._occluders = {}
+
+        structure = self._accel
+        if structure is None:
+            return False
+
+        edited = all(structure.remove(obj) for obj in removed) and \
+            all(structure.insert(obj) for obj in added)
+        if not edited or structure.degraded:
+            self.accelerate()
+            return False
+        return True
+
+    def bodyid(self, body):
+        """
+        Returns a number identifying the body. Unlike the
+        iteration order of the body collection it survives
+        pickling (e.g. in worker processes). None is -1.
+        """
+        if body is None:
+            return -1
+        return self._ids[body]
+
+    @property
+    def accel(self):
+        return self._accel
+
+    @property
+    def accelerator(self):
+        return self._accelerator
+
+    @accelerator.setter
+    def accelerator(self, name):
+        if name not in ('auto',) + tuple(accel.ACCELERATORS):
+            self._throw('setter', 'World.accelerator',
+                        'auto or one of %s' % sorted(accel.ACCELERATORS),
+                        name)
+        self._accelerator = name
+
+    def accelerate(self, name=None, structure=None):
+        """
+        Builds an acceleration structure over all bodies
+        that gets used by trace from now on. Adding bodies
+        discards it (@see updateBodies).
+
+        name      -- (Optional) Name of the accelerator
+                     (@see accel.ACCELERATORS), defaults to
+                     World.accelerator
+        structure -- (Optional) Accelerator over the bodies
+                     that was built before and gets used
+                     instead (@see scenecache.py)
+        """
+        if structure is not None:
+            self._accel = structure
+            return structure
+
+        if name is None:
+            name = self.accelerator
+        self._accel = accel.build(self.bodies, name)
+        return self._accel
 
     @property
     def lightness(self):
@@ -125,7 +230,7 @@ class World(Raytracer):
         self._instancecheck('World.addLight', light, bd.Light)
         self._lights.append(light)
 
-    def trace(self, ray, collection=None, maxdist='inf'):
+    def trace(self, ray, collection=None, maxdist='inf', exclude=None):
         """
         Takes a ray and checks if there are any bodies
         touched by that ray. Returns the nearest body
@@ -137,13 +242,26 @@ class World(Raytracer):
                       worlds body collection.
         maxdist    -- (Optional) Everything out of this
                       range is not considered a match.
+        exclude    -- (Optional) Body to ignore, mostly the
+                      one the ray starts from. Not applied to
+                      bodies that can hit themselves (meshes).
         """
         maxdist = float(maxdist)
+        if exclude is not None and not exclude.geometry.convex:
+            exclude = None
+
         if collection is None:
+            if self._accel is not None:
+                obj, minhit = self._accel.trace(ray, maxdist, exclude)
+                if obj is not None:
+                    return obj, ray.shoot(minhit)
+                return (None, None)
             collection = self.bodies
 
         obj, minhit = None, None
         for elem in collection:
+            if elem is exclude:
+                continue
             hit = elem.geometry.intersection(ray)
             if hit and 1e-5 <= hit and hit < maxdist:
                 if not minhit or hit < minhit:
@@ -153,6 +271,52 @@ class World(Raytracer):
             return obj, ray.shoot(minhit)
         return (None, None)
 
+    def occluded(self, point, light, exclude=None):
+        """
+        Shadow query. Checks if a body lies between the
+        point and the light source and returns the first
+        one found (not necessarily the nearest). Returns
+        None if the light reaches the point.
+
+        The last occluder of every light is remembered and
+        tested first, since neighbouring points are mostly
+        shadowed by the same body.
+
+        point   -- geometry.Point to check
+        light   -- bodies.Light instance
+        exclude -- (Optional) Body to ignore, mostly the
+                   one the point lies on. Not applied to
+                   bodies that can shadow themselves (meshes).
+        """
+        if exclude is not None and not exclude.geometry.convex:
+            exclude = None
+
+        direction = light.geometry - point
+        maxdist = direction.length
+        ray = gm.Ray(point, direction)
+
+        cached = self._occluders.get(light)
+        if cached is not None and cached is not exclude:
+            hit = cached.geometry.intersection(ray)
+            if hit and 1e-5 <= hit and hit < maxdist:
+                return cached
+
+        if self._accel is not None:
+            blocker = self._accel.occluded(ray, maxdist, exclude)
+        else:
+            blocker = None
+            for elem in self.bodies:
+                if elem is exclude:
+                    continue
+                hit = elem.geometry.intersection(ray)
+                if hit and 1e-5 <= hit and hit < maxdist:
+                    blocker = elem
+                    break
+
+        if blocker is not None:
+            self._occluders[light] = blocker
+        return blocker
+
 
 class Camera(Raytracer):
 
@@ -228,7 +392,7 @@ class Camera(Raytracer):
 
         return f, s, u
 
-    def sweep(self, f, s, u, eye):
+    def sweep(self, f, s, u, eye, region=None, pixels=None):
         """
         Generator that yields for
         every pixel in the image matrix
@@ -237,35 +401,193 @@ class Camera(Raytracer):
 
         f, s, u -- Camera parameters (@see self.sys)
         eye     -- Point to look from
+        region  -- (Optional) Tuple (x0, y0, x1, y1) to
+                   restrict the sweep to a part of the image
+        pixels  -- (Optional) Sequence of (x, y) tuples to
+                   sweep instead of a region
         """
         pw = self.width / (self.reswidth - 1)
         ph = self.height / (self.resheight - 1)
 
-        for x in range(self.reswidth):
-            for y in range(self.resheight):
-                xcmp = s * (x * pw - self.width / 2)
-                ycmp = u * (y * ph - self.height / 2)
-                yield x, y, gm.Ray(eye, f + xcmp + ycmp)
+        if pixels is None:
+            if region is None:
+                region = (0, 0) + self.resolution
+            x0, y0, x1, y1 = region
+            pixels = ((x, y) for x in range(x0, x1) for y in range(y0, y1))
 
-    def shoot(self, eye, up, img):
-        """
-        Takes the necessary camera parameters
-        and an PIL Image instance to shoot
-        a picture from the world.
+        for x, y in pixels:
+            xcmp = s * (x * pw - self.width / 2)
+            ycmp = u * (y * ph - self.height / 2)
+            yield x, y, gm.Ray(eye, f + xcmp + ycmp)
 
-        eye -- Point to look from
-        up  -- The cameras tilt
-        img -- An PIL Image instance
+    def _setup(self, eye, up):
+        """
+        Translates the raw eye and up tuples to
+        the arguments of self.sweep.
         """
         eye = gm.Point(eye)
         up = -gm.Vector(up)
 
         args = self.sys(eye, up)
-        args += (eye,)
+        return args + (eye,)
+
+    def shoot(self, eye, up, framebuffer=None, checkpoint=None,
+              gbuffer=None, dependencies=None):
+        """
+        Takes the necessary camera parameters
+        to shoot a picture from the world. Returns
+        the framebuffer the picture was rendered to.
+
+        eye          -- Point to look from
+        up           -- The cameras tilt
+        framebuffer  -- (Optional) Framebuffer instance
+        checkpoint   -- (Optional) checkpoint.Picture. The picture
+                        gets rendered tile by tile, every finished
+                        tile is recorded and tiles it already holds
+                        are not rendered again
+        gbuffer      -- (Optional) gbuffer.GBuffer to record the
+                        first hit of every pixel in, the picture
+                        can be relit from it (@see Phong.relight)
+        dependencies -- (Optional) incremental.Dependencies to
+                        record the bodies the ray tree of every
+                        pixel touched in
+        """
+        if framebuffer is None:
+            framebuffer = Framebuffer(self.resolution)
+
+        if checkpoint is not None and \
+                (gbuffer is not None or dependencies is not None):
+            self._throw('record')
+        if gbuffer is not None:
+            gbuffer.eye = tuple(eye)
+
+        if checkpoint is None:
+            tile = (0, 0) + self.resolution
+            framebuffer.blit(tile, self.shootTile(
+                eye, up, tile, gbuffer, dependencies))
+            return framebuffer
+
+        for tile in parallel.tiles(self.resolution, checkpoint.tilesize):
+            data = checkpoint.tiles.get(tile)
+            if data is None:
+                data = self.shootTile(eye, up, tile)
+                checkpoint.add(tile, data)
+            framebuffer.blit(tile, data)
+        return framebuffer
+
+    def shootTile(self, eye, up, tile, gbuffer=None, dependencies=None):
+        """
+        Shoots a rectangular part of the picture. Returns
+        the rgb values of the tile row by row as bytes.
+
+        eye          -- Point to look from
+        up           -- The cameras tilt
+        tile         -- Tuple (x0, y0, x1, y1) of the pixel range
+        gbuffer      -- (Optional) gbuffer.GBuffer of the picture
+        dependencies -- (Optional) incremental.Dependencies
+                        of the picture
+        """
+        args = self._setup(eye, up)
+
+        if self.shader.batched:
+            pixels = self.shader.render(
+                self, *args, region=tile, gbuffer=gbuffer,
+                dependencies=dependencies)
+            return pixels.tobytes()
+
+        record = gbuffer is not None or dependencies is not None
+        x0, y0, x1, y1 = tile
+        framebuffer = Framebuffer((x1 - x0, y1 - y0))
+        for x, y, ray in self.sweep(*args, region=tile):
+            if record:
+                color = self.shader.capture(ray, x, y, gbuffer, dependencies)
+            else:
+                color = self.shader.shade(ray)
+            framebuffer.put(x - x0, y - y0, color)
+        return framebuffer.raw
+
+    def shootSamples(self, eye, up, points):
+        """
+        Shoots rays through arbitrary (sub pixel) points of
+        the picture. Returns the unquantized colors as a flat
+        array of rgb values and the ids of the bodies hit
+        first (@see World.bodyid) as another array.
+
+        eye    -- Point to look from
+        up     -- The cameras tilt
+        points -- Sequence of (x, y) tuples in pixel coordinates
+        """
+        args = self._setup(eye, up)
+        colors, ids = array('d'), array('l')
+
+        if self.shader.batched:
+            xs, ys = zip(*points) if points else ((), ())
+            c, i = self.shader.renderSamples(self, *args, xs=xs, ys=ys)
+            colors.extend(c.ravel().tolist())
+            ids.extend(i.tolist())
+            return colors, ids
+
+        for x, y, ray in self.sweep(*args, pixels=points):
+            color, obj = self.shader.sample(ray)
+            colors.extend(color)
+            ids.append(self.world.bodyid(obj))
+        return colors, ids
+
+    def shootPixels(self, eye, up, pixels, dependencies=None):
+        """
+        Shoots single pixels of the picture. Returns
+        their rgb values in the given order as bytes.
+
+        eye          -- Point to look from
+        up           -- The cameras tilt
+        pixels       -- Sequence of (x, y) tuples
+        dependencies -- (Optional) incremental.Dependencies
+                        of the picture
+        """
+        args = self._setup(eye, up)
+
+        if self.shader.batched:
+            xs, ys = zip(*pixels) if pixels else ((), ())
+            colors = self.shader.renderPixels(
+                self, *args, xs=xs, ys=ys, dependencies=dependencies)
+            return colors.tobytes()
+
+        framebuffer = Framebuffer((len(pixels), 1))
+        rays = self.sweep(*args, pixels=pixels)
+        for i, (x, y, ray) in enumerate(rays):
+            if dependencies is None:
+                color = self.shader.shade(ray)
+            else:
+                color = self.shader.capture(
+                    ray, x, y, dependencies=dependencies)
+            framebuffer.put(i, 0, color)
+        return framebuffer.raw
+
+    def shootCosts(self, eye, up, counter):
+        """
+        Shoots a picture and measures the cost of every
+        pixel as the difference of the counter before and
+        after shading it. Returns the framebuffer and the
+        costs row by row. Needs a scalar shader.
+
+        eye     -- Point to look from
+        up      -- The cameras tilt
+        counter -- Function returning a monotonic number
+                   (e.g. a timer or a count of tests)
+        """
+        if self.shader.batched:
+            self._throw('costs', self.shader)
+
+        width, height = self.resolution
+        framebuffer = Framebuffer(self.resolution)
+        costs = array('d', bytes(8 * width * height))
 
-        for x, y, ray in self.sweep(*args):
+        for x, y, ray in self.sweep(*self._setup(eye, up)):
+            before = counter()
             color = self.shader.shade(ray)
-            img.putpixel((x, y), color)
+            costs[y * width + x] = counter() - before
+            framebuffer.put(x, y, color)
+        return framebuffer, costs
 
 
 #
@@ -301,7 +623,7 @@ class Importer(object):
         colors = map(self._readcolor, raw['colors'])
         return bd.CheckerboardTexture(raw['size'], tuple(colors))
 
-    def _setMaterial(self, body, raw):
+    def material(self, body, raw):
         """
         Meta function for all bodies sharing
         the same properties.
@@ -314,6 +636,7 @@ class Importer(object):
             handler = self._texturehandler[handler]
             body.texture = handler(raw['texture'])
         else:
+            body.texture = None
             body.color = self._readcolor(raw['color'])
 
         body.shininess = raw['shininess']
@@ -350,14 +673,38 @@ class Importer(object):
         triangle = bd.Triangle(a, b, c)
         return triangle
 
-    def __init__(self, fname):
+    def _importMesh(self, raw):
+        """
+        Mesh factory. The obj file name is relative
+        to the json configuration.
+
+        raw -- json configuration
+        """
+        fname = os.path.join(self._path, raw['file'])
+        position = tuple(raw.get('position', (0, 0, 0)))
+        mesh = bd.Mesh(fname, position, raw.get('scale', 1.))
+        return mesh
+
+    def __init__(self, fname, cache=False):
         """
         Create an instance of the importer.
 
         fname -- file name of the json configuration
+        cache -- (Optional) Restore the bodies and the
+                 acceleration structure from the compiled
+                 scene if it is up to date (@see scenecache.py)
         """
-        with open(fname) as f:
-            self.json = json.load(f)
+        self._cache = None
+        if cache:
+            import scenecache
+            self._cache = scenecache.load(fname)
+        if self._cache is not None:
+            self.json = dict(self._cache.config)
+        else:
+            with open(fname) as f:
+                self.json = json.load(f)
+
+        self._path = os.path.dirname(fname)
 
         self._world = None
         self._camera = None
@@ -366,7 +713,8 @@ class Importer(object):
         self._bodyhandler = {
             'sphere': self._importSphere,
             'plane': self._importPlane,
-            'triangle': self._importTriangle
+            'triangle': self._importTriangle,
+            'mesh': self._importMesh
         }
 
         self._texturehandler = {
@@ -384,6 +732,7 @@ class Importer(object):
             world.lightness = raw['lightness']
             world.background = self._readcolor(raw['background'])
             world.maxdist = raw['maxdist']
+            world.accelerator = raw.get('accelerator', 'auto')
             self._world = world
         return self._world
 
@@ -413,6 +762,17 @@ class Importer(object):
             up = tuple(raw['up'])
             yield (eye, up)
 
+    @property
+    def antialiasing(self):
+        """
+        Optional configuration of the adaptive anti-aliasing
+        (@see antialias.Antialiasing). None if it is disabled.
+        """
+        raw = self.json.get('antialiasing')
+        if raw is None:
+            return None
+        return Antialiasing(**raw)
+
     @property
     def recdepth(self):
         """
@@ -422,19 +782,46 @@ class Importer(object):
         """
         return self.json['recdepth']
 
+    @property
+    def termination(self):
+        """
+        Optional keyword arguments of the shader that control
+        when reflections get terminated (@see shader.Phong):
+
+            "termination": {"threshold": 0.004, "roulette": true}
+        """
+        return dict(self.json.get('termination', {}))
+
+    @property
+    def cached(self):
+        """
+        True if the bodies come from the scene cache.
+        """
+        return self._cache is not None
+
     def bodies(self):
         """
         Adds all defined bodies to the worlds
         object collection. Returns the number
         of imported bodies.
         """
+        if self._cache is not None:
+            return self._cache.restore(self.world)
+
         for raw in self.json['bodies']:
-            handler = self._bodyhandler[raw['type']]
-            body = handler(raw)
-            self._setMaterial(body, raw)
-            self.world.addBodies(body)
+            self.world.addBodies(self.body(raw))
         return len(self.json['bodies'])
 
+    def body(self, raw):
+        """
+        Creates the body of one json entry (with its material).
+
+        raw -- json configuration of the body
+        """
+        body = self._bodyhandler[raw['type']](raw)
+        self.material(body, raw)
+        return body
+
     def lights(self):
         """
         Adds all defined lights to the worlds
@@ -459,14 +846,27 @@ class Importer(object):
 #
 #   MAIN
 #
-def raytrace(name):
-    """
-    Generator that yields rendered images.
+ENGINES = {
+    'scalar': Shader,
+    'numpy': vc.Phong
+}
+
 
-    name -- File name of a configuration written in json
-            relative to where the script is executed.
+def prepare(name, engine='scalar', cache=False):
     """
-    imp = Importer(name)
+    Imports a scene and prepares everything that is shared
+    by all of its pictures. Returns the camera (with world
+    and shader), the list of (eye, up) positions, the
+    anti-aliasing (or None) and the acceleration structure.
+
+    name   -- File name of a configuration written in json
+    engine -- (Optional) Name of the shading engine
+    cache  -- (Optional) Load the bodies and the acceleration
+              structure from the compiled scene; it gets
+              (re)written if it is missing or outdated
+              (@see scenecache.py)
+    """
+    imp = Importer(name, cache)
 
     # import world
     world = imp.world
@@ -476,39 +876,435 @@ def raytrace(name):
     log('imported %d bodies' % imp.bodies())
     log('imported %d lightsources' % imp.lights())
 
+    if imp.cached:
+        accelerator = world.accel
+        log('loaded %s from the scene cache' % accelerator)
+    else:
+        accelerator = world.accelerate()
+        log('built %s in %.3fs' % (accelerator, accelerator.buildtime))
+        if cache:
+            import scenecache
+            log('compiled %s' % scenecache.save(name, imp.json, world))
+
     camera = imp.camera
-    camera.shader = Shader(world, imp.recdepth)
+    camera.shader = ENGINES[engine](world, imp.recdepth, **imp.termination)
     positions = [pos for pos in imp.positions]
+    antialiasing = imp.antialiasing
 
     log('imported camera and %d positions' % len(positions))
     log('using %s' % camera.shader)
+    if antialiasing is not None:
+        log('using %s' % antialiasing)
 
     imp.done()
     log('free\'d import memory')
 
+    return camera, positions, antialiasing, accelerator
+
+
+def raytrace(name, engine='scalar', workers=1, tilesize=32, raw=False,
+             progressive=False, profile=False, heatmap=None, deadline=None,
+             checkpoint=None, resume=False, cache=False):
+    """
+    Generator that yields rendered images.
+
+    name        -- File name of a configuration written in json
+                   relative to where the script is executed.
+    engine      -- (Optional) Either "scalar" to trace every ray
+                   on its own or "numpy" to trace all rays of a
+                   picture in batches (@see vectorized.py)
+    workers     -- (Optional) Number of processes that render
+                   the tiles of a picture (@see parallel.py)
+    tilesize    -- (Optional) Edge length of the tiles in pixels
+    raw         -- (Optional) Yield the Framebuffer instances
+                   instead of PIL Images
+    progressive -- (Optional) Yield coarse previews of every
+                   picture first that get refined until the
+                   picture is complete (@see progressive.py)
+    profile     -- (Optional) Count and time the hot paths and
+                   log a summary at the end (@see instrument.py)
+    heatmap     -- (Optional) Metric ("tests" or "time") of a
+                   cost heatmap that is yielded after every
+                   picture, always by the scalar engine
+                   (@see heatmap.py)
+    deadline    -- (Optional) Wall-clock seconds to render all
+                   pictures in. Reflections, anti-aliasing and
+                   finally resolution are reduced as far as
+                   necessary (@see budget.py)
+    checkpoint  -- (Optional) File name of a checkpoint the
+                   finished tiles get written to; it is removed
+                   once all pictures are done (@see checkpoint.py)
+    resume      -- (Optional) Continue from the checkpoint instead
+                   of overwriting it. A checkpoint of another
+                   version of the scene raises CheckpointException
+    cache       -- (Optional) Use the compiled scene (@see prepare)
+    """
+    start = instrument.timer()
+    if heatmap is not None and ENGINES[engine].batched:
+        log('heatmaps are rendered by the scalar engine')
+        engine = 'scalar'
+    camera, positions, antialiasing, accelerator = prepare(
+        name, engine, cache)
+
+    stats = None
+    if profile:
+        stats = instrument.enable()
+        if workers > 1:
+            log('profiling the main process only')
+
+    if heatmap is not None:
+        from heatmap import Heatmap
+        heatmap = Heatmap(heatmap)
+        log('rendering every picture with a %s' % heatmap)
+        if progressive or antialiasing is not None or workers > 1:
+            log('heatmaps are rendered serially without '
+                'progressive refinement and anti-aliasing')
+        progressive, antialiasing, workers = False, None, 1
+
+    budget = None
+    if deadline is not None and heatmap is not None:
+        log('heatmaps are rendered without a deadline')
+    elif deadline is not None:
+        from budget import Budget
+        budget = Budget(camera, antialiasing)
+        log('rendering all pictures within %gs' % deadline)
+        if progressive or workers > 1:
+            log('pictures with a deadline are rendered serially '
+                'and shown when they are finished')
+        progressive, antialiasing, workers = False, None, 1
+
+    if antialiasing is not None and progressive:
+        log('anti-aliasing is not applied in progressive mode')
+        antialiasing = None
+    if progressive:
+        from progressive import refine
+
+    progress = None
+    if checkpoint is not None:
+        import scenecache
+        from checkpoint import Checkpoint
+        if progressive or heatmap is not None or budget is not None or \
+                antialiasing is not None:
+            log('checkpoints are only written for plain renders')
+        else:
+            with open(name) as f:
+                key = scenecache.scenehash(
+                    name, scenecache.dependencies(json.load(f)))
+            if resume and os.path.exists(checkpoint):
+                progress = Checkpoint.load(checkpoint, key)
+                log('resuming from %s' % progress)
+            else:
+                if resume:
+                    log('no checkpoint %s, starting over' % checkpoint)
+                progress = Checkpoint(checkpoint, key, tilesize)
+
+    renderer = camera
+    if workers > 1:
+        renderer = parallel.TileRenderer(camera, workers, tilesize)
+        log('rendering %dpx tiles with %d workers' % (tilesize, workers))
+
     count = 1
     # shoot pictures
-    for eye, up in positions:
-        log("shooting picture %d/%d" % (count, len(positions)))
-        img = Image.new('RGB', camera.resolution)
-        camera.shoot(eye, up, img)
-        yield img
-        count += 1
+    try:
+        for eye, up in positions:
+            log("shooting picture %d/%d" % (count, len(positions)))
+            if budget is not None:
+                # share the remaining time among the pictures left
+                left = len(positions) - count + 1
+                seconds = (deadline - (instrument.timer() - start)) / left
+                frames = [budget.shoot(eye, up, seconds)]
+                log(budget.report())
+            elif progressive:
+                frames = refine(renderer, eye, up)
+            elif heatmap is not None:
+                frames = heatmap.shoot(renderer, eye, up)
+                log(heatmap.report())
+            elif antialiasing is not None:
+                frames = [antialiasing.shoot(renderer, eye, up)]
+                log(antialiasing.report())
+            elif progress is not None:
+                picture = progress.picture(count - 1)
+                frames = [renderer.shoot(eye, up, checkpoint=picture)]
+                progress.save()
+            else:
+                frames = [renderer.shoot(eye, up)]
+
+            for framebuffer in frames:
+                yield framebuffer if raw else framebuffer.image()
+            count += 1
+    finally:
+        if renderer is not camera:
+            renderer.close()
+        if stats is not None:
+            instrument.disable()
+
+    if progress is not None:
+        progress.remove()
+    if accelerator.rays:
+        log('traced %s' % accelerator.report())
+    if camera.shader.reflections:
+        log(camera.shader.report())
+    if stats is not None:
+        log(stats.summary())
+    log('done')
+
 
+def raytraceAll(name, engine='scalar', workers=1, raw=False, cache=False):
+    """
+    Generator that renders all pictures of a scene at once
+    and yields (index, image) tuples in the order the
+    pictures get finished. The scene is prepared once and
+    shared by all workers (@see parallel.PictureRenderer).
+
+    name    -- File name of a configuration written in json
+    engine  -- (Optional) Name of the shading engine
+    workers -- (Optional) Number of processes that render
+               whole pictures concurrently
+    raw     -- (Optional) Yield the Framebuffer instances
+               instead of PIL Images
+    cache   -- (Optional) Use the compiled scene (@see prepare)
+    """
+    camera, positions, antialiasing, accelerator = prepare(
+        name, engine, cache)
+
+    if workers > 1:
+        renderer = parallel.PictureRenderer(camera, workers, antialiasing)
+        log('rendering %d pictures with %d workers' % (
+            len(positions), workers))
+        pictures = renderer.shootAll(positions)
+    else:
+        renderer = None
+        shoot = camera.shoot
+        if antialiasing is not None:
+            shoot = lambda eye, up: antialiasing.shoot(camera, eye, up)
+        pictures = (
+            (i, shoot(eye, up)) for i, (eye, up) in enumerate(positions))
+
+    count = 1
+    try:
+        for index, framebuffer in pictures:
+            log("finished picture %d (%d/%d)" % (
+                index + 1, count, len(positions)))
+            if renderer is not None and index in renderer.reports:
+                log(renderer.reports[index])
+            elif renderer is None and antialiasing is not None:
+                log(antialiasing.report())
+            yield index, (framebuffer if raw else framebuffer.image())
+            count += 1
+    finally:
+        if renderer is not None:
+            renderer.close()
+
+    if accelerator.rays:
+        log('traced %s' % accelerator.report())
+    if camera.shader.reflections:
+        log(camera.shader.report())
     log('done')
 
 
+def watch(name, engine='scalar', raw=False, cache=False, poll=None):
+    """
+    Generator that renders all pictures of a scene and renders
+    them again whenever the scene file (or one of its obj files)
+    changes, until it gets closed. Yields (index, image) tuples.
+
+    The scene stays in memory and gets updated from the edited
+    file (@see watch.py). Pictures whose bodies only changed
+    their materials are re-rendered incrementally, only the
+    pixels that depend on these bodies get traced again (@see
+    incremental.py). Files that can not be read are reported
+    and the previous version of the scene is kept.
+
+    name   -- File name of a configuration written in json
+    engine -- (Optional) Name of the shading engine
+    raw    -- (Optional) Yield the Framebuffer instances
+              instead of PIL Images
+    cache  -- (Optional) Use the compiled scene for the first
+              import (@see prepare)
+    poll   -- (Optional) Seconds between two checks of the files
+              (watch.POLL)
+    """
+    import watch as wt
+    from meshes import MeshException
+    from incremental import Incremental
+
+    if poll is None:
+        poll = wt.POLL
+    camera, positions, antialiasing, accelerator = prepare(
+        name, engine, cache)
+    if antialiasing is not None:
+        log('anti-aliasing is not applied in watch mode')
+
+    with open(name) as f:
+        scene = wt.Scene(name, json.load(f), camera.world)
+    stamps = wt.stamps(name, scene.config)
+    incremental = Incremental(camera)
+
+    while True:
+        for index, (eye, up) in enumerate(positions):
+            framebuffer = incremental.shoot(eye, up)
+            log('picture %d/%d: %s' % (
+                index + 1, len(positions), incremental.report()))
+            yield index, (framebuffer if raw else framebuffer.image())
+
+        log('watching %s for changes' % name)
+        while True:
+            time.sleep(poll)
+            current = wt.stamps(name, scene.config)
+            if current == stamps:
+                continue
+            stamps = current
+
+            start = instrument.timer()
+            try:
+                # the camera and positions are read before the
+                # world changes, a broken file leaves it as it was
+                imp = Importer(name)
+                renderer = camera
+                if imp.json['camera'] != scene.config['camera']:
+                    renderer = Camera(
+                        camera.world,
+                        tuple(imp.json['camera']['resolution']),
+                        imp.json['camera']['angleofview'])
+                reloaded = list(imp.positions)
+                changes = scene.update(imp)
+                # the numpy engine copies the materials (and
+                # refuses meshes)
+                renderer.shader = ENGINES[engine](
+                    camera.world, imp.recdepth, **imp.termination)
+            except (IOError, OSError, ValueError, KeyError, TypeError,
+                    RaytraceException, gm.GeometryException,
+                    MeshException, vc.VectorizedException) as e:
+                log('can not reload %s: %r' % (name, e))
+                continue
+            log('reloaded %s in %.3fs: %s' % (
+                name, instrument.timer() - start, changes))
+            if (changes.added or changes.removed) and not changes.inplace:
+                log('rebuilt %s' % camera.world.accel)
+
+            if renderer is not camera:
+                camera = renderer
+                incremental = Incremental(camera)
+            positions = reloaded
+            stamps = wt.stamps(name, scene.config)
+            break
+
+
+def outputname(output, index, count):
+    """
+    Returns the file name of a picture. Scenes with
+    several pictures get them numbered (out-1.png, ...).
+
+    output -- File name given for the output
+    index  -- Position of the picture in the scene
+    count  -- Number of pictures of the scene
+    """
+    if count == 1:
+        return output
+    root, ext = os.path.splitext(output)
+    return '%s-%d%s' % (root, index + 1, ext)
+
+
 def main():
     global VERBOSE
     VERBOSE = True
 
-    import sys
-    if len(sys.argv) < 2:
-        print('Usage: raytracer.py file.json')
-        sys.exit(2)
-
-    for img in raytrace(sys.argv[1]):
-        img.show()
+    if sys.argv[1:2] == ['batch']:
+        import batch
+        batch.main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description='Raytrace a json scene. "%(prog)s batch -h" '
+        'explains rendering many scenes at once.')
+    parser.add_argument('scene', help='scene configuration (json)')
+    parser.add_argument(
+        '-e', '--engine', choices=sorted(ENGINES), default='scalar',
+        help='trace rays one by one or in numpy batches')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help='number of rendering processes')
+    parser.add_argument(
+        '-t', '--tilesize', type=int, default=32,
+        help='edge length of the tiles rendered by the workers')
+    parser.add_argument(
+        '-p', '--progressive', action='store_true',
+        help='show coarse previews that get refined')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='count and time the hot paths and print a summary')
+    parser.add_argument(
+        '--heatmap', choices=('tests', 'time'),
+        help='show a per pixel cost heatmap after every picture')
+    parser.add_argument(
+        '-a', '--all', action='store_true',
+        help='render all pictures concurrently, one per worker')
+    parser.add_argument(
+        '-d', '--deadline', type=float, metavar='SECONDS',
+        help='render all pictures within this time, reducing '
+        'the quality as far as necessary')
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='save the pictures instead of showing them (several '
+        'pictures get numbered); finished tiles are checkpointed '
+        'to FILE.ckpt')
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='continue an interrupted render from FILE.ckpt')
+    parser.add_argument(
+        '-c', '--cache', action='store_true',
+        help='load the scene from its compiled cache (written '
+        'next to the json if it is missing or outdated)')
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='keep running and render the pictures again '
+        'whenever the scene file changes')
+    args = parser.parse_args()
+
+    if args.resume and not args.output:
+        parser.error('--resume needs the --output of the interrupted render')
+    if args.output and (args.progressive or args.heatmap):
+        parser.error('progressive renders and heatmaps can not be saved')
+
+    count = len(Importer(args.scene).json['pictures'])
+
+    def show(index, img):
+        if args.output is None:
+            img.show()
+            return
+        fname = outputname(args.output, index, count)
+        img.save(fname)
+        log('saved %s' % fname)
+
+    if args.watch:
+        if args.all or args.progressive or args.heatmap or \
+                args.deadline is not None or args.workers > 1:
+            parser.error('--watch renders plain pictures serially')
+        images = watch(args.scene, engine=args.engine, cache=args.cache)
+        try:
+            for index, img in images:
+                show(index, img)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.all:
+        for index, img in raytraceAll(
+                args.scene, engine=args.engine, workers=args.workers,
+                cache=args.cache):
+            show(index, img)
+        return
+
+    checkpoint = args.output + '.ckpt' if args.output else None
+    images = raytrace(
+        args.scene, engine=args.engine,
+        workers=args.workers, tilesize=args.tilesize,
+        progressive=args.progressive, profile=args.profile,
+        heatmap=args.heatmap, deadline=args.deadline,
+        checkpoint=checkpoint, resume=args.resume, cache=args.cache)
+
+    for index, img in enumerate(images):
+        show(index, img)
 
 
 if __name__ == '__main__':
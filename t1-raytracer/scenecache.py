@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import json
+import struct
+import hashlib
+import tempfile
+
+import numpy as np
+
+import accel
+import meshes
+import geometry as gm
+import bodies as bd
+
+
+"""
+
+Compiled scene cache.
+
+Importing a large scene means parsing all bodies from json
+(and obj files) and building the acceleration structure from
+scratch. Compiling a scene writes everything the import
+derives into one binary file next to the json:
+
+    worlds/task.json -> worlds/task.scene
+
+The file starts with a json header (everything of the scene
+but its bodies, and the names, types and offsets of the
+arrays) followed by the raw arrays: the parameters and
+materials of the bodies, the textures, the arrays of every
+mesh including its hierarchy and the flattened acceleration
+structure of the world. Loading maps the file into memory
+(numpy.memmap) and recreates the bodies and the accelerator
+without building anything.
+
+The cache is keyed by the sha256 of the scene file and the
+obj files it references. A cache of another version of the
+scene is ignored (and replaced by raytracer.prepare).
+
+    ./scenecache.py worlds/*.json
+
+"""
+
+
+MAGIC = b'RTSCENE1'
+VERSION = 1
+
+# arrays start at multiples of this many bytes
+ALIGN = 64
+
+EXTENSION = '.scene'
+
+# body types
+SPHERE, PLANE, TRIANGLE, MESH = range(4)
+
+
+def cachename(fname):
+    """
+    Returns the name of the cache of a scene file.
+    """
+    return os.path.splitext(fname)[0] + EXTENSION
+
+
+def dependencies(config):
+    """
+    Returns the obj files referenced by a scene
+    (relative to the scene file).
+    """
+    return sorted(set(
+        raw['file'] for raw in config.get('bodies', ())
+        if raw['type'] == 'mesh'))
+
+
+def scenehash(fname, files):
+    """
+    Returns the sha256 hex digest of a scene
+    file and the files it depends on.
+
+    fname -- File name of the json configuration
+    files -- Files relative to the configuration
+    """
+    digest = hashlib.sha256()
+    path = os.path.dirname(fname)
+    for name in [fname] + [os.path.join(path, f) for f in files]:
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _aligned(size):
+    return -(-size // ALIGN) * ALIGN
+
+
+def _pack(world):
+    """
+    Flattens the bodies and the acceleration structure of
+    a world into a dictionary of numpy arrays.
+    """
+    objs = sorted(world.bodies, key=world.bodyid)
+    count = len(objs)
+
+    kinds = np.zeros(count, np.int8)
+    params = np.zeros((count, 9))
+    # color, shininess, smoothness and texture index
+    materials = np.zeros((count, 6))
+    textures = []
+    arrays = {}
+
+    for i, body in enumerate(objs):
+        geometry = body.geometry
+        if isinstance(body, bd.Sphere):
+            kinds[i] = SPHERE
+            params[i, :4] = geometry.center.raw + (geometry.radius,)
+        elif isinstance(body, bd.Plane):
+            kinds[i] = PLANE
+            params[i, :6] = geometry.point.raw + geometry.norm.raw
+        elif isinstance(body, bd.Triangle):
+            kinds[i] = TRIANGLE
+            params[i] = sum((p.raw for p in geometry.vertices), ())
+        else:
+            kinds[i] = MESH
+            for name, array in geometry.export().items():
+                arrays['mesh%d.%s' % (i, name)] = array
+
+        materials[i, 3] = body.shininess
+        materials[i, 4] = body.smoothness
+        if body.texture is not None:
+            texture = body.texture
+            materials[i, 5] = len(textures)
+            textures.append((texture.checksize,) + texture.color1.raw +
+                            texture.color2.raw)
+        else:
+            materials[i, :3] = body.color.raw
+            materials[i, 5] = -1
+
+    arrays['kinds'] = kinds
+    arrays['params'] = params
+    arrays['materials'] = materials
+    arrays['textures'] = np.array(textures, float).reshape(-1, 7)
+
+    # bodies are restored in this order, their ids may have
+    # gaps if bodies were removed (@see World.updateBodies)
+    index = dict((body, i) for i, body in enumerate(objs))
+    state = world.accel.export(index.__getitem__)
+    for name, values in state.items():
+        dtype = float if name in ('lo', 'hi', 'size') else np.int64
+        arrays['accel.%s' % name] = np.array(values, dtype)
+    return arrays
+
+
+def save(fname, config, world):
+    """
+    Writes the cache of a scene. Returns its file name.
+
+    fname  -- File name of the json configuration
+    config -- The parsed json configuration
+    world  -- World with all bodies of the configuration
+              and its acceleration structure
+    """
+    files = dependencies(config)
+    arrays = _pack(world)
+
+    names = dict((cls, name) for name, cls in accel.ACCELERATORS.items())
+    header = {
+        'version': VERSION,
+        'key': scenehash(fname, files),
+        'files': files,
+        'config': dict(
+            (k, v) for k, v in config.items() if k != 'bodies'),
+        'accelerator': names[type(world.accel)],
+        'arrays': {}
+    }
+
+    offsets, offset = {}, 0
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        arrays[name] = array
+        offsets[name] = offset
+        offset += _aligned(array.nbytes)
+
+    # the header holds the offsets of the arrays that follow
+    # it, so they get moved until the header fits in front
+    start = 0
+    while True:
+        for name, array in arrays.items():
+            header['arrays'][name] = [
+                array.dtype.str, array.shape, start + offsets[name]]
+        raw = json.dumps(header).encode('utf-8')
+        needed = _aligned(len(MAGIC) + 8 + len(raw))
+        if needed <= start:
+            break
+        start = needed
+
+    # processes compiling the same scene at once must not
+    # write into each others temporary file
+    cache = cachename(fname)
+    fd, tmp = tempfile.mkstemp(
+        '.tmp', os.path.basename(cache) + '.', os.path.dirname(cache) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(raw)))
+            f.write(raw)
+            for name in sorted(arrays):
+                f.seek(header['arrays'][name][2])
+                f.write(arrays[name].tobytes())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, cache)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return cache
+
+
+class SceneCache(object):
+    """
+    A loaded (memory mapped) scene cache.
+    """
+
+    def __str__(self):
+        return "scene cache %s (%d bodies)" % (
+            self.fname, len(self.arrays['kinds']))
+
+    def __init__(self, fname, header, arrays):
+        """
+        fname  -- File name of the cache
+        header -- The json header
+        arrays -- Dictionary of the (memory mapped) arrays
+        """
+        self.fname = fname
+        self.header = header
+        self.arrays = arrays
+
+    @property
+    def config(self):
+        """
+        The json configuration of the scene without its bodies.
+        """
+        return self.header['config']
+
+    def bodies(self):
+        """
+        Returns the list of all bodies in the order of their ids.
+        """
+        arrays = self.arrays
+        kinds = arrays['kinds'].tolist()
+        params = arrays['params'].tolist()
+        materials = arrays['materials'].tolist()
+        textures = [
+            bd.CheckerboardTexture(raw[0], (tuple(raw[1:4]), tuple(raw[4:])))
+            for raw in arrays['textures'].tolist()]
+
+        objs = []
+        for i, (kind, p, m) in enumerate(zip(kinds, params, materials)):
+            if kind == SPHERE:
+                body = bd.Sphere(tuple(p[:3]), p[3])
+            elif kind == PLANE:
+                # the norm was normalized when it got compiled
+                body = bd.Plane.fromgeometry(gm.Plane.restore(
+                    gm.Point(tuple(p[:3])), gm.Vector(tuple(p[3:6]))))
+            elif kind == TRIANGLE:
+                body = bd.Triangle(tuple(p[:3]), tuple(p[3:6]), tuple(p[6:]))
+            else:
+                prefix = 'mesh%d.' % i
+                state = dict(
+                    (name[len(prefix):], array)
+                    for name, array in arrays.items()
+                    if name.startswith(prefix))
+                body = bd.Mesh.fromgeometry(meshes.Mesh.restore(state))
+
+            if m[5] >= 0:
+                body.texture = textures[int(m[5])]
+            else:
+                body.color = tuple(m[:3])
+            body.shininess = m[3]
+            body.smoothness = m[4]
+            objs.append(body)
+        return objs
+
+    def restore(self, world):
+        """
+        Adds all bodies to the world and sets up its acceleration
+        structure. Returns the number of bodies.
+
+        world -- World without any bodies
+        """
+        objs = self.bodies()
+        world.addBodies(*objs)
+
+        state = dict(
+            (name[6:], array) for name, array in self.arrays.items()
+            if name.startswith('accel.'))
+        cls = accel.ACCELERATORS[self.header['accelerator']]
+        world.accelerate(structure=cls.restore(objs, state))
+        return len(objs)
+
+
+def load(fname):
+    """
+    Maps the cache of a scene into memory. Returns a
+    SceneCache or None if there is no cache or it was
+    compiled from another version of the scene.
+
+    fname -- File name of the json configuration
+    """
+    cache = cachename(fname)
+    if not os.path.exists(cache):
+        return None
+
+    with open(cache, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        size, = struct.unpack('<Q', f.read(8))
+        try:
+            header = json.loads(f.read(size).decode('utf-8'))
+        except ValueError:
+            return None
+
+    if header.get('version') != VERSION:
+        return None
+    try:
+        if header['key'] != scenehash(fname, header['files']):
+            return None
+    except (IOError, OSError):
+        return None
+
+    mapped = np.memmap(cache, np.uint8, 'r')
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        data = mapped[offset:offset + count * dtype.itemsize]
+        arrays[name] = data.view(dtype).reshape(shape)
+    return SceneCache(cache, header, arrays)
+
+
+def compile(fname):
+    """
+    Imports a scene, builds its acceleration structure
+    and writes the cache. Returns its file name.
+
+    fname -- File name of the json configuration
+    """
+    from raytracer import Importer
+
+    imp = Importer(fname)
+    imp.bodies()
+    imp.world.accelerate()
+    return save(fname, imp.json, imp.world)
+
+
+def main():
+    for fname in sys.argv[1:]:
+        print('%s -> %s' % (fname, compile(fname)))
+
+
+if __name__ == '__main__':
+    main()
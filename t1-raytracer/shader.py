@@ -3,21 +3,62 @@
 
 
 import math
+import random
 import operator as op
 import geometry as gm
 
+from framebuffer import Framebuffer
+
+
+# reflections whose path weight falls below this
+# fraction cannot change the color by a full step
+THRESHOLD = 1 / 255.
+
 
 class Phong(object):
     """
     Phong shader. Determines a pixels color value.
+
+    Every ray carries the weight its color contributes to the
+    pixel, the product of the shininess of all bodies it got
+    reflected by. Reflections whose weight falls below the
+    threshold are not traced. With russian roulette they are
+    traced with a probability of weight / threshold instead
+    and weighted up accordingly, which keeps the expected
+    color unchanged.
     """
 
+    batched = False
+
     def __str__(self):
         return "Phong Shader with recursion depth %d" % self.depth
 
-    def __init__(self, world, depth):
+    def __init__(self, world, depth, threshold=THRESHOLD,
+                 roulette=False, seed=0):
+        """
+        world     -- World instance to render
+        depth     -- Maximum recursion depth
+        threshold -- (Optional) Path weight below which
+                     reflections are skipped (0 traces all)
+        roulette  -- (Optional) Continue skipped reflections
+                     by russian roulette
+        seed      -- (Optional) Seed of the roulettes random
+                     generator
+        """
         self._world = world
         self._depth = depth
+        self.threshold = threshold
+        self.roulette = roulette
+        self._random = random.Random(seed)
+
+        # reflections considered and skipped
+        self.reflections = 0
+        self.skipped = 0
+
+        # bit mask of the bodies (world ids) touched by the ray
+        # tree of the current pixel while tracking dependencies
+        # (@see self.capture), None otherwise
+        self.touched = None
 
     @property
     def world(self):
@@ -27,6 +68,10 @@ class Phong(object):
     def depth(self):
         return self._depth
 
+    @depth.setter
+    def depth(self, depth):
+        self._depth = depth
+
     def diffus(self, obj, cosphi):
         """
         Calculates the diffus factor of the phong
@@ -58,42 +103,82 @@ class Phong(object):
             return factor
         return 0
 
-    def colorize(self, ray, d):
+    def report(self):
+        """
+        Returns a summary of the skipped reflections.
+        """
+        return "skipped %d of %d reflections (threshold %g%s)" % (
+            self.skipped, self.reflections, self.threshold,
+            ', russian roulette' if self.roulette else '')
+
+    def colorize(self, ray, d, weight=1.):
         """
         Handles the n'th recursive colorization step.
         Checks for intersections with the worlds bodies
         and determines a color value based on the bodies
         properties.
 
-        ray -- geometry.Ray instance
-        d   -- Recursion step. Aborts at 0
+        ray    -- geometry.Ray instance
+        d      -- Recursion step. Aborts at 0
+        weight -- (Optional) Path weight of the ray
         """
         obj, point = self.world.trace(ray, maxdist=self.world.maxdist)
+        return self.illuminate(obj, point, ray, d, weight)
+
+    def illuminate(self, obj, point, ray, d, weight=1.):
+        """
+        Determines the color at the point where
+        a ray hit a body.
+
+        obj    -- Body hit by the ray (or None)
+        point  -- geometry.Point of the hit
+        ray    -- geometry.Ray instance
+        d      -- Recursion step. Aborts at 0
+        weight -- (Optional) Path weight of the ray
+        """
         if obj is None:
             return self.world.background
 
+        if self.touched is not None:
+            self.touched |= 1 << self.world.bodyid(obj)
+
         normal = obj.geometry.normal(point)
+        base = obj.colorAt(point)
+        return self._shade(obj, point, normal, base, ray.direction, d, weight)
 
+    def _shade(self, obj, point, normal, base, view, d, weight=1.):
+        """
+        Phong shading of a hit, tracing the shadow and
+        reflection rays (@see self.illuminate).
+
+        obj    -- Body hit by the ray
+        point  -- geometry.Point of the hit
+        normal -- geometry.Vector, surface normal at the point
+        base   -- Color of the body at the point
+        view   -- Normalized direction of the ray
+        d      -- Recursion step. Aborts at 0
+        weight -- (Optional) Path weight of the ray
+        """
         # ambient
-        color = obj.colorAt(point) * self.world.lightness
+        color = base * self.world.lightness
         # color = gm.Vector((0, 0, 0))
 
         #
         #   exercise shading for every light source
         #
         for light in self.world.lights:
-            lightvec = (light.geometry - point).normalize()
-            lightray = gm.Ray(point, lightvec)
-
-            collection = self.world.bodies.difference((obj,))
-            hit, p = self.world.trace(lightray, collection)
-            if hit is not None:
+            blocker = self.world.occluded(point, light, obj)
+            if blocker is not None:
+                if self.touched is not None:
+                    self.touched |= 1 << self.world.bodyid(blocker)
                 continue
 
+            lightvec = (light.geometry - point).normalize()
+
             # intensify the objects color
             # based on the lights components
             # instead of just adding up
-            lightc = obj.colorAt(point).combine(light.color / 0xff, op.mul)
+            lightc = base.combine(light.color / 0xff, op.mul)
 
             # diffus
             cosphi = (normal * lightvec)
@@ -101,31 +186,128 @@ class Phong(object):
             color += lightc * factor
 
             # specular
-            costheta = -ray.direction * lightvec.mirror(normal)
+            costheta = -view * lightvec.mirror(normal)
             factor = self.specular(obj, cosphi, costheta)
             color += light.color * factor
 
         # recursive reflection handling
         if d > 0:
             factor = obj.shininess
-            direction = -(ray.direction).mirror(normal)
+            weight *= factor
+            self.reflections += 1
+
+            if weight < self.threshold:
+                p = weight / self.threshold
+                if not self.roulette or self._random.random() >= p:
+                    self.skipped += 1
+                    return color
+                # a survivor stands in for the terminated ones
+                factor /= p
+                weight = self.threshold
+
+            direction = -view.mirror(normal)
             ray = gm.Ray(point, direction)
-            color += self.colorize(ray, d - 1) * factor
+            color += self.colorize(ray, d - 1, weight) * factor
 
         # refraction (TODO)
         # ...
         return color
 
+    def _clamp(self, color):
+        """
+        Scales a color down to 0 - 255 if it is brighter.
+        """
+        factor = max(color.raw) / float(0xff)
+        if factor > 1:
+            color /= factor
+        return color
+
+    def sample(self, ray):
+        """
+        Starts colorization and returns a color tuple
+        normalized to 0 - 255 together with the body
+        hit first (or None).
+
+        ray -- A geometry.Ray instance
+        """
+        obj, point = self.world.trace(ray, maxdist=self.world.maxdist)
+        color = self.illuminate(obj, point, ray, self.depth)
+        return self._clamp(color).raw, obj
+
     def shade(self, ray):
         """
         The shaders main entry point. Starts colorization
-        and returns a normalized color tuple.
+        and returns a color tuple normalized to 0 - 255.
+        Quantization is left to the framebuffer.
 
         ray -- A geometry.Ray instance
         """
-        color = self.colorize(ray, self.depth)
-        factor = max(color.raw) / float(0xff)
-        if factor > 1:
-            color /= factor
+        return self.sample(ray)[0]
+
+    def capture(self, ray, x, y, gbuffer=None, dependencies=None):
+        """
+        Like self.shade but records the first hit of the ray
+        in a G-buffer and the bodies its ray tree touched
+        (hits and shadow blockers) as well.
+
+        ray          -- A geometry.Ray instance
+        x, y         -- Pixel coordinates of the ray
+        gbuffer      -- (Optional) gbuffer.GBuffer instance
+        dependencies -- (Optional) incremental.Dependencies instance
+        """
+        obj, point = self.world.trace(ray, maxdist=self.world.maxdist)
+        if obj is not None and gbuffer is not None:
+            gbuffer.put(
+                x, y, self.world.bodyid(obj), point.raw,
+                obj.geometry.normal(point).raw, obj.colorAt(point).raw,
+                ray.direction.raw)
+
+        if dependencies is None:
+            color = self.illuminate(obj, point, ray, self.depth)
+            return self._clamp(color).raw
+
+        self.touched = 0
+        try:
+            color = self.illuminate(obj, point, ray, self.depth)
+            dependencies.put(x, y, self.touched)
+        finally:
+            self.touched = None
+        return self._clamp(color).raw
+
+    def relight(self, gbuffer, framebuffer=None):
+        """
+        Shades a picture again from its G-buffer with the
+        current lights and materials of the world. Only
+        shadow and reflection rays get traced. Pixels of
+        bodies that are no longer part of the world get
+        the background color. Returns the framebuffer.
+
+        gbuffer     -- gbuffer.GBuffer captured by Camera.shoot
+        framebuffer -- (Optional) Framebuffer instance
+        """
+        if framebuffer is None:
+            framebuffer = Framebuffer(gbuffer.resolution)
+
+        world = self.world
+        objs = dict((world.bodyid(body), body) for body in world.bodies)
+        background = self._clamp(world.background).raw
+
+        ids = gbuffer.ids.tolist()
+        points = gbuffer.points.tolist()
+        normals = gbuffer.normals.tolist()
+        directions = gbuffer.directions.tolist()
+
+        width = gbuffer.width
+        for i, bodyid in enumerate(ids):
+            y, x = divmod(i, width)
+            obj = objs.get(bodyid)
+            if obj is None:
+                framebuffer.put(x, y, background)
+                continue
 
-        return tuple(map(int, color.raw))
+            point = gm.Point(tuple(points[i]))
+            color = self._shade(
+                obj, point, gm.Vector(tuple(normals[i])), obj.colorAt(point),
+                gm.Vector(tuple(directions[i])), self.depth)
+            framebuffer.put(x, y, self._clamp(color).raw)
+        return framebuffer
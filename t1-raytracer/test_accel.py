@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import geometry as gm
+import bodies as bd
+
+from accel import *
+from raytracer import World, RaytraceException
+
+
+class BVHTests(unittest.TestCase):
+
+    name = 'bvh'
+
+    def setUp(self):
+        rnd = random.Random(7)
+        coord = lambda: tuple(rnd.uniform(-10, 10) for i in range(3))
+
+        self.world = World((0, 0, 0))
+        for i in range(60):
+            c = coord()
+            vertices = [tuple(x + rnd.uniform(-1, 1) for x in c)
+                        for j in range(3)]
+            self.world.addBodies(bd.Triangle(*vertices))
+            self.world.addBodies(bd.Sphere(coord(), rnd.uniform(.2, 1)))
+        self.world.addBodies(bd.Plane((0, -11, 0), (0, 1, 0)))
+
+        self.rays = [gm.Ray(coord(), coord()) for i in range(200)]
+
+    def testBuild(self):
+        bvh = BVH(self.world.bodies)
+        self.assertEqual(len(bvh.unbounded), 1)
+        self.assertGreater(len(bvh._left), 1)
+
+    def testEmpty(self):
+        bvh = BVH([])
+        self.assertEqual(bvh.trace(self.rays[0]), (None, None))
+
+    def testTrace(self):
+        expected = [self.world.trace(ray) for ray in self.rays]
+        self.world.accelerate(self.name)
+        for ray, (obj, point) in zip(self.rays, expected):
+            self.assertIs(self.world.trace(ray)[0], obj)
+
+        self.assertEqual(self.world.accel.rays, len(self.rays))
+
+    def testRestore(self):
+        built = self.world.accelerate(self.name)
+        bodies = sorted(self.world.bodies, key=self.world.bodyid)
+        restored = type(built).restore(bodies, built.export(self.world.bodyid))
+
+        self.assertEqual(str(restored), str(built))
+        for ray in self.rays:
+            self.assertEqual(restored.trace(ray), built.trace(ray))
+            self.assertEqual(restored.occluded(ray, 5.), built.occluded(ray, 5.))
+
+        empty = type(built)([])
+        empty = type(built).restore([], empty.export(self.world.bodyid))
+        self.assertEqual(empty.trace(self.rays[0]), (None, None))
+
+    def testExclude(self):
+        firsts = [self.world.trace(ray)[0] for ray in self.rays]
+        expected = [self.world.trace(ray, exclude=obj)[0]
+                    for ray, obj in zip(self.rays, firsts)]
+
+        self.world.accelerate(self.name)
+        for ray, obj, second in zip(self.rays, firsts, expected):
+            self.assertIs(self.world.trace(ray, exclude=obj)[0], second)
+
+    def testMaxdist(self):
+        expected = [self.world.trace(ray, maxdist=5)[0] for ray in self.rays]
+        self.world.accelerate(self.name)
+        for ray, obj in zip(self.rays, expected):
+            self.assertIs(self.world.trace(ray, maxdist=5)[0], obj)
+
+    def testInvalidation(self):
+        self.world.accelerate(self.name)
+        self.world.addBodies(bd.Sphere((0, 0, 0), 1))
+        self.assertIsNone(self.world.accel)
+
+    def testEdit(self):
+        rnd = random.Random(3)
+        accelerator = self.world.accelerate(self.name)
+        removed = rnd.sample(sorted(self.world.bodies, key=self.world.bodyid), 6)
+        added = [bd.Sphere(tuple(rnd.uniform(-8, 8) for i in range(3)), .5)
+                 for i in range(3)]
+        added.append(bd.Plane((0, 11, 0), (0, -1, 0)))
+
+        self.assertTrue(self.world.updateBodies(added, removed))
+        self.assertIs(self.world.accel, accelerator)
+        self.assertEqual(accelerator.edits, 10)
+        self.assertEqual(len(self.world.bodies), 121 - 6 + 4)
+
+        rebuilt = ACCELERATORS[self.name](self.world.bodies)
+        for ray in self.rays:
+            self.assertEqual(accelerator.trace(ray), rebuilt.trace(ray))
+            self.assertIs(accelerator.trace(ray, 5.)[0] is None,
+                          rebuilt.occluded(ray, 5.) is None)
+
+    def testUnknown(self):
+        accelerator = ACCELERATORS[self.name](self.world.bodies)
+        self.assertFalse(accelerator.remove(bd.Plane((0, 5, 0), (0, 1, 0))))
+        self.assertFalse(accelerator.remove(bd.Sphere((50, 0, 0), 1)))
+        self.assertEqual(accelerator.edits, 0)
+
+    def testRebuild(self):
+        accelerator = self.world.accelerate(self.name)
+        removed = sorted(self.world.bodies, key=self.world.bodyid)[:40]
+        self.world.updateBodies(removed=removed)
+        self.assertIsNot(self.world.accel, accelerator)
+        self.assertEqual(self.world.accel.edits, 0)
+
+    def testOccluded(self):
+        accelerator = self.world.accelerate(self.name)
+        self.assertIsInstance(accelerator, ACCELERATORS[self.name])
+        for ray in self.rays:
+            nearest, t = accelerator.trace(ray, 8)
+            blocker = accelerator.occluded(ray, 8)
+            if nearest is None:
+                self.assertIsNone(blocker)
+                continue
+            hit = blocker.geometry.intersection(ray)
+            self.assertTrue(EPSILON <= hit < 8)
+
+
+class GridTests(BVHTests):
+
+    name = 'grid'
+
+    def testBuild(self):
+        grid = Grid(self.world.bodies)
+        self.assertEqual(len(grid.unbounded), 1)
+        self.assertGreater(len(grid._cells), 1)
+
+    def testEmpty(self):
+        grid = Grid([])
+        self.assertEqual(grid.trace(self.rays[0]), (None, None))
+
+    def testParallel(self):
+        # axis parallel rays from within the grid
+        grid = Grid(self.world.bodies)
+        for ray in self.rays:
+            for direction in ((1, 0, 0), (0, -1, 0), (0, 0, 1)):
+                axial = gm.Ray(ray.origin, gm.Vector(direction))
+                expected = self.world.trace(axial)[0]
+                self.assertIs(grid.trace(axial)[0], expected)
+
+
+class BruteForceTests(BVHTests):
+
+    name = 'bruteforce'
+
+    def testBuild(self):
+        self.assertEqual(len(BruteForce(self.world.bodies).unbounded), 121)
+
+    def testRebuild(self):
+        accelerator = self.world.accelerate(self.name)
+        removed = sorted(self.world.bodies, key=self.world.bodyid)[:40]
+        self.assertTrue(self.world.updateBodies(removed=removed))
+        self.assertIs(self.world.accel, accelerator)
+        self.assertEqual(len(accelerator.unbounded), 81)
+
+
+class ChooseTests(unittest.TestCase):
+
+    def testFew(self):
+        bodies = [bd.Sphere((0, 0, 0), 1), bd.Plane((0, 0, 0), (0, 1, 0))]
+        self.assertEqual(choose(bodies), 'bruteforce')
+        bodies = [bd.Sphere((i, 0, 0), 1) for i in range(3)]
+        self.assertEqual(choose(bodies), 'bvh')
+
+    def testUniform(self):
+        bodies = [bd.Sphere((i, i % 7, i % 5), .5) for i in range(100)]
+        bodies.append(bd.Plane((0, 0, 0), (0, 1, 0)))
+        self.assertEqual(choose(bodies), 'grid')
+        self.assertIsInstance(build(bodies), Grid)
+
+    def testUneven(self):
+        bodies = [bd.Sphere((i, i % 7, i % 5), .5) for i in range(100)]
+        bodies.append(bd.Triangle((-100, 0, 0), (100, 0, 0), (0, 0, 100)))
+        self.assertEqual(choose(bodies), 'bvh')
+        self.assertIsInstance(build(bodies, 'auto'), BVH)
+        self.assertIsInstance(build(bodies, 'grid'), Grid)
+
+    def testAbstract(self):
+        ray = gm.Ray((0, 0, 0), (1, 0, 0))
+        self.assertRaises(AcceleratorException, Accelerator([]).trace, ray)
+
+    def testWorld(self):
+        world = World((0, 0, 0))
+        world.addBodies(*[bd.Sphere((i, 0, 0), 1) for i in range(3)])
+        self.assertEqual(world.accelerator, 'auto')
+        self.assertIsInstance(world.accelerate(), BVH)
+
+        world.accelerator = 'grid'
+        self.assertIsInstance(world.accelerate(), Grid)
+        with self.assertRaises(RaytraceException):
+            world.accelerator = 'octree'
+
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from antialias import Antialiasing
+from raytracer import *
+from fixtures import setup, WORLDS
+
+
+class AntialiasingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'balls.json', res=(37, 29))
+
+    def testEdges(self):
+        aa = Antialiasing(threshold=10)
+        colors = [0] * 3 * 9
+        colors[4 * 3] = 200
+        self.assertEqual(aa.edges((3, 3), colors, [1] * 9), [1, 3, 4, 5, 7])
+        self.assertEqual(aa.edges((3, 3), [0] * 27, [1] * 9), [])
+        self.assertEqual(aa.edges((3, 1), [0] * 9, [1, 1, 2]), [1, 2])
+
+    def testOffsets(self):
+        aa = Antialiasing(samples=9)
+        offsets = aa.offsets(4, 7)
+        self.assertEqual(len(offsets), 9)
+        self.assertEqual(offsets, aa.offsets(4, 7))
+        for x, y in offsets:
+            self.assertTrue(3.5 <= x < 4.5 and 6.5 <= y < 7.5)
+
+    def testAdaptive(self):
+        aa = Antialiasing()
+        direct = self.camera.shoot(self.eye, self.up).tobytes()
+        smooth = aa.shoot(self.camera, self.eye, self.up).tobytes()
+
+        self.assertEqual(aa.pixels, 37 * 29)
+        self.assertGreater(aa.refined, 0)
+        self.assertLess(aa.refined, aa.pixels)
+
+        changed = set(i // 3 for i in range(len(direct))
+                      if direct[i] != smooth[i])
+        self.assertTrue(changed)
+        self.assertLessEqual(len(changed), aa.refined)
+
+    def testImporter(self):
+        imp = Importer(os.path.join(WORLDS, 'balls.json'))
+        self.assertIsNone(imp.antialiasing)
+        imp.json['antialiasing'] = {'samples': 9}
+        self.assertEqual(imp.antialiasing.grid, 3)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+import batch
+from raytracer import *
+from fixtures import copy, WORLDS
+
+
+class BatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.target = os.path.join(self.tmp, 'out')
+        os.mkdir(self.target)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def scene(self, world, resolution=(24, 16), pictures=1, name=None):
+        def edit(raw):
+            raw['pictures'] = raw['pictures'][:1] * pictures
+        return copy(world, self.tmp, name, resolution, edit)[0]
+
+    def testScenes(self):
+        names = [self.scene('task.json'), self.scene('balls.json')]
+        self.assertEqual(batch.scenes(self.tmp), sorted(names))
+        self.assertEqual(batch.scenes(os.path.join(self.tmp, 't*.json')),
+                         names[:1])
+
+    def testJobs(self):
+        small = self.scene('task.json', pictures=2)
+        large = self.scene('balls.json', (48, 32))
+        todo, failed = batch.jobs([small, large], self.target)
+
+        self.assertEqual(failed, [])
+        self.assertEqual([(job.scene, job.index) for job in todo],
+                         [(large, 0), (small, 0), (small, 1)])
+        self.assertEqual(
+            [os.path.basename(job.output) for job in todo],
+            ['balls.png', 'task-1.png', 'task-2.png'])
+
+    def testNames(self):
+        for sub in ('a', 'b'):
+            os.mkdir(os.path.join(self.tmp, sub))
+        fnames = [self.scene('task.json', name='a/task.json'),
+                  self.scene('task.json', name='b/task.json'),
+                  self.scene('balls.json'),
+                  self.scene('task.json', name='balls-2.json'),
+                  self.scene('task.json', name='ball.json', pictures=2)]
+        todo, failed = batch.jobs(fnames, self.target)
+
+        self.assertEqual(
+            sorted(os.path.basename(job.output) for job in todo),
+            ['a-task.png', 'b-task.png', 'ball-1.png', 'ball-2.png',
+             'balls-2.png', 'balls.png'])
+        self.assertEqual(failed, [])
+
+        # pictures that would overwrite the ones of another scene
+        fnames.append(self.scene('task.json', name='ball-2.json'))
+        todo, failed = batch.jobs(fnames, self.target)
+        self.assertEqual([r.job.scene for r in failed], [fnames[-1]])
+        self.assertIn('ball.json', failed[0].error)
+
+    def testEstimate(self):
+        with open(os.path.join(WORLDS, 'task.json')) as f:
+            raw = json.load(f)
+        cost = batch.estimate(raw)
+        raw['recdepth'] += 1
+        self.assertGreater(batch.estimate(raw), cost)
+        raw['bodies'] = raw['bodies'][:2]
+        self.assertLess(batch.estimate(raw), cost)
+
+    def testRender(self):
+        fnames = [self.scene('task.json', pictures=2),
+                  self.scene('balls.json')]
+        for workers in (1, 2):
+            todo, _ = batch.jobs(fnames, self.target)
+            results = list(batch.render(todo, workers))
+            self.assertEqual(len(results), 3)
+            for result in results:
+                self.assertIsNone(result.error)
+                expected = next(raytrace(result.job.scene, raw=True))
+                with Image.open(result.job.output) as img:
+                    self.assertEqual(img.convert('RGB').tobytes(),
+                                     expected.tobytes())
+
+    def testCache(self):
+        fname = self.scene('task.json', pictures=4)
+        todo, _ = batch.jobs([fname], self.target)
+        results = list(batch.render(todo, 2, cache=True))
+        self.assertEqual([r.error for r in results], [None] * 4)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'task.scene')))
+        self.assertEqual(
+            [name for name in os.listdir(self.tmp) if name.endswith('.tmp')],
+            [])
+
+    def testFailed(self):
+        broken = os.path.join(self.tmp, 'broken.json')
+        with open(broken, 'w') as f:
+            f.write('{"camera": ')
+        fnames = [broken, self.scene('task.json'),
+                  os.path.join(WORLDS, 'bunny.json')]
+        todo, failed = batch.jobs(fnames, self.target)
+        self.assertEqual([r.job.scene for r in failed], [broken])
+
+        # the numpy engine can not render meshes
+        results = list(batch.render(todo, engine='numpy'))
+        errors = [r.job.scene for r in results if r.error is not None]
+        self.assertEqual(errors, [fnames[2]])
+
+        table = batch.summary(failed + results, 1.)
+        self.assertEqual(len(table.splitlines()), 2 + 3 + 1)
+        self.assertIn('1 of 3 pictures', table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import benchmark
+import vectorized as vc
+from shader import Phong
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def testSynthetic(self):
+        config = benchmark.synthetic(5, 7, 3, (16, 12))
+        self.assertEqual(len(config['bodies']), 5 + 7 + 1)
+        self.assertEqual(len(config['lights']), 3)
+        self.assertEqual(config, benchmark.synthetic(5, 7, 3, (16, 12)))
+
+    def testRun(self):
+        config = benchmark.synthetic(5, 7, 2, (16, 12))
+        scalar = benchmark.run('small', config)
+        batched = benchmark.run('small', config, 'numpy')
+
+        self.assertEqual(scalar['primary'], 16 * 12)
+        self.assertGreater(scalar['shadow'], 0)
+        self.assertGreater(scalar['reflection'], 0)
+        for key in ('primary', 'shadow', 'reflection'):
+            self.assertEqual(scalar[key], batched[key])
+
+    def testRestored(self):
+        methods = (Phong.sample, Phong.colorize, vc.Phong.occluded)
+        with benchmark.counting():
+            self.assertIsNot(Phong.sample, methods[0])
+        self.assertEqual((Phong.sample, Phong.colorize, vc.Phong.occluded),
+                         methods)
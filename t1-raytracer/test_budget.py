@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from budget import Budget
+from antialias import Antialiasing
+from raytracer import *
+from fixtures import setup, WORLDS
+
+
+class BudgetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'balls.json', res=(37, 29))
+
+    def testGenerous(self):
+        direct = self.camera.shoot(self.eye, self.up)
+        budget = Budget(self.camera)
+        frame = budget.shoot(self.eye, self.up, 60)
+
+        self.assertEqual(frame.tobytes(), direct.tobytes())
+        self.assertEqual(budget.level['depth'], budget.maxdepth)
+        self.assertEqual(budget.level['traced'], 1.)
+        self.assertIsNone(budget.level['antialiasing'])
+
+    def testAntialiasing(self):
+        aa = Antialiasing()
+        smooth = aa.shoot(self.camera, self.eye, self.up)
+        budget = Budget(self.camera, aa)
+        frame = budget.shoot(self.eye, self.up, 60)
+
+        self.assertEqual(frame.tobytes(), smooth.tobytes())
+        self.assertEqual(budget.level['antialiasing'], 1.)
+        self.assertIn('100% of the edges', budget.report())
+
+    def testExhausted(self):
+        budget = Budget(self.camera, Antialiasing())
+        frame = budget.shoot(self.eye, self.up, 0)
+
+        # still a complete frame, traced as coarse as possible
+        self.assertEqual(frame.resolution, self.camera.resolution)
+        self.assertEqual(budget.level['depth'], 0)
+        self.assertIsNone(budget.level['antialiasing'])
+        self.assertLess(budget.level['traced'], 1.)
+        self.assertEqual(self.camera.shader.depth, budget.maxdepth)
+        self.assertIn('recursion depth 0/', budget.report())
+
+    def testRaytrace(self):
+        name = os.path.join(WORLDS, 'task.json')
+        frames = list(raytrace(name, raw=True, deadline=0))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0].resolution, Importer(name).camera.resolution)
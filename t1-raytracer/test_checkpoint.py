@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import parallel
+import scenecache
+from checkpoint import Checkpoint, CheckpointException
+from raytracer import *
+from fixtures import setup, copy, WORLDS
+
+
+OBJ = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 't2-objv', 'data', 'test.obj')
+
+
+class Killed(Exception):
+    pass
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = os.path.join(WORLDS, 'task.json')
+        self.camera, self.eye, self.up = setup(
+            'task.json', res=(40, 30), accelerate=True)
+
+        self.tmp = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmp, 'out.png.ckpt')
+        self.key = scenecache.scenehash(self.scene, [])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def interrupt(self, tiles):
+        """
+        Renders into a checkpoint until the process gets
+        "killed" after the given number of tiles.
+        """
+        checkpoint = Checkpoint(self.fname, self.key, 16, interval=0)
+        shootTile, rendered = self.camera.shootTile, []
+
+        def killing(eye, up, tile):
+            if len(rendered) == tiles:
+                raise Killed()
+            rendered.append(tile)
+            return shootTile(eye, up, tile)
+
+        self.camera.shootTile = killing
+        try:
+            self.camera.shoot(self.eye, self.up,
+                              checkpoint=checkpoint.picture(0))
+        except Killed:
+            pass
+        finally:
+            del self.camera.shootTile
+        return rendered
+
+    def testResume(self):
+        direct = self.camera.shoot(self.eye, self.up)
+        done = self.interrupt(3)
+        self.assertTrue(os.path.exists(self.fname))
+        self.assertFalse(os.path.exists(self.fname + '.tmp'))
+
+        checkpoint = Checkpoint.load(self.fname, self.key)
+        self.assertEqual(checkpoint.tilesize, 16)
+        picture = checkpoint.picture(0)
+        self.assertEqual(sorted(picture.tiles), sorted(done))
+
+        rendered = []
+        shootTile = self.camera.shootTile
+        self.camera.shootTile = lambda eye, up, tile: \
+            rendered.append(tile) or shootTile(eye, up, tile)
+        frame = self.camera.shoot(self.eye, self.up, checkpoint=picture)
+        del self.camera.shootTile
+
+        self.assertEqual(frame.tobytes(), direct.tobytes())
+        self.assertFalse(set(rendered) & set(done))
+        self.assertEqual(len(rendered) + len(done), 3 * 2)
+
+    def testTiled(self):
+        direct = self.camera.shoot(self.eye, self.up)
+        self.interrupt(2)
+        picture = Checkpoint.load(self.fname, self.key).picture(0)
+
+        renderer = parallel.TileRenderer(self.camera, 2, 8)
+        try:
+            frame = renderer.shoot(self.eye, self.up, checkpoint=picture)
+        finally:
+            renderer.close()
+
+        self.assertEqual(frame.tobytes(), direct.tobytes())
+        self.assertEqual(len(picture.tiles), 3 * 2)
+
+    def testStale(self):
+        self.interrupt(1)
+        self.assertRaises(CheckpointException,
+                          Checkpoint.load, self.fname, 'another scene')
+
+        with open(self.fname, 'wb') as f:
+            f.write(b'garbage')
+        self.assertRaises(CheckpointException,
+                          Checkpoint.load, self.fname, self.key)
+
+    def testRaytrace(self):
+        with open(self.scene) as f:
+            raw = json.load(f)
+        raw['camera']['resolution'] = [40, 30]
+        self.scene = os.path.join(self.tmp, 'small.json')
+        with open(self.scene, 'w') as f:
+            json.dump(raw, f)
+        self.key = scenecache.scenehash(self.scene, [])
+
+        frames = list(raytrace(self.scene, raw=True, checkpoint=self.fname))
+        self.assertFalse(os.path.exists(self.fname))
+
+        # a complete checkpoint leaves nothing to render
+        checkpoint = Checkpoint(self.fname, self.key, 64)
+        picture = checkpoint.picture(0)
+        for tile in parallel.tiles(frames[0].resolution, 64):
+            picture.tiles[tile] = frames[0].crop(tile)
+        checkpoint.save()
+
+        shootTile = Camera.shootTile
+        Camera.shootTile = None
+        try:
+            resumed = list(raytrace(self.scene, raw=True,
+                                    checkpoint=self.fname, resume=True))
+        finally:
+            Camera.shootTile = shootTile
+
+        self.assertEqual(resumed[0].tobytes(), frames[0].tobytes())
+        self.assertFalse(os.path.exists(self.fname))
+
+    def testMesh(self):
+        def edit(raw):
+            raw['bodies'].append({
+                'type': 'mesh', 'file': 'test.obj', 'position': [0, 0, -10],
+                'color': 'ff0000', 'shininess': 0.2, 'smoothness': 5})
+        shutil.copy(OBJ, self.tmp)
+        self.scene = copy('task.json', self.tmp, res=(16, 12), edit=edit)[0]
+        key = scenecache.scenehash(self.scene, ['test.obj'])
+        Checkpoint(self.fname, key, 64).save()
+        list(raytrace(self.scene, raw=True, checkpoint=self.fname,
+                      resume=True))
+
+        # an edited obj file outdates the checkpoint
+        Checkpoint(self.fname, key, 64).save()
+        with open(os.path.join(self.tmp, 'test.obj'), 'a') as f:
+            f.write('\n')
+        self.assertRaises(CheckpointException, list, raytrace(
+            self.scene, raw=True, checkpoint=self.fname, resume=True))
+
+
+class OutputTests(unittest.TestCase):
+
+    def testNames(self):
+        self.assertEqual(outputname('out.png', 0, 1), 'out.png')
+        self.assertEqual(outputname('out.png', 1, 3), 'out-2.png')
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+import daemon
+from raytracer import *
+from fixtures import copy
+
+
+class DaemonTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'daemon.sock')
+        self.scenes = daemon.Scenes(2)
+        self.server = daemon.Server(
+            self.path, daemon.Renderer(self.scenes))
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': .01})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def scene(self, world, name=None, background='000000'):
+        def edit(raw):
+            raw['world']['background'] = background
+        return copy(world, self.tmp, name, edit=edit)
+
+    def render(self, fname, **kwargs):
+        data = daemon.render(fname, path=self.path, **kwargs)
+        return Image.open(io.BytesIO(data)).convert('RGB').tobytes()
+
+    def expected(self, fname, engine='scalar'):
+        return next(raytrace(fname, engine, raw=True)).tobytes()
+
+    def testRender(self):
+        fname, _ = self.scene('task.json')
+        for engine in ENGINES:
+            self.assertEqual(self.render(fname, engine=engine),
+                             self.expected(fname, engine))
+        self.assertEqual(self.render(fname), self.expected(fname))
+        self.assertEqual((self.scenes.hits, self.scenes.misses), (1, 2))
+
+    def testPosition(self):
+        fname, raw = self.scene('balls.json')
+        picture = raw['pictures'][0]
+        self.assertEqual(
+            self.render(fname, eye=picture['eye'], up=picture['up']),
+            self.render(fname, picture=0))
+
+    def testEdited(self):
+        fname, raw = self.scene('task.json')
+        self.render(fname)
+        raw['world']['background'] = '203040'
+        with open(fname, 'w') as f:
+            json.dump(raw, f)
+        self.assertEqual(self.render(fname), self.expected(fname))
+        self.assertEqual(self.scenes.misses, 2)
+
+    def testShared(self):
+        # copies of a scene share the prepared one
+        for name in ('a.json', 'b.json'):
+            self.render(self.scene('task.json', name)[0])
+        self.assertEqual((self.scenes.hits, self.scenes.misses), (1, 1))
+
+    def testEvicted(self):
+        names = [self.scene('task.json', 'scene%d.json' % i, '00000%d' % i)[0]
+                 for i in range(3)]
+        for fname in names + names[-1:]:
+            self.render(fname)
+        self.assertEqual(len(self.scenes), 2)
+        self.assertEqual((self.scenes.hits, self.scenes.misses), (1, 3))
+
+    def testErrors(self):
+        fname, _ = self.scene('task.json')
+        for kwargs in ({'picture': 5}, {'engine': 'fortran'}):
+            with self.assertRaises(daemon.DaemonException):
+                daemon.render(fname, path=self.path, **kwargs)
+        with self.assertRaises(daemon.DaemonException):
+            daemon.render(os.path.join(self.tmp, 'missing.json'),
+                          path=self.path)
+        with self.assertRaises(daemon.DaemonException):
+            daemon.render(fname, eye=(0, 2, 5), path=self.path)
+
+    def testSocket(self):
+        # a running daemon keeps its socket
+        with self.assertRaises(daemon.DaemonException):
+            daemon.Server(self.path, daemon.Renderer(self.scenes))
+        self.assertEqual(self.render(self.scene('task.json')[0]),
+                         self.expected(os.path.join(self.tmp, 'task.json')))
+
+        # files that are no sockets are never removed
+        fname = os.path.join(self.tmp, 'file')
+        open(fname, 'w').close()
+        with self.assertRaises(daemon.DaemonException):
+            daemon.Server(fname, daemon.Renderer(self.scenes))
+        self.assertTrue(os.path.exists(fname))
+
+        # the socket of a daemon that is gone gets replaced
+        stale = os.path.join(self.tmp, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stale)
+        sock.close()
+        daemon.Server(stale, daemon.Renderer(self.scenes)).server_close()
+        self.assertFalse(os.path.exists(stale))
+
+    def testConnection(self):
+        fname, _ = self.scene('task.json')
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.path)
+        stream = conn.makefile('rwb')
+        try:
+            # a broken request leaves the connection open
+            stream.write(b'{"scene": 1}\n')
+            stream.write(json.dumps({'scene': fname}).encode('utf-8') + b'\n')
+            stream.flush()
+
+            self.assertIn('error', json.loads(stream.readline().decode()))
+            header = json.loads(stream.readline().decode())
+            self.assertFalse(header['cached'])
+            png = stream.read(header['size'])
+            self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+        finally:
+            stream.close()
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from framebuffer import Framebuffer
+
+
+class FramebufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.fb = Framebuffer((4, 3))
+
+    def testConstruction(self):
+        self.assertEqual(len(self.fb.raw), 4 * 3 * 3)
+        self.assertEqual(self.fb.resolution, (4, 3))
+
+        buf = bytearray(4 * 3 * 3)
+        self.assertIs(Framebuffer((4, 3), buf).raw, buf)
+
+    def testPut(self):
+        self.fb.put(1, 2, (255, 127.9, 0.5))
+        self.assertEqual(self.fb.raw[27:30], bytes((255, 127, 0)))
+
+    def testBlit(self):
+        self.fb.blit((1, 1, 3, 3), bytes(range(1, 13)))
+        self.assertEqual(self.fb.raw[15:21], bytes(range(1, 7)))
+        self.assertEqual(self.fb.raw[27:33], bytes(range(7, 13)))
+        self.assertEqual(self.fb.raw[:15], bytes(15))
+
+    def testImage(self):
+        self.fb.put(3, 0, (10, 20, 30))
+        img = self.fb.image()
+        self.assertEqual(img.size, (4, 3))
+        self.assertEqual(img.getpixel((3, 0)), (10, 20, 30))
+        self.assertEqual(img.tobytes(), self.fb.tobytes())
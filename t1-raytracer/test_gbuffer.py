@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from gbuffer import GBuffer
+from raytracer import *
+from fixtures import setup
+
+
+def capture(fname, engine):
+    camera, eye, up = setup(fname, engine)
+    gbuffer = GBuffer(camera.resolution)
+    camera.shoot(eye, up, gbuffer=gbuffer)
+    return camera, gbuffer, (eye, up)
+
+
+class CaptureTests(unittest.TestCase):
+
+    def testUnchanged(self):
+        for engine in ENGINES:
+            camera, eye, up = setup('task.json', engine)
+            plain = camera.shoot(eye, up).tobytes()
+            gbuffer = GBuffer(camera.resolution)
+            self.assertEqual(camera.shoot(eye, up, gbuffer=gbuffer).tobytes(),
+                             plain)
+            self.assertEqual(camera.shader.relight(gbuffer).tobytes(), plain)
+
+    def testEngines(self):
+        scalar, g1, _ = capture('balls.json', 'scalar')
+        batched, g2, _ = capture('balls.json', 'numpy')
+        for name in ('ids', 'points', 'normals', 'colors', 'directions'):
+            self.assertTrue((getattr(g1, name) == getattr(g2, name)).all())
+        self.assertEqual(batched.shader.relight(g1).tobytes(),
+                         scalar.shader.relight(g2).tobytes())
+
+    def testHits(self):
+        camera, gbuffer, _ = capture('task.json', 'scalar')
+        world = camera.world
+        ids = set(world.bodyid(body) for body in world.bodies)
+        hits = gbuffer.hits
+        self.assertTrue(hits.any() and not hits.all())
+        self.assertTrue(set(gbuffer.ids[hits].tolist()) <= ids)
+        self.assertTrue(np.isinf(gbuffer.depths()[~hits]).all())
+
+    def testCheckpoint(self):
+        camera, eye, up = setup('task.json', 'scalar')
+        with self.assertRaises(RaytraceException):
+            camera.shoot(eye, up, checkpoint=object(),
+                         gbuffer=GBuffer(camera.resolution))
+
+
+class RelightTests(unittest.TestCase):
+
+    def _change(self, world):
+        light = next(iter(world.lights))
+        light.color = (255, 128, 64)
+        for body in world.bodies:
+            body.shininess = .5
+
+    def testScalar(self):
+        camera, gbuffer, (eye, up) = capture('task.json', 'scalar')
+        before = camera.shader.relight(gbuffer).tobytes()
+        self._change(camera.world)
+        relit = camera.shader.relight(gbuffer).tobytes()
+        self.assertNotEqual(relit, before)
+        self.assertEqual(relit, camera.shoot(eye, up).tobytes())
+
+    def testNumpy(self):
+        camera, gbuffer, (eye, up) = capture('task.json', 'numpy')
+        before = camera.shader.relight(gbuffer).tobytes()
+        self._change(camera.world)
+        # the numpy engine packs the materials on construction
+        camera.shader = vc.Phong(camera.world, camera.shader.depth)
+        relit = camera.shader.relight(gbuffer).tobytes()
+        self.assertNotEqual(relit, before)
+        self.assertEqual(relit, camera.shoot(eye, up).tobytes())
+
+    def testRemoved(self):
+        camera, gbuffer, _ = capture('balls.json', 'scalar')
+        world = camera.world
+        body = next(b for b in world.bodies
+                    if world.bodyid(b) in gbuffer.ids.tolist())
+        world.bodies.remove(body)
+
+        pixels = np.frombuffer(
+            camera.shader.relight(gbuffer).tobytes(), np.uint8).reshape(-1, 3)
+        background = tuple(int(c) for c in world.background.raw)
+        gone = gbuffer.ids == world.bodyid(body)
+        self.assertTrue((pixels[gone] == background).all())
+
+
+class ImageTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.gbuffer, _ = capture('task.json', 'numpy')
+
+    def _pixels(self, framebuffer):
+        self.assertEqual(framebuffer.resolution, self.camera.resolution)
+        return np.frombuffer(framebuffer.tobytes(), np.uint8).reshape(-1, 3)
+
+    def testDepth(self):
+        pixels = self._pixels(self.gbuffer.depthImage())
+        hits = self.gbuffer.hits
+        self.assertTrue((pixels[~hits] == 0).all())
+        self.assertEqual(pixels[hits].max(), 255)
+        depths = self.gbuffer.depths()
+        near = np.argmin(depths)
+        self.assertEqual(tuple(pixels[near]), (255, 255, 255))
+
+    def testNormal(self):
+        pixels = self._pixels(self.gbuffer.normalImage())
+        hits = self.gbuffer.hits
+        self.assertTrue((pixels[~hits] == 0).all())
+        expected = ((self.gbuffer.normals[hits] + 1) * 127.5).astype(np.uint8)
+        self.assertTrue((pixels[hits] == expected).all())
+
+    def testAlbedo(self):
+        pixels = self._pixels(self.gbuffer.albedoImage())
+        expected = np.clip(self.gbuffer.colors, 0, 255).astype(np.uint8)
+        self.assertTrue((pixels == expected).all())
+        self.assertEqual(self.gbuffer.albedoImage().image().size,
+                         self.camera.resolution)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,13 @@ class PointTests(unittest.TestCase):
         with self.assertRaises(GeometryException):
             p1 + p2
 
+    def testFields(self):
+        p = Point((1, 2, 3))
+        self.assertEqual((p.x, p.y, p.z), (1., 2., 3.))
+        self.assertIsNone(Point((1, 2)).x)
+        with self.assertRaises(AttributeError):
+            p.w = 4
+
 
 class VectorTests(unittest.TestCase):
 
@@ -182,6 +189,14 @@ class VectorTests(unittest.TestCase):
         l = Point((0, 0, 0)) - p
         self.assertEqual(l.mirror(n), Vector((-4, 0, 0)))
 
+    def testMixedDimensions(self):
+        v3 = Vector((1, 2, 3))
+        v4 = Vector((1, 2, 3, 4))
+        self.assertEqual(v4 * v4, 30)
+        self.assertEqual(v4 * 2, Vector((2, 4, 6, 8)))
+        with self.assertRaises(GeometryException):
+            v3 ** v4
+
     def testCombine(self):
         v1 = Vector((1, 2, 3))
         v2 = v1.clone()
@@ -309,6 +324,9 @@ class SphereTests(unittest.TestCase):
         self.r.direction = Vector((1, 1, 0))
         self.assertIsNone(self.s.intersection(self.r))
 
+    def testBounds(self):
+        self.assertEqual(self.s.bounds(), ((4, -2, -2), (8, 2, 2)))
+
 
 class PlaneTests(unittest.TestCase):
 
@@ -331,6 +349,13 @@ class PlaneTests(unittest.TestCase):
         self.assertEqual(self.p.point, self.pp)
         self.assertEqual(self.p.norm, self.pn)
 
+    def testRestore(self):
+        norm = Plane(self.pp, Vector((1, 2, 2))).norm
+        p = Plane.restore(self.pp, norm)
+        self.assertIs(p.norm, norm)
+        with self.assertRaises(GeometryException):
+            Plane.restore(self.pp, (1, 0, 0))
+
     def testEquality(self):
         p = Plane(self.pp, self.pn)
         self.assertTrue(self.p == p)
@@ -376,6 +401,9 @@ class PlaneTests(unittest.TestCase):
         self.r.direction = Vector((0, 1, 0))
         self.assertIsNone(self.p.intersection(self.r))
 
+    def testBounds(self):
+        self.assertIsNone(self.p.bounds())
+
 
 class TriangleTests(unittest.TestCase):
 
@@ -428,6 +456,49 @@ class TriangleTests(unittest.TestCase):
         self.r.direction = Vector((0, 1, 0))
         self.assertIsNone(self.t.intersection(self.r))
 
+    def testDegenerate(self):
+        vertices = tuple(map(Point, [(0, 0, 0), (1, 1, 1), (2, 2, 2)]))
+        t = Triangle(*vertices)
+        self.assertEqual(t.normal(None), Vector((0, 0, 0)))
+        self.r.origin = Point((1, 1, -5))
+        self.r.direction = Vector((0, 0, 1))
+        self.assertIsNone(t.intersection(self.r))
+
+    def testBounds(self):
+        self.assertEqual(self.t.bounds(), ((2, -1, -1), (2, 1, 1)))
+
+    def testPacked(self):
+        self.assertEqual(self.t.packed, (2, 1, 0, 0, -2, -1, 0, -2, 1))
+
+        vertices = tuple(map(Point, [(0, 0, 0), (1, 0, 0), (0, 1, 0)]))
+        self.t.vertices = vertices
+        self.assertEqual(self.t.packed, (0, 0, 0, 1, 0, 0, 0, 1, 0))
+        self.assertEqual(self.t.normal(None), Vector((0, 0, 1)))
+        self.assertEqual(self.t.u, Vector((1, 0, 0)))
+
+    def testVectorIntersection(self):
+        # the packed routine equals the textbook one with vectors
+        def reference(t, ray):
+            w = ray.origin - t.a
+            dv = ray.direction ** t.v
+            cosalpha = dv * t.u
+            if cosalpha == 0:
+                return None
+            wu = w ** t.u
+            r = (dv * w) / cosalpha
+            s = (wu * ray.direction) / cosalpha
+            if 0 <= r and r <= 1 and 0 <= s and s <= 1 and r + s <= 1:
+                return (wu * t.v) / cosalpha
+
+        rays = [Ray(Point((0, y / 7., z / 5.)), Vector((1, y / 3., -z / 11.)))
+                for y in range(-6, 7) for z in range(-6, 7)]
+        hits = 0
+        for ray in rays:
+            expected = reference(self.t, ray)
+            self.assertEqual(self.t.intersection(ray), expected)
+            hits += expected is not None
+        self.assertGreater(hits, 0)
+
 
 def main():
     unittest.main()
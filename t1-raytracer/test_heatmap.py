@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import tempfile
+import unittest
+
+import heatmap
+import instrument
+import vectorized as vc
+from raytracer import *
+from fixtures import setup, copy
+
+
+class TonemapTests(unittest.TestCase):
+
+    def testRamp(self):
+        self.assertEqual(heatmap.ramp(0), heatmap.RAMP[0])
+        self.assertEqual(heatmap.ramp(1), heatmap.RAMP[-1])
+        self.assertEqual(heatmap.ramp(7), heatmap.RAMP[-1])
+        self.assertEqual(heatmap.ramp(.5 / 6), (0, 0, 128))
+
+    def testTonemap(self):
+        costs = [0, 1, 2, 3, 4, 5, 6, 1000]
+        framebuffer, top = heatmap.tonemap((4, 2), costs, .75)
+        self.assertEqual(top, 6)
+        self.assertEqual(framebuffer.image().getpixel((0, 0)), (0, 0, 0))
+        self.assertEqual(framebuffer.image().getpixel((2, 1)),
+                         heatmap.RAMP[-1])
+        self.assertEqual(framebuffer.image().getpixel((3, 1)),
+                         heatmap.RAMP[-1])
+
+    def testMetric(self):
+        self.assertRaises(heatmap.HeatmapException, heatmap.Heatmap, 'rays')
+
+
+class HeatmapTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'task.json', res=(20, 15), accelerate=True)
+
+    def testShoot(self):
+        direct = self.camera.shoot(self.eye, self.up).tobytes()
+        for metric in heatmap.METRICS:
+            hm = heatmap.Heatmap(metric)
+            framebuffer, costs = hm.shoot(self.camera, self.eye, self.up)
+
+            self.assertEqual(framebuffer.tobytes(), direct)
+            self.assertEqual(costs.resolution, (20, 15))
+            self.assertGreater(hm.peak, 0)
+            self.assertFalse(instrument.enabled())
+
+    def testTests(self):
+        stats = instrument.enable()
+        try:
+            hm = heatmap.Heatmap('tests')
+            hm.shoot(self.camera, self.eye, self.up)
+            self.assertTrue(instrument.enabled())
+            self.assertEqual(
+                hm.total, sum(entry[0] for entry in stats.tests.values()))
+        finally:
+            instrument.disable()
+
+    def testRaytrace(self):
+        # the numpy engine falls back to the scalar one
+        with tempfile.TemporaryDirectory() as path:
+            fname = copy('task.json', path, res=(20, 15))[0]
+            frames = list(raytrace(fname, 'numpy', raw=True,
+                                   heatmap='tests'))
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0].tobytes(),
+                         self.camera.shoot(self.eye, self.up).tobytes())
+
+    def testBatched(self):
+        self.camera.shader = vc.Phong(self.camera.world, 1)
+        hm = heatmap.Heatmap()
+        self.assertRaises(RaytraceException, hm.shoot,
+                          self.camera, self.eye, self.up)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from gbuffer import GBuffer
+from incremental import Dependencies, Incremental, changes, snapshot
+from raytracer import *
+from fixtures import setup
+
+
+class DependencyTests(unittest.TestCase):
+
+    def testMasks(self):
+        deps = Dependencies((4, 2), 11)
+        deps.put(1, 0, (1 << 3) | (1 << 10))
+        touched = np.zeros((2, 11), bool)
+        touched[0, 10] = touched[1, 0] = True
+        deps.store(np.array([2, 3]), np.array([1, 1]), touched)
+
+        self.assertEqual(deps.affected([10]).nonzero()[0].tolist(), [1, 6])
+        self.assertEqual(deps.affected([3, 0]).nonzero()[0].tolist(), [1, 7])
+        self.assertFalse(deps.affected([4, 12]).any())
+
+    def testRecorded(self):
+        for engine in ENGINES:
+            camera, eye, up = setup('task.json', engine)
+            world = camera.world
+            count = len(world.bodies)
+            deps = Dependencies(camera.resolution, count)
+            gbuffer = GBuffer(camera.resolution)
+            plain = camera.shoot(eye, up).tobytes()
+            self.assertEqual(camera.shoot(
+                eye, up, gbuffer=gbuffer, dependencies=deps).tobytes(), plain)
+
+            # every pixel depends on the body it shows
+            for bodyid in range(count):
+                shown = gbuffer.ids == bodyid
+                self.assertTrue(deps.affected([bodyid])[shown].all())
+            self.assertFalse(deps.masks[~gbuffer.hits].any())
+
+    def testShadows(self):
+        camera, eye, up = setup('task.json', 'scalar')
+        camera.shader.depth = 0
+        world = camera.world
+        deps = Dependencies(camera.resolution, len(world.bodies))
+        gbuffer = GBuffer(camera.resolution)
+        camera.shoot(eye, up, gbuffer=gbuffer, dependencies=deps)
+
+        # without reflections bodies other than the one
+        # shown can only be shadow blockers
+        objs = dict((world.bodyid(b), b) for b in world.bodies)
+        shadowed = 0
+        for i in np.flatnonzero(gbuffer.hits).tolist():
+            shown = int(gbuffer.ids[i])
+            if not (deps.masks[i] & ~deps.mask([shown])).any():
+                continue
+            point = gm.Point(tuple(gbuffer.points[i].tolist()))
+            self.assertTrue(any(
+                world.occluded(point, light, objs[shown]) is not None
+                for light in world.lights))
+            shadowed += 1
+        self.assertTrue(shadowed)
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def _edit(self, engine, edit):
+        camera, eye, up = setup('task.json', engine)
+        incremental = Incremental(camera)
+        before = incremental.shoot(eye, up).tobytes()
+
+        edit(camera.world)
+        if engine == 'numpy':
+            camera.shader = vc.Phong(camera.world, camera.shader.depth)
+        after = incremental.shoot(eye, up).tobytes()
+        self.assertEqual(after, camera.shoot(eye, up).tobytes())
+        return incremental, before, after
+
+    def _body(self, world, index=1):
+        return sorted(world.bodies, key=world.bodyid)[index]
+
+    def testUnchanged(self):
+        camera, eye, up = setup('balls.json', 'scalar')
+        incremental = Incremental(camera)
+        first = incremental.shoot(eye, up).tobytes()
+        self.assertEqual(incremental.shoot(eye, up).tobytes(), first)
+        self.assertEqual(incremental.retraced, 0)
+        self.assertEqual(incremental.changed, set())
+
+    def testMaterial(self):
+        def edit(world):
+            body = self._body(world)
+            body.color = (10, 200, 30)
+            body.shininess = .3
+
+        for engine in ENGINES:
+            incremental, before, after = self._edit(engine, edit)
+            self.assertNotEqual(before, after)
+            self.assertEqual(len(incremental.changed), 1)
+            self.assertTrue(
+                0 < incremental.retraced < 48 * 32 / 2, incremental.report())
+
+    def testGeometry(self):
+        def edit(world):
+            body = self._body(world)
+            sphere = bd.Sphere((0, 0, -8), .5)
+            sphere.color = body.color.raw
+            sphere.shininess = body.shininess
+            sphere.smoothness = body.smoothness
+            world.addBodies(sphere)
+
+        incremental, before, after = self._edit('scalar', edit)
+        self.assertIsNone(incremental.changed)
+        self.assertEqual(incremental.retraced, 48 * 32)
+
+    def testLights(self):
+        camera, eye, up = setup('balls.json', 'scalar')
+        old = snapshot(camera)
+        camera.world.lights[0].color = (1, 2, 3)
+        self.assertIsNone(changes(old, snapshot(camera)))
+
+
+if __name__ == '__main__':
+    unittest.main()
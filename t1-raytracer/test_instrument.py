@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import bodies as bd
+import benchmark
+import instrument
+from raytracer import *
+from fixtures import setup
+
+
+class InstrumentTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'task.json', res=(20, 15), accelerate=True)
+
+    def tearDown(self):
+        instrument.disable()
+
+    def testRestored(self):
+        methods = (World.trace, Shader.colorize, gm.Sphere.intersection,
+                   bd.CheckerboardTexture.colorAt)
+        instrument.enable()
+        self.assertTrue(instrument.enabled())
+        self.assertIsNot(World.trace, methods[0])
+
+        instrument.disable()
+        self.assertFalse(instrument.enabled())
+        self.assertEqual((World.trace, Shader.colorize,
+                          gm.Sphere.intersection,
+                          bd.CheckerboardTexture.colorAt), methods)
+
+    def testCounters(self):
+        direct = self.camera.shoot(self.eye, self.up).tobytes()
+        stats = instrument.enable()
+        profiled = self.camera.shoot(self.eye, self.up).tobytes()
+        self.assertEqual(direct, profiled)
+
+        self.assertEqual(stats.depths[0], 20 * 15)
+        self.assertLessEqual(stats.maxdepth, self.camera.shader.depth)
+        self.assertEqual(stats.stages['Phong.sample'][0], 20 * 15)
+
+        tests, hits = stats.tests['Sphere']
+        self.assertGreater(tests, 0)
+        self.assertLessEqual(hits, tests)
+
+        rays = sum(entry[0] for entry in stats.shadows.values())
+        self.assertEqual(rays, stats.stages['World.occluded'][0])
+        self.assertIn('recursion depth reached', stats.summary())
+
+    def testKeywords(self):
+        shader = self.camera.shader
+        stats = instrument.enable()
+        shader.illuminate(None, None, None, weight=.5, d=shader.depth - 1)
+        self.assertEqual(stats.depths, {1: 1})
+
+    def testNested(self):
+        methods = (World.occluded, Shader.colorize)
+        instrument.enable()
+        instrumented = (World.occluded, Shader.colorize)
+        with benchmark.counting() as counter:
+            self.camera.shoot(self.eye, self.up)
+        self.assertGreater(counter.shadow, 0)
+        self.assertEqual((World.occluded, Shader.colorize), instrumented)
+
+        instrument.disable()
+        self.assertEqual((World.occluded, Shader.colorize), methods)
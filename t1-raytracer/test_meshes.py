@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import random
+import tempfile
+import unittest
+from array import array
+
+import geometry as gm
+import vectorized as vc
+
+from meshes import *
+from raytracer import *
+
+
+OBJ = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 't2-objv', 'data', 'test.obj')
+
+
+def objfile(content):
+    fd, fname = tempfile.mkstemp(suffix='.obj')
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    return fname
+
+
+class ReadTests(unittest.TestCase):
+
+    def testOctahedron(self):
+        vertices, normals, faces, fnormals = read(OBJ)
+        self.assertEqual(len(vertices), 18)
+        self.assertEqual(len(faces), 24)
+        self.assertEqual(list(faces[:3]), [1, 0, 2])
+        self.assertFalse(normals)
+        self.assertFalse(fnormals)
+
+    def testPolygons(self):
+        fname = objfile(
+            "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+            "vn 0 0 1\n"
+            "f 1//1 2//1 3//1 4//1\n"
+            "f -4//-1 -3//-1 -2//-1\n")
+        try:
+            vertices, normals, faces, fnormals = read(fname)
+        finally:
+            os.remove(fname)
+
+        self.assertEqual(list(faces), [0, 1, 2, 0, 2, 3, 0, 1, 2])
+        self.assertEqual(list(fnormals), [0] * 9)
+
+    def testMissingVertex(self):
+        fname = objfile("v 0 0 0\nv 1 0 0\nf 1 2 3\n")
+        try:
+            self.assertRaises(MeshException, read, fname)
+        finally:
+            os.remove(fname)
+
+
+class MeshTests(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(3)
+        coord = lambda: [rnd.uniform(-10, 10) for i in range(3)]
+
+        self.triangles = []
+        vertices, faces = array('d'), array('l')
+        for i in range(300):
+            c = coord()
+            for j in range(3):
+                vertices.extend(x + rnd.uniform(-2, 2) for x in c)
+            faces.extend((3 * i, 3 * i + 1, 3 * i + 2))
+            self.triangles.append(gm.Triangle(*(
+                gm.Point(tuple(vertices[3 * (3 * i + j):3 * (3 * i + j) + 3]))
+                for j in range(3))))
+
+        self.mesh = Mesh(vertices, faces)
+        self.rays = [gm.Ray(tuple(coord()), tuple(coord()))
+                     for i in range(300)]
+
+    def testBounds(self):
+        lo, hi = self.mesh.bounds()
+        for triangle in self.triangles:
+            tlo, thi = triangle.bounds()
+            for c in range(3):
+                self.assertLessEqual(lo[c], tlo[c])
+                self.assertGreaterEqual(hi[c], thi[c])
+
+    def testIntersection(self):
+        hits = 0
+        for ray in self.rays:
+            expected, nearest = None, float('inf')
+            for triangle in self.triangles:
+                t = triangle.intersection(ray)
+                if t and 1e-5 <= t < nearest:
+                    expected, nearest = triangle, t
+
+            t = self.mesh.intersection(ray)
+            if expected is None:
+                self.assertIsNone(t)
+                continue
+
+            hits += 1
+            self.assertAlmostEqual(t, nearest)
+            normal = self.mesh.normal(ray.shoot(t))
+            self.assertAlmostEqual(
+                abs(normal * expected.normal(None)), 1.)
+
+        self.assertGreater(hits, 10)
+
+    def testInterleaved(self):
+        # intersection tests between tracing a point and
+        # shading it (shadow rays, other threads) must not
+        # change its normal
+        hits = []
+        for ray in self.rays:
+            t = self.mesh.intersection(ray)
+            if t is not None:
+                hits.append((ray.shoot(t), self.mesh.normal(ray.shoot(t))))
+        self.assertGreater(len(hits), 10)
+
+        for ray in reversed(self.rays):
+            self.mesh.intersection(ray)
+        for point, normal in hits:
+            self.assertEqual(self.mesh.normal(point).raw, normal.raw)
+
+    def testRestore(self):
+        state = self.mesh.export()
+        restored = Mesh.restore(state)
+        for name, code in Mesh.ARRAYS:
+            # views over the exported arrays, not copies
+            self.assertIsInstance(getattr(restored, name), memoryview)
+        state['_packed'][0] += 1
+        self.assertEqual(restored._packed[0], state['_packed'][0])
+        state['_packed'][0] -= 1
+
+        copied = pickle.loads(pickle.dumps(restored))
+        for ray in self.rays:
+            self.assertEqual(restored.intersection(ray),
+                             self.mesh.intersection(ray))
+            self.assertEqual(copied.intersection(ray),
+                             self.mesh.intersection(ray))
+
+    def testInterpolatedNormals(self):
+        vertices = array('d', [0, 0, 0, 1, 0, 0, 0, 1, 0])
+        normals = array('d', [0, 0, 1, 1, 0, 0, 0, 1, 0])
+        mesh = Mesh(vertices, array('l', [0, 1, 2]),
+                    normals, array('l', [0, 1, 2]))
+
+        ray = gm.Ray((.25, .25, 1), (0, 0, -1))
+        self.assertAlmostEqual(mesh.intersection(ray), 1.)
+        normal = mesh.normal(ray.shoot(1.))
+        for c, e in zip(normal.raw, (.25, .25, .5)):
+            self.assertAlmostEqual(c, e / (.375 ** .5))
+
+
+class WorldTests(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World((0, 0, 0))
+        self.world.lightness = 0.5
+        self.world.background = (0, 0, 0)
+        self.world.maxdist = 100
+
+        self.mesh = bd.Mesh(OBJ, (0, 0, -5), 2.)
+        self.mesh.color = (255, 0, 0)
+        self.mesh.shininess = 0.5
+        self.mesh.smoothness = 5
+        self.world.addBodies(self.mesh)
+
+    def testTrace(self):
+        ray = gm.Ray((0, 0, 0), (0, 0, -1))
+        obj, point = self.world.trace(ray)
+        self.assertIs(obj, self.mesh)
+        self.assertAlmostEqual(point.raw[2], -3)
+
+        self.world.accelerate()
+        obj, point = self.world.trace(ray)
+        self.assertIs(obj, self.mesh)
+        self.assertAlmostEqual(point.raw[2], -3)
+
+    def testSelfShadowing(self):
+        # the far side of the octahedron lies in its own shadow
+        self.world.addLight(bd.Light((0, 0, 0)))
+        point = gm.Point((0, 0, -7))
+        self.assertIs(self.world.occluded(point, self.world.lights[0],
+                                          self.mesh), self.mesh)
+
+    def testVectorized(self):
+        self.assertRaises(vc.VectorizedException, vc.Phong, self.world, 1)
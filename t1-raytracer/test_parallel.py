@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import parallel
+from raytracer import *
+from fixtures import setup
+
+
+class TileTests(unittest.TestCase):
+
+    def testCoverage(self):
+        res = (70, 45)
+        covered = set()
+        for x0, y0, x1, y1 in parallel.tiles(res, 16):
+            pixels = set((x, y) for x in range(x0, x1) for y in range(y0, y1))
+            self.assertFalse(covered & pixels)
+            covered |= pixels
+        self.assertEqual(len(covered), res[0] * res[1])
+
+    def testOrder(self):
+        order = parallel.tiles((4, 4), 1)
+        self.assertEqual(order[:4], [
+            (0, 0, 1, 1), (1, 0, 2, 1), (0, 1, 1, 2), (1, 1, 2, 2)])
+
+
+class RenderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'task.json', res=(40, 30), accelerate=True)
+
+    def testIdentical(self):
+        serial = self.camera.shoot(self.eye, self.up)
+
+        renderer = parallel.TileRenderer(self.camera, 2, 16)
+        try:
+            tiled = renderer.shoot(self.eye, self.up)
+        finally:
+            renderer.close()
+
+        self.assertEqual(serial.tobytes(), tiled.tobytes())
+
+    def testPictures(self):
+        positions = [
+            (self.eye, self.up),
+            ((self.eye[0] + 1, self.eye[1], self.eye[2]), self.up),
+            ((self.eye[0], self.eye[1] + 2, self.eye[2]), self.up)]
+        serial = [self.camera.shoot(eye, up).tobytes() for eye, up in positions]
+
+        renderer = parallel.PictureRenderer(self.camera, 2)
+        try:
+            pictures = list(renderer.shootAll(positions))
+        finally:
+            renderer.close()
+
+        self.assertEqual(sorted(i for i, fb in pictures), [0, 1, 2])
+        for index, framebuffer in pictures:
+            self.assertEqual(framebuffer.tobytes(), serial[index])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import progressive
+from raytracer import *
+from fixtures import setup
+
+
+class CountingCamera(object):
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.resolution = camera.resolution
+        self.traced = []
+
+    def shootPixels(self, eye, up, pixels):
+        self.traced.extend(pixels)
+        return self.camera.shootPixels(eye, up, pixels)
+
+
+class RefinementTests(unittest.TestCase):
+
+    def setUp(self):
+        self.camera, self.eye, self.up = setup(
+            'balls.json', res=(37, 29))
+
+    def testFinal(self):
+        direct = self.camera.shoot(self.eye, self.up)
+        frames = list(progressive.refine(self.camera, self.eye, self.up))
+        self.assertGreaterEqual(len(frames), 4)
+        self.assertEqual(frames[-1].tobytes(), direct.tobytes())
+
+    def testTracedOnce(self):
+        counter = CountingCamera(self.camera)
+        for frame in progressive.refine(counter, self.eye, self.up):
+            pass
+
+        self.assertEqual(len(counter.traced), 37 * 29)
+        self.assertEqual(len(set(counter.traced)), 37 * 29)
+
+    def testCoarse(self):
+        frame = next(progressive.refine(self.camera, self.eye, self.up, 8))
+        img = frame.image()
+        block = set(img.getpixel((x, y)) for x in range(8) for y in range(8))
+        self.assertEqual(len(block), 1)
+
+    def testLimit(self):
+        counter = CountingCamera(self.camera)
+        stopped = progressive.Refinement(counter, self.eye, self.up)
+        frames = list(stopped.passes(lambda n: 0))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(len(counter.traced), 5 * 4)
+
+    def testLimitChunks(self):
+        direct = self.camera.shoot(self.eye, self.up)
+        counter = CountingCamera(self.camera)
+        refinement = progressive.Refinement(counter, self.eye, self.up)
+        frames = list(refinement.passes(lambda n: 50))
+
+        self.assertEqual(len(set(counter.traced)), 37 * 29)
+        self.assertEqual(frames[-1].tobytes(), direct.tobytes())
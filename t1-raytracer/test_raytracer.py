@@ -44,3 +44,37 @@ class WorldTests(unittest.TestCase):
         o, p = self.world.trace(self.disray, maxdist=5)
         self.assertIsNone(o)
         self.assertIsNone(p)
+
+    def testOccluded(self):
+        light = bd.Light((8, 0, 0))
+        origin = gm.Point((0, 0, 0))
+        self.assertIn(self.world.occluded(origin, light), self.raw_bodies[1:])
+
+        # bodies behind the light don't cast shadows
+        light = bd.Light((0, 5, 0))
+        self.assertIsNone(self.world.occluded(origin, light))
+
+        point = gm.Point((1, 0, 0))
+        light = bd.Light((3, 0, 0))
+        blocker = self.world.occluded(point, light, self.raw_bodies[2])
+        self.assertIsNone(blocker)
+
+    def testOccluderCache(self):
+        light = bd.Light((8, 0, 0))
+        origin = gm.Point((0, 0, 0))
+        first = self.world.occluded(origin, light)
+        self.assertIs(self.world._occluders[light], first)
+
+        # the cached blocker must not be the excluded body
+        second = self.world.occluded(origin, light, first)
+        self.assertIn(second, self.raw_bodies[1:])
+        self.assertIsNot(second, first)
+
+    def testAcceleratedOccluded(self):
+        self.world.accelerate()
+        light = bd.Light((8, 0, 0))
+        origin = gm.Point((0, 0, 0))
+        self.assertIsNotNone(self.world.occluded(origin, light))
+
+        light = bd.Light((0, 5, 0))
+        self.assertIsNone(self.world.occluded(origin, light))
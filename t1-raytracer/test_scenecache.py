@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import scenecache
+from raytracer import *
+from fixtures import copy
+
+
+OBJ = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 't2-objv', 'data', 'test.obj')
+
+
+class SceneCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def scene(self, world, resolution=(32, 24)):
+        return copy(world, self.tmp, res=resolution)[0]
+
+    def render(self, fname, cache=False, engine='scalar'):
+        camera, positions, aa, accelerator = prepare(fname, engine, cache)
+        return camera.shoot(*positions[0]).tobytes(), accelerator
+
+    def testCompile(self):
+        fname = self.scene('balls.json')
+        cache = scenecache.compile(fname)
+        self.assertEqual(cache, os.path.join(self.tmp, 'balls.scene'))
+
+        loaded = scenecache.load(fname)
+        self.assertIsInstance(loaded.arrays['params'], np.memmap)
+        self.assertNotIn('bodies', loaded.config)
+        for name, (dtype, shape, offset) in loaded.header['arrays'].items():
+            self.assertEqual(offset % scenecache.ALIGN, 0)
+
+    def testParity(self):
+        for world in ('task.json', 'balls.json'):
+            fname = self.scene(world)
+            direct, built = self.render(fname)
+
+            # the first run compiles, the second one loads
+            self.assertEqual(self.render(fname, True)[0], direct)
+            self.assertTrue(os.path.exists(scenecache.cachename(fname)))
+            cached, restored = self.render(fname, True)
+
+            self.assertEqual(cached, direct)
+            self.assertEqual(str(restored), str(built))
+            self.assertEqual(self.render(fname, True, 'numpy')[0], direct)
+
+    def testMesh(self):
+        shutil.copy(OBJ, self.tmp)
+        fname = self.scene('task.json')
+        with open(fname) as f:
+            raw = json.load(f)
+        raw['bodies'].append({
+            'type': 'mesh', 'file': 'test.obj', 'position': [0, 0, -10],
+            'color': 'ff0000', 'shininess': 0.2, 'smoothness': 5})
+        with open(fname, 'w') as f:
+            json.dump(raw, f)
+
+        direct = self.render(fname)[0]
+        scenecache.compile(fname)
+        self.assertEqual(self.render(fname, True)[0], direct)
+
+        # a changed obj file outdates the cache
+        with open(os.path.join(self.tmp, 'test.obj'), 'a') as f:
+            f.write('\n')
+        self.assertIsNone(scenecache.load(fname))
+
+    def testStale(self):
+        fname = self.scene('balls.json')
+        self.assertIsNone(scenecache.load(fname))
+        scenecache.compile(fname)
+        self.assertIsNotNone(scenecache.load(fname))
+
+        self.scene('balls.json', (40, 30))
+        self.assertIsNone(scenecache.load(fname))
+        self.assertFalse(Importer(fname, cache=True).cached)
+
+        with open(scenecache.cachename(fname), 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(scenecache.load(fname))
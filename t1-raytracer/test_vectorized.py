@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+import geometry as gm
+import vectorized as vc
+from raytracer import *
+from fixtures import setup
+
+
+def render(fname, engine, res=(48, 32)):
+    camera, eye, up = setup(fname, engine, res)
+    return camera.shoot(eye, up).tobytes()
+
+
+class HelperTests(unittest.TestCase):
+
+    def testDot(self):
+        a = np.array([[1., 2., 4.], [3., -2., 5.]])
+        v = [gm.Vector(tuple(r)) for r in a]
+        self.assertEqual(list(vc.dot(a, a)), [x * x for x in v])
+
+    def testCross(self):
+        a = np.array([[1., 0., 0.]])
+        b = np.array([[0., 1., 0.]])
+        self.assertEqual(tuple(vc.cross(a, b)[0]), (0., 0., 1.))
+
+    def testMirror(self):
+        a = np.array([[-6., 4., 0.]])
+        n = np.array([[-1., 0., 0.]])
+        self.assertEqual(tuple(vc.mirror(a, n)[0]), (-6., -4., 0.))
+
+
+class ParityTests(unittest.TestCase):
+
+    def _compare(self, fname):
+        scalar = render(fname, 'scalar')
+        batched = render(fname, 'numpy')
+        self.assertEqual(scalar, batched)
+
+    def testBalls(self):
+        self._compare('balls.json')
+
+    def testTask(self):
+        self._compare('task.json')
+
+    def testTrace(self):
+        world = World((1, 0, 0))
+        world.lightness = 0.5
+        world.background = (0, 0, 0)
+        world.maxdist = 100
+        spheres = (
+            bd.Sphere((0, 10, 0), 1),
+            bd.Sphere((5, 0, 0), 1),
+            bd.Sphere((2, 0, 0), 1))
+        for sphere in spheres:
+            sphere.color = (255, 0, 0)
+            sphere.shininess = 0.5
+            sphere.smoothness = 5
+        world.addBodies(*spheres)
+
+        shader = vc.Phong(world, 0)
+        origins = np.zeros((3, 3))
+        directions = np.array([[1., 0., 0.], [0., 1., 0.], [-1., 0., 0.]])
+        idx, t = shader.trace(origins, directions)
+
+        bodies = list(world.bodies)
+        self.assertIs(bodies[idx[0]], spheres[2])
+        self.assertIs(bodies[idx[1]], spheres[0])
+        self.assertEqual(idx[2], -1)
+        self.assertEqual(tuple(t[:2]), (1., 9.))
+
+
+class WavefrontTests(unittest.TestCase):
+
+    def setUp(self):
+        rnd = np.random.RandomState(5)
+        world = World((0, 0, -20))
+        world.lightness = 0.3
+        world.background = (0, 0, 0)
+        world.maxdist = 100
+
+        bodies = [bd.Sphere(tuple(rnd.uniform(-8, 8, 3) + (0, 0, -20)),
+                            rnd.uniform(.3, 1.5)) for i in range(30)]
+        for i in range(20):
+            c = rnd.uniform(-8, 8, 3) + (0, 0, -20)
+            bodies.append(bd.Triangle(
+                *[tuple(c + rnd.uniform(-2, 2, 3)) for j in range(3)]))
+        bodies.append(bd.Plane((0, -9, 0), (0, 1, 0)))
+        for body in bodies:
+            body.color = tuple(int(c) for c in rnd.randint(0, 255, 3))
+            body.shininess = 0.4
+            body.smoothness = 5
+        world.addBodies(*bodies)
+
+        light = bd.Light((10, 20, 0))
+        light.color = (255, 255, 255)
+        light.lightness = 1
+        world.addLight(light)
+
+        self.world = world
+        self.camera = Camera(world, (40, 30), 45)
+        self.origins = rnd.uniform(-10, 10, (1000, 3))
+        self.directions = vc.normalize(rnd.uniform(-1, 1, (1000, 3)))
+
+    def testCoherent(self):
+        order = vc.coherent(self.origins, self.directions)
+        self.assertEqual(sorted(order), list(range(1000)))
+
+        signs = np.sign(self.directions[order])
+        changes = (np.diff(signs, axis=0) != 0).any(axis=1).sum()
+        self.assertLessEqual(changes, 7)
+
+    def testCull(self):
+        shader = vc.Phong(self.world, 2)
+        self.assertTrue(shader._wavefront)
+
+        order = vc.coherent(self.origins, self.directions)
+        for i in range(0, 1000, 100):
+            rows = order[i:i + 100]
+            o, d = self.origins[rows], self.directions[rows]
+            reach = shader._cull(o, d, 100.)
+            hits = shader._distances(o, d, 100., None)
+            # every body hit by any ray of the packet is kept
+            self.assertFalse((np.isfinite(hits).any(axis=0) & ~reach).any())
+
+    def testParity(self):
+        eye, up = (0, 0, 5), (0, 1, 0)
+        self.camera.shader = vc.Phong(self.world, 2)
+        packets = self.camera.shoot(eye, up).tobytes()
+
+        self.camera.shader._wavefront = False
+        flat = self.camera.shoot(eye, up).tobytes()
+        self.assertEqual(packets, flat)
+
+        self.camera.shader = Shader(self.world, 2)
+        self.assertEqual(self.camera.shoot(eye, up).tobytes(), packets)
+
+
+class TerminationTests(unittest.TestCase):
+
+    def setUp(self):
+        world = World((0, 0, -10))
+        world.lightness = 0.3
+        world.background = (0, 0, 0)
+        world.maxdist = 100
+
+        # two mirrors facing each other
+        back = bd.Plane((0, 0, -20), (0, 0, 1))
+        front = bd.Plane((0, 0, 10), (0, 0, -1))
+        ball = bd.Sphere((0, 0, -10), 3)
+        for body, shininess in ((back, .5), (front, .5), (ball, .3)):
+            body.color = (200, 100, 50)
+            body.shininess = shininess
+            body.smoothness = 5
+        world.addBodies(back, front, ball)
+
+        light = bd.Light((5, 5, 0))
+        light.color = (255, 255, 255)
+        light.lightness = 1
+        world.addLight(light)
+
+        self.world = world
+        self.camera = Camera(world, (24, 16), 45)
+
+    def shoot(self, engine, *args):
+        self.camera.shader = ENGINES[engine](self.world, 10, *args)
+        return self.camera.shoot((0, 0, 0), (0, 1, 0)).tobytes()
+
+    def testDisabled(self):
+        for engine in ENGINES:
+            self.shoot(engine, 0)
+            self.assertEqual(self.camera.shader.skipped, 0)
+            self.assertGreater(self.camera.shader.reflections, 0)
+
+    def testThreshold(self):
+        full = self.shoot('scalar', 0)
+        reflections = self.camera.shader.reflections
+
+        cut = self.shoot('scalar')
+        skipped = self.camera.shader.skipped
+        self.assertGreater(skipped, 0)
+        self.assertLess(self.camera.shader.reflections, reflections)
+        # nothing visible got lost
+        diff = np.abs(np.frombuffer(full, np.uint8).astype(int) -
+                      np.frombuffer(cut, np.uint8))
+        self.assertLessEqual(diff.max(), 1)
+
+        self.assertEqual(self.shoot('numpy'), cut)
+        self.assertEqual(self.camera.shader.skipped, skipped)
+        self.assertIn('skipped %d of' % skipped, self.camera.shader.report())
+
+    def testRoulette(self):
+        for engine in ENGINES:
+            first = self.shoot(engine, .05, True, 3)
+            skipped = self.camera.shader.skipped
+            self.assertGreater(skipped, 0)
+            self.assertEqual(self.shoot(engine, .05, True, 3), first)
+            self.assertEqual(self.camera.shader.skipped, skipped)
+
+            # survivors trace on, so fewer reflections get skipped
+            self.shoot(engine, .05)
+            self.assertLess(skipped, self.camera.shader.skipped)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import watch as wt
+from raytracer import *
+from fixtures import WORLDS
+
+
+OBJ = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 't2-objv', 'data', 'test.obj')
+
+
+def spheres(count):
+    """
+    Returns a scene with a row of small spheres on a floor.
+    """
+    with open(os.path.join(WORLDS, 'task.json')) as f:
+        config = json.load(f)
+    config['camera']['resolution'] = [32, 24]
+    floor = config['bodies'][3]
+    config['bodies'] = [
+        {'type': 'sphere', 'color': '0000ff', 'shininess': .5,
+         'smoothness': 5, 'position': [1.5 * i - .75 * count, 1, -8],
+         'radius': .6}
+        for i in range(count)] + [floor]
+    return config
+
+
+class SceneTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.fname = os.path.join(self.path, 'scene.json')
+        self.config = spheres(12)
+        self.scene = self._load(self.config)
+        self.world = self.scene.world
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, config):
+        with open(self.fname, 'w') as f:
+            json.dump(config, f)
+        return Importer(self.fname)
+
+    def _load(self, config):
+        imp = self._write(config)
+        imp.bodies()
+        imp.lights()
+        imp.world.accelerate()
+        return wt.Scene(self.fname, imp.json, imp.world)
+
+    def _bodies(self):
+        return sorted(self.world.bodies, key=self.world.bodyid)
+
+    def testUnchanged(self):
+        before = self._bodies()
+        changes = self.scene.update(self._write(self.config))
+        self.assertEqual(str(changes), 'nothing changed')
+        self.assertEqual(self._bodies(), before)
+
+    def testMaterial(self):
+        before = self._bodies()
+        self.config['bodies'][3]['color'] = '00ff00'
+        self.config['bodies'][4]['shininess'] = .1
+        changes = self.scene.update(self._write(self.config))
+
+        self.assertEqual(changes.materials, 2)
+        self.assertFalse(changes.added or changes.removed)
+        self.assertEqual(self._bodies(), before)
+        self.assertEqual(before[3].color.raw, (0, 255, 0))
+        self.assertEqual(before[4].shininess, .1)
+
+    def testGeometry(self):
+        accelerator = self.world.accel
+        before = self._bodies()
+        self.config['bodies'][5]['radius'] = .3
+        del self.config['bodies'][0]
+        changes = self.scene.update(self._write(self.config))
+
+        self.assertEqual(len(changes.added), 1)
+        self.assertEqual(set(changes.removed), set((before[0], before[5])))
+        self.assertTrue(changes.inplace)
+        self.assertIs(self.world.accel, accelerator)
+        self.assertEqual(len(self.world.bodies), 12)
+        self.assertEqual(changes.added[0].geometry.radius, .3)
+
+        # unchanged bodies keep their ids
+        self.assertEqual(self.world.bodyid(before[1]), 1)
+
+    def testLights(self):
+        self.config['lights'][0]['color'] = 'ff0000'
+        changes = self.scene.update(self._write(self.config))
+        self.assertTrue(changes.lights)
+        self.assertEqual(len(self.world.lights), len(self.config['lights']))
+        self.assertEqual(self.world.lights[0].color.raw, (255, 0, 0))
+
+    def testBroken(self):
+        before = self._bodies()
+        color = before[3].color.raw
+        lights = list(self.world.lights)
+        self.config['bodies'][3]['color'] = '00ff00'
+        self.config['bodies'].append(dict(self.config['bodies'][0]))
+        self.config['bodies'][-1]['position'] = [0, 3, -8]
+        self.config['lights'][0]['color'] = 'ff0000'
+        self.config['bodies'][12]['texture']['type'] = 'marble'
+        imp = self._write(self.config)
+
+        # nothing of the new configuration gets applied
+        self.assertRaises(KeyError, self.scene.update, imp)
+        self.assertEqual(self._bodies(), before)
+        self.assertEqual(before[3].color.raw, color)
+        self.assertEqual(self.world.lights, lights)
+
+    def testBrokenWorld(self):
+        before = self._bodies()
+        lightness = self.config['world']['lightness']
+        self.config['bodies'].append(dict(self.config['bodies'][0]))
+        self.config['bodies'][-1]['position'] = [0, 3, -8]
+        self.config['world']['lightness'] = 1
+        self.assertRaises(RaytraceException, self.scene.update,
+                          self._write(self.config))
+        self.assertEqual(self._bodies(), before)
+
+        # the fixed file adds the body once
+        self.config['world']['lightness'] = lightness
+        changes = self.scene.update(self._write(self.config))
+        self.assertEqual(len(changes.added), 1)
+        self.assertEqual(len(self.world.bodies), len(before) + 1)
+
+    def testSettings(self):
+        self.config['world']['background'] = '102030'
+        self.config['world']['accelerator'] = 'grid'
+        self.config['camera']['angleofview'] = 60
+        changes = self.scene.update(self._write(self.config))
+        self.assertEqual(changes.settings, ['camera', 'world'])
+        self.assertEqual(self.world.background.raw, (16, 32, 48))
+        self.assertIsInstance(self.world.accel, accel.Grid)
+
+
+class WatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.fname = os.path.join(self.path, 'scene.json')
+        self.config = spheres(8)
+        self._write()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self):
+        with open(self.fname, 'w') as f:
+            json.dump(self.config, f)
+        # the modification time may not change within a tick
+        stamp = os.path.getmtime(self.fname) + getattr(self, 'ticks', 0)
+        os.utime(self.fname, (stamp, stamp))
+        self.ticks = getattr(self, 'ticks', 0) + 1
+
+    def _fresh(self, engine):
+        return next(raytrace(self.fname, engine, raw=True)).tobytes()
+
+    def testReload(self):
+        for engine in ENGINES:
+            self.config = spheres(8)
+            self._write()
+            pictures = watch(self.fname, engine, raw=True, poll=0)
+            try:
+                index, first = next(pictures)
+                self.assertEqual(index, 0)
+                self.assertEqual(first.tobytes(), self._fresh(engine))
+
+                self.config['bodies'][2]['color'] = 'ff0000'
+                self._write()
+                _, picture = next(pictures)
+                self.assertEqual(picture.tobytes(), self._fresh(engine))
+                self.assertNotEqual(picture.tobytes(), first.tobytes())
+
+                self.config['bodies'][2]['position'][1] = 2
+                self.config['lights'][0]['color'] = '00ff00'
+                self._write()
+                _, picture = next(pictures)
+                self.assertEqual(picture.tobytes(), self._fresh(engine))
+            finally:
+                pictures.close()
+
+    def testBroken(self):
+        pictures = watch(self.fname, raw=True, poll=.01)
+        try:
+            next(pictures)
+            with open(self.fname, 'w') as f:
+                f.write('{"bodies": [')
+
+            # the broken file is skipped until it gets fixed
+            self.config['bodies'][0]['color'] = '00ff00'
+            fix = threading.Timer(.2, self._write)
+            fix.start()
+            _, picture = next(pictures)
+            fix.join()
+            self.assertEqual(picture.tobytes(), self._fresh('scalar'))
+        finally:
+            pictures.close()
+
+    def testUnrenderable(self):
+        shutil.copy(OBJ, self.path)
+        pictures = watch(self.fname, 'numpy', raw=True, poll=.01)
+        try:
+            next(pictures)
+            # the numpy engine can not shade meshes, a broken
+            # camera can not be built; both are skipped
+            self.config['bodies'].append({
+                'type': 'mesh', 'file': 'test.obj', 'position': [0, 1, -8],
+                'color': 'ff0000', 'shininess': 0.2, 'smoothness': 5})
+            self._write()
+            del self.config['camera']['angleofview']
+            broken = threading.Timer(.1, self._write)
+            broken.start()
+
+            self.config = spheres(8)
+            self.config['bodies'][0]['color'] = '00ff00'
+            fix = threading.Timer(.3, self._write)
+            fix.start()
+            _, picture = next(pictures)
+            broken.join()
+            fix.join()
+            self.assertEqual(picture.tobytes(), self._fresh('numpy'))
+        finally:
+            pictures.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,824 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import math
+import numpy as np
+
+import geometry as gm
+from shader import THRESHOLD
+from framebuffer import Framebuffer
+
+
+"""
+
+Vectorized rendering engine.
+
+Instead of tracing one geometry.Ray at a time, all primary
+rays of a picture are generated as (N, 3) arrays of origins
+and directions and get intersected with every body of the
+world at once. Every recursion step of the phong shader is
+handled as one batch of rays. The arithmetic mirrors the
+scalar implementation (geometry.py, shader.py) operation by
+operation so that both engines produce the same image.
+
+Scenes with many bodies are rendered as wavefronts: the
+queue of rays of every step (primary, shadow and reflection
+rays) gets sorted by direction octant and origin and split
+into packets of coherent rays. Every packet is only tested
+against the bodies its rays can reach at all (@see Phong._cull).
+
+"""
+
+
+EPSILON = 1e-5
+
+# upper bound for the number of ray/body pairs
+# that get intersected in one go (memory usage)
+BATCHSIZE = 1 << 22
+
+# rays per packet of the wavefront queues
+PACKETSIZE = 256
+
+# packets pay off for this many bounded bodies
+PACKETMIN = 32
+
+# boxes get enlarged by this amount to compensate
+# rounding errors of the intersection kernels
+PADDING = 1e-7
+
+EMSG = {
+    'body': 'The numpy engine does not support %s bodies.'
+}
+
+
+class VectorizedException(Exception):
+
+    def __str__(self):
+        return self.msg
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+#
+#   ARRAY HELPERS
+#
+
+
+def dot(a, b):
+    """
+    Row wise dot product of two (N, 3) arrays.
+    Summation order equals geometry.Vector.__mul__.
+    """
+    return a[..., 0] * b[..., 0] + a[..., 1] * b[..., 1] + a[..., 2] * b[..., 2]
+
+
+def cross(a, b):
+    """
+    Row wise cross product of two (N, 3) arrays.
+    """
+    c = np.empty(np.broadcast(a, b).shape)
+    c[..., 0] = a[..., 1] * b[..., 2] - b[..., 1] * a[..., 2]
+    c[..., 1] = a[..., 2] * b[..., 0] - b[..., 2] * a[..., 0]
+    c[..., 2] = a[..., 0] * b[..., 1] - b[..., 0] * a[..., 1]
+    return c
+
+
+def normalize(a):
+    """
+    Row wise normalization of a (N, 3) array.
+    """
+    length = np.sqrt(dot(a, a))
+    return a / length[..., None]
+
+
+def mirror(a, axis):
+    """
+    Row wise geometry.Vector.mirror.
+    """
+    f = 2 * dot(a, axis)
+    return -(a - axis * f[..., None])
+
+
+def _spread(v):
+    """
+    Spreads the lower 10 bits of every integer so that
+    two zero bits follow each bit (for morton codes).
+    """
+    v = v & 0x3ff
+    v = (v | (v << 16)) & 0x30000ff
+    v = (v | (v << 8)) & 0x300f00f
+    v = (v | (v << 4)) & 0x30c30c3
+    v = (v | (v << 2)) & 0x9249249
+    return v
+
+
+def coherent(origins, directions):
+    """
+    Returns the permutation that sorts the rays by the
+    octant of their direction and the morton code (Z-order)
+    of their origin, so that consecutive rays start close
+    to each other and travel into the same octant.
+    """
+    octant = ((directions[:, 0] < 0) * 1 + (directions[:, 1] < 0) * 2 +
+              (directions[:, 2] < 0) * 4)
+
+    lo = origins.min(axis=0)
+    extent = origins.max(axis=0) - lo
+    extent[extent == 0] = 1
+    cells = ((origins - lo) / extent * 1023).astype(np.int64)
+    morton = (_spread(cells[:, 0]) | (_spread(cells[:, 1]) << 1) |
+              (_spread(cells[:, 2]) << 2))
+
+    return np.argsort((octant.astype(np.int64) << 30) | morton, kind='stable')
+
+
+#
+#   SHADER
+#
+
+
+class Phong(object):
+    """
+    Batched phong shader. Works on the same World
+    instances as shader.Phong but packs all bodies
+    and lights into flat arrays on construction.
+    Reflections get terminated by their path weight
+    the same way (@see shader.Phong).
+    """
+
+    batched = True
+
+    def __str__(self):
+        return "Vectorized Phong Shader with recursion depth %d" % self.depth
+
+    def __init__(self, world, depth, threshold=THRESHOLD,
+                 roulette=False, seed=0):
+        self._world = world
+        self._depth = depth
+        self.threshold = threshold
+        self.roulette = roulette
+        self._random = np.random.RandomState(seed)
+
+        # reflections considered and skipped
+        self.reflections = 0
+        self.skipped = 0
+
+        # (N, B) matrix of the bodies (world ids) touched by
+        # the ray trees of the primary rays while tracking
+        # dependencies (@see self.sample), None otherwise
+        self.touched = None
+        self._rows = None
+        self._pack()
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @depth.setter
+    def depth(self, depth):
+        self._depth = depth
+
+    def _pack(self):
+        """
+        Translates the worlds bodies and lights to arrays.
+        The body order equals the iteration order of the
+        worlds body collection which is also used by the
+        scalar World.trace.
+        """
+        world = self.world
+        self._bodies = list(world.bodies)
+
+        spheres, planes, triangles = [], [], []
+        for i, body in enumerate(self._bodies):
+            geometry = body.geometry
+            if type(geometry) is gm.Sphere:
+                spheres.append(i)
+            elif type(geometry) is gm.Plane:
+                planes.append(i)
+            elif type(geometry) is gm.Triangle:
+                triangles.append(i)
+            else:
+                msg = EMSG['body'] % type(geometry).__name__
+                raise VectorizedException(msg)
+
+        geoms = [body.geometry for body in self._bodies]
+        raw = lambda idx, fn: np.array([fn(geoms[i]) for i in idx], float)
+
+        self._sidx = np.array(spheres, int)
+        self._scenter = raw(spheres, lambda g: g.center.raw).reshape(-1, 3)
+        self._sradius = raw(spheres, lambda g: g.radius)
+
+        self._pidx = np.array(planes, int)
+        self._ppoint = raw(planes, lambda g: g.point.raw).reshape(-1, 3)
+        self._pnorm = raw(planes, lambda g: g.norm.raw).reshape(-1, 3)
+
+        # the precomputed a, u and v of every triangle
+        self._tidx = np.array(triangles, int)
+        packed = raw(triangles, lambda g: g.packed).reshape(-1, 3, 3)
+        self._ta = np.ascontiguousarray(packed[:, 0])
+        self._tu = np.ascontiguousarray(packed[:, 1])
+        self._tv = np.ascontiguousarray(packed[:, 2])
+
+        # per body lookup tables
+        count = len(self._bodies)
+        self._ids = np.array(
+            [world.bodyid(body) for body in self._bodies] + [-1], int)
+        self._kind = np.zeros(count, int)
+        self._kind[self._pidx] = 1
+        self._kind[self._tidx] = 2
+
+        self._center = np.zeros((count, 3))
+        self._center[self._sidx] = self._scenter
+
+        # constant normals of planes and triangles,
+        # computed by the scalar geometry itself
+        self._normal = np.zeros((count, 3))
+        for i in np.concatenate((self._pidx, self._tidx)):
+            self._normal[i] = geoms[i].normal(None).raw
+
+        self._shininess = np.zeros(count)
+        self._smoothness = np.zeros(count)
+        self._specfactor = np.zeros(count)
+        self._color = np.zeros((count, 3))
+        self._checker = np.zeros(count, bool)
+        self._checkscale = np.zeros(count)
+        self._color2 = np.zeros((count, 3))
+
+        for i, body in enumerate(self._bodies):
+            self._shininess[i] = body.shininess
+            self._smoothness[i] = body.smoothness
+            self._specfactor[i] = (body.smoothness + 2) / (2 * math.pi)
+
+            if body.texture:
+                texture = body.texture
+                self._checker[i] = True
+                self._checkscale[i] = 1.0 / texture.checksize
+                self._color[i] = texture.color1.raw
+                self._color2[i] = texture.color2.raw
+            else:
+                self._color[i] = body.color.raw
+
+        self._lights = [
+            (np.array(light.geometry.raw), np.array(light.color.raw))
+            for light in world.lights]
+
+        self._kernels = [
+            (idx, kernel) for idx, kernel in (
+                (self._sidx, self._spheres),
+                (self._pidx, self._planes),
+                (self._tidx, self._triangles)) if len(idx)]
+
+        # padded bounds of every body, unbounded ones (planes)
+        # reach everywhere and never get culled
+        self._blo = np.full((count, 3), -np.inf)
+        self._bhi = np.full((count, 3), np.inf)
+        bounded = 0
+        for i, geometry in enumerate(geoms):
+            bounds = geometry.bounds()
+            if bounds is not None:
+                self._blo[i] = np.array(bounds[0]) - PADDING
+                self._bhi[i] = np.array(bounds[1]) + PADDING
+                bounded += 1
+        self._wavefront = bounded >= PACKETMIN
+
+        self._background = np.array(world.background.raw)
+        self._chunk = max(1, BATCHSIZE // max(count, 1))
+
+    #
+    #   INTERSECTION KERNELS
+    #
+
+    def _spheres(self, origins, directions, sel=slice(None)):
+        co = self._scenter[sel][None, :, :] - origins[:, None, :]
+        f = dot(co, directions[:, None, :])
+        disc = f ** 2 - dot(co, co) + self._sradius[sel] ** 2
+        return f - np.sqrt(disc)
+
+    def _planes(self, origins, directions, sel=slice(None)):
+        norm = self._pnorm[sel][None, :, :]
+        cosalpha = dot(directions[:, None, :], norm)
+        op = origins[:, None, :] - self._ppoint[sel][None, :, :]
+        hits = -dot(op, norm) / cosalpha
+        hits[cosalpha == 0] = np.nan
+        return hits
+
+    def _triangles(self, origins, directions, sel=slice(None)):
+        ta, tu, tv = self._ta[sel], self._tu[sel], self._tv[sel]
+        w = origins[:, None, :] - ta[None, :, :]
+        dv = cross(directions[:, None, :], tv[None, :, :])
+        cosalpha = dot(dv, tu[None, :, :])
+
+        wu = cross(w, tu[None, :, :])
+        r = dot(dv, w) / cosalpha
+        s = dot(wu, directions[:, None, :]) / cosalpha
+
+        inside = (0 <= r) & (r <= 1) & (0 <= s) & (s <= 1) & (r + s <= 1)
+        hits = dot(wu, tv[None, :, :]) / cosalpha
+        hits[~inside | (cosalpha == 0)] = np.nan
+        return hits
+
+    #
+    #   WAVEFRONT
+    #
+
+    def _cull(self, origins, directions, maxdist):
+        """
+        Returns a boolean mask of the bodies that rays of the
+        packet may reach within maxdist. Per axis the range
+        of ray parameters within the slab of a body's bounds
+        is estimated for all origins and directions of the
+        packet at once (interval arithmetic); bodies whose
+        ranges don't overlap can't be hit by any of the rays.
+        """
+        olo, ohi = origins.min(axis=0), origins.max(axis=0)
+        dlo, dhi = directions.min(axis=0), directions.max(axis=0)
+
+        # mirror the axes the rays travel down to
+        # have non negative directions only
+        down = dhi <= 0
+        blo = np.where(down, -self._bhi, self._blo)
+        bhi = np.where(down, -self._blo, self._bhi)
+        olo, ohi = np.where(down, -ohi, olo), np.where(down, -olo, ohi)
+        dlo, dhi = np.where(down, -dhi, dlo), np.where(down, -dlo, dhi)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            nmin, nmax = blo - ohi, bhi - olo
+            enter = np.where(nmin >= 0, nmin / dhi, nmin / dlo)
+            leave = np.where(nmax >= 0, nmax / dlo, nmax / dhi)
+
+        # axes with directions of both signs don't restrict
+        mixed = (dlo < 0) & ~down
+        enter[:, mixed] = -np.inf
+        leave[:, mixed] = np.inf
+        enter[np.isnan(enter)] = -np.inf
+        leave[np.isnan(leave)] = np.inf
+
+        enter = enter.max(axis=1)
+        leave = np.minimum(leave.min(axis=1), maxdist)
+        return (enter <= leave) & (leave >= EPSILON)
+
+    def _packets(self, origins, directions, maxdist):
+        """
+        Generator that yields the rows of every packet of the
+        queue together with the kernels and the selection of
+        bodies to test them with. Without wavefront all rays
+        form one packet that is tested with all bodies.
+        """
+        if not self._wavefront or len(origins) <= PACKETSIZE:
+            yield slice(None), [
+                (idx, kernel, slice(None)) for idx, kernel in self._kernels]
+            return
+
+        maxdist = np.broadcast_to(np.asarray(maxdist, float), len(origins))
+        order = coherent(origins, directions)
+        for i in range(0, len(order), PACKETSIZE):
+            rows = order[i:i + PACKETSIZE]
+            reach = self._cull(
+                origins[rows], directions[rows], maxdist[rows].max())
+            kernels = []
+            for idx, kernel in self._kernels:
+                sel = np.flatnonzero(reach[idx])
+                if len(sel):
+                    kernels.append((idx, kernel, sel))
+            yield rows, kernels
+
+    def _distances(self, origins, directions, maxdist, exclude):
+        """
+        Returns a (N, B) matrix with the ray parameter of every
+        valid intersection and inf everywhere else. maxdist is
+        either a scalar or one distance per ray.
+        """
+        n = len(origins)
+        hits = np.full((n, len(self._bodies)), np.inf)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for rows, kernels in self._packets(origins, directions, maxdist):
+                o, d = origins[rows], directions[rows]
+                for idx, kernel, sel in kernels:
+                    if type(rows) is slice:
+                        hits[:, idx] = kernel(o, d)
+                    else:
+                        hits[rows[:, None], idx[sel]] = kernel(o, d, sel)
+
+        valid = (EPSILON <= hits) & (hits < np.asarray(maxdist)[..., None])
+        hits[~valid] = np.inf
+        if exclude is not None:
+            hits[np.arange(n), exclude] = np.inf
+        return hits
+
+    def trace(self, origins, directions, maxdist=np.inf):
+        """
+        Batched World.trace. Returns the index of the nearest
+        body (-1 if there is none) and the ray parameter for
+        every ray.
+        """
+        hits = self._distances(origins, directions, maxdist, None)
+        if not hits.shape[1]:
+            return np.full(len(origins), -1), np.full(len(origins), np.inf)
+
+        idx = np.argmin(hits, axis=1)
+        t = hits[np.arange(len(origins)), idx]
+        idx[t == np.inf] = -1
+        return idx, t
+
+    def occluded(self, origins, directions, maxdist, exclude):
+        """
+        Batched World.occluded. Returns the index of a body
+        (not necessarily the nearest) that every ray hits
+        closer than maxdist (one distance per ray) except
+        the excluded one, -1 if there is none. Rays that are
+        already blocked skip the remaining body types.
+        """
+        blockers = np.full(len(origins), -1)
+        rows = np.arange(len(origins))
+        for packet, kernels in self._packets(origins, directions, maxdist):
+            packet = rows[packet]
+            for idx, kernel, sel in kernels:
+                todo = packet[blockers[packet] < 0]
+                if not len(todo):
+                    break
+
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    hits = kernel(origins[todo], directions[todo], sel)
+
+                valid = (EPSILON <= hits) & (hits < maxdist[todo][:, None])
+                valid &= idx[sel][None, :] != exclude[todo][:, None]
+                blocked = valid.any(axis=1)
+                first = valid[blocked].argmax(axis=1)
+                blockers[todo[blocked]] = idx[sel][first]
+        return blockers
+
+    #
+    #   SHADING
+    #
+
+    def _normals(self, idx, points):
+        normals = self._normal[idx]
+        spheres = self._kind[idx] == 0
+        normals[spheres] = normalize(points[spheres] - self._center[idx[spheres]])
+        return normals
+
+    def _colorAt(self, idx, points):
+        colors = self._color[idx]
+        checker = self._checker[idx]
+        if checker.any():
+            v = points[checker] * self._checkscale[idx[checker]][:, None]
+            v = np.floor(np.abs(v) + 0.5)
+            odd = (v[:, 0] + v[:, 1] + v[:, 2]) % 2 != 0
+
+            sub = colors[checker]
+            sub[odd] = self._color2[idx[checker][odd]]
+            colors[checker] = sub
+        return colors
+
+    def report(self):
+        """
+        Returns a summary of the skipped reflections.
+        """
+        return "skipped %d of %d reflections (threshold %g%s)" % (
+            self.skipped, self.reflections, self.threshold,
+            ', russian roulette' if self.roulette else '')
+
+    def colorize(self, origins, directions, d, weights=None):
+        """
+        Batched shader.Phong.colorize. Shades all rays
+        of the current recursion step at once.
+
+        origins    -- (N, 3) array of ray origins
+        directions -- (N, 3) array of normalized ray directions
+        d          -- Recursion step. Aborts at 0
+        weights    -- (Optional) Path weights of the rays
+        """
+        idx, t = self.trace(origins, directions, float(self.world.maxdist))
+        return self.illuminate(origins, directions, idx, t, d, weights)
+
+    def illuminate(self, origins, directions, idx, t, d, weights=None):
+        """
+        Batched shader.Phong.illuminate. Shades the hits
+        found by self.trace.
+
+        origins    -- (N, 3) array of ray origins
+        directions -- (N, 3) array of normalized ray directions
+        idx, t     -- Result of self.trace
+        d          -- Recursion step. Aborts at 0
+        weights    -- (Optional) Path weights of the rays
+        """
+        color = np.empty((len(origins), 3))
+        color[:] = self._background
+
+        hit = idx >= 0
+        if not hit.any():
+            return color
+
+        idx, directions = idx[hit], directions[hit]
+        points = origins[hit] + directions * t[hit][:, None]
+        normals = self._normals(idx, points)
+
+        rows = self._rows
+        if self.touched is not None:
+            self._touch(hit, idx)
+            self._rows = rows[hit]
+        try:
+            color[hit] = self._shade(
+                idx, points, normals, self._colorAt(idx, points), directions,
+                d, None if weights is None else weights[hit])
+        finally:
+            self._rows = rows
+        return color
+
+    def _shade(self, idx, points, normals, base, directions, d, weights=None):
+        """
+        Batched shader.Phong._shade. Returns the colors of
+        the hits, tracing the shadow and reflection rays.
+        """
+        world = self.world
+        local = base * world.lightness
+
+        shininess = self._shininess[idx]
+        smoothness = self._smoothness[idx]
+        specfactor = self._specfactor[idx]
+
+        for position, lightcolor in self._lights:
+            direction = position - points
+            distance = np.sqrt(dot(direction, direction))
+            lightvec = direction / distance[:, None]
+
+            blockers = self.occluded(points, lightvec, distance, idx)
+            lit = blockers < 0
+            if self.touched is not None:
+                self._touch(~lit, blockers[~lit])
+            lit = lit[:, None]
+
+            lightc = base * (lightcolor / 0xff)
+
+            # diffus
+            cosphi = dot(normals, lightvec)
+            factor = (1 - shininess) * cosphi
+            factor[factor < 0] = 0
+            local += np.where(lit, lightc * factor[:, None], 0)
+
+            # specular
+            costheta = dot(-directions, mirror(lightvec, normals))
+            with np.errstate(invalid='ignore'):
+                factor = specfactor * costheta ** smoothness * shininess
+            factor[~(costheta > 0)] = 0
+            local += np.where(lit, lightcolor * factor[:, None], 0)
+
+        # recursive reflection handling
+        if d > 0:
+            local += self._reflect(
+                points, directions, normals, shininess, weights, d)
+        return local
+
+    def _reflect(self, points, directions, normals, shininess, weights, d):
+        """
+        Returns the reflected colors of the hits, weighted
+        by their shininess. Only the reflections above the
+        threshold (or surviving the roulette) get traced.
+        """
+        factor = shininess.copy()
+        weights = shininess.copy() if weights is None else \
+            weights * shininess
+        self.reflections += len(weights)
+
+        low = weights < self.threshold
+        if low.any():
+            p = weights[low] / self.threshold
+            if self.roulette:
+                survived = self._random.random_sample(len(p)) < p
+                # a survivor stands in for the terminated ones
+                sub = factor[low]
+                sub[survived] /= p[survived]
+                factor[low] = sub
+                weights[np.flatnonzero(low)[survived]] = self.threshold
+                low[np.flatnonzero(low)[survived]] = False
+            self.skipped += int(low.sum())
+
+        color = np.zeros((len(points), 3))
+        traced = ~low
+        if traced.any():
+            reflected = normalize(-mirror(directions[traced], normals[traced]))
+            rows = self._rows
+            if self.touched is not None:
+                self._rows = rows[traced]
+            try:
+                color[traced] = self.colorize(
+                    points[traced], reflected, d - 1, weights[traced]) * \
+                    factor[traced][:, None]
+            finally:
+                self._rows = rows
+        return color
+
+    def _touch(self, sel, idx):
+        """
+        Marks the bodies (packed indices) as touched by the
+        ray trees of the selected rays of the current step.
+        """
+        self.touched[self._rows[sel], self._ids[idx]] = True
+
+    def _clamp(self, color):
+        factor = color.max(axis=1) / float(0xff)
+        over = factor > 1
+        color[over] /= factor[over][:, None]
+        return color
+
+    def sample(self, origins, directions, gbuffer=None, pixels=None,
+               dependencies=None):
+        """
+        Batched shader.Phong.sample. Returns a (N, 3) array
+        of color values normalized to 0 - 255 and the ids
+        (@see World.bodyid) of the bodies hit first.
+
+        gbuffer      -- (Optional) gbuffer.GBuffer to record
+                        the first hits in (@see self.capture)
+        pixels       -- (Optional) Tuple of the x and y arrays
+                        of the rays pixel coordinates
+        dependencies -- (Optional) incremental.Dependencies to
+                        record the bodies every ray tree touched in
+        """
+        if dependencies is not None:
+            self.touched = np.zeros((len(origins), dependencies.count), bool)
+            self._rows = np.arange(len(origins))
+
+        try:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                idx, t = self.trace(
+                    origins, directions, float(self.world.maxdist))
+                if gbuffer is not None:
+                    self.capture(gbuffer, pixels, origins, directions, idx, t)
+                color = self.illuminate(
+                    origins, directions, idx, t, self.depth)
+            if dependencies is not None:
+                dependencies.store(pixels[0], pixels[1], self.touched)
+        finally:
+            self.touched = self._rows = None
+
+        return self._clamp(color), np.where(idx >= 0, self._ids[idx], -1)
+
+    def shade(self, origins, directions, gbuffer=None, pixels=None,
+              dependencies=None):
+        """
+        Batched shader.Phong.shade. Returns a (N, 3)
+        array of normalized uint8 color values.
+        """
+        return self.sample(
+            origins, directions, gbuffer, pixels,
+            dependencies)[0].astype(np.uint8)
+
+    def capture(self, gbuffer, pixels, origins, directions, idx, t):
+        """
+        Batched shader.Phong.capture. Records the hits
+        found by self.trace in a G-buffer.
+
+        gbuffer    -- gbuffer.GBuffer instance
+        pixels     -- Tuple of the x and y arrays of the
+                      rays pixel coordinates
+        origins    -- (N, 3) array of ray origins
+        directions -- (N, 3) array of normalized ray directions
+        idx, t     -- Result of self.trace
+        """
+        hit = idx >= 0
+        xs, ys = (np.asarray(v)[hit] for v in pixels)
+        idx, directions = idx[hit], directions[hit]
+        points = origins[hit] + directions * t[hit][:, None]
+
+        gbuffer.store(
+            xs, ys, self._ids[idx], points, self._normals(idx, points),
+            self._colorAt(idx, points), directions)
+
+    def relight(self, gbuffer, framebuffer=None):
+        """
+        Batched shader.Phong.relight. Shades a picture again
+        from its G-buffer, tracing only shadow and reflection
+        rays. Returns the framebuffer.
+
+        gbuffer     -- gbuffer.GBuffer captured by Camera.shoot
+        framebuffer -- (Optional) Framebuffer instance
+        """
+        if framebuffer is None:
+            framebuffer = Framebuffer(gbuffer.resolution)
+
+        # world ids of the bodies to their packed index, the
+        # last entry stays -1 for the pixels without a hit
+        ids = self._ids[:-1]
+        index = np.full(max(gbuffer.ids.max(), ids.max(initial=0)) + 2, -1)
+        index[ids] = np.arange(len(ids))
+        packed = index[gbuffer.ids]
+
+        pixels = np.empty((len(packed), 3), np.uint8)
+        for i in range(0, len(packed), self._chunk):
+            chunk = slice(i, i + self._chunk)
+            idx = packed[chunk]
+            hit = idx >= 0
+
+            color = np.empty((len(idx), 3))
+            color[:] = self._background
+            if hit.any():
+                idx = idx[hit]
+                points = gbuffer.points[chunk][hit]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    color[hit] = self._shade(
+                        idx, points, gbuffer.normals[chunk][hit],
+                        self._colorAt(idx, points),
+                        gbuffer.directions[chunk][hit], self.depth)
+            pixels[chunk] = self._clamp(color).astype(np.uint8)
+
+        framebuffer.blit((0, 0) + gbuffer.resolution, pixels.tobytes())
+        return framebuffer
+
+    def render(self, camera, f, s, u, eye, region=None, gbuffer=None,
+               dependencies=None):
+        """
+        Renders a whole picture. Returns a (height, width, 3)
+        uint8 array as expected by PIL.Image.fromarray.
+
+        camera       -- raytracer.Camera instance
+        f, s, u      -- Camera parameters (@see Camera.sys)
+        eye          -- Point to look from
+        region       -- (Optional) Tuple (x0, y0, x1, y1) to
+                        render only a part of the picture
+        gbuffer      -- (Optional) gbuffer.GBuffer to record
+                        the first hits in
+        dependencies -- (Optional) incremental.Dependencies to
+                        record the bodies every pixel depends on
+        """
+        if region is None:
+            region = (0, 0) + camera.resolution
+        x0, y0, x1, y1 = region
+
+        ys, xs = np.mgrid[y0:y1, x0:x1]
+        pixels = self.renderPixels(
+            camera, f, s, u, eye, xs.ravel(), ys.ravel(), gbuffer,
+            dependencies)
+        return pixels.reshape(y1 - y0, x1 - x0, 3)
+
+    def renderPixels(self, camera, f, s, u, eye, xs, ys, gbuffer=None,
+                     dependencies=None):
+        """
+        Renders single pixels of a picture. Returns a
+        (N, 3) uint8 array with their colors.
+
+        camera       -- raytracer.Camera instance
+        f, s, u      -- Camera parameters (@see Camera.sys)
+        eye          -- Point to look from
+        xs, ys       -- Integer arrays of the pixel coordinates
+        gbuffer      -- (Optional) gbuffer.GBuffer to record
+                        the first hits in
+        dependencies -- (Optional) incremental.Dependencies to
+                        record the bodies every pixel depends on
+        """
+        origins, directions = self.primaries(camera, f, s, u, eye, xs, ys)
+        track = gbuffer is not None or dependencies is not None
+        xs, ys = np.asarray(xs, int), np.asarray(ys, int)
+
+        pixels = np.empty(directions.shape, np.uint8)
+        for i in range(0, len(directions), self._chunk):
+            chunk = slice(i, i + self._chunk)
+            coords = (xs[chunk], ys[chunk]) if track else None
+            pixels[chunk] = self.shade(
+                origins[chunk], directions[chunk], gbuffer, coords,
+                dependencies)
+
+        return pixels
+
+    def renderSamples(self, camera, f, s, u, eye, xs, ys):
+        """
+        Like renderPixels but accepts sub pixel coordinates
+        and returns the unquantized colors and the ids of
+        the bodies hit first (@see self.sample).
+        """
+        origins, directions = self.primaries(camera, f, s, u, eye, xs, ys)
+
+        colors = np.empty(directions.shape)
+        ids = np.empty(len(directions), int)
+        for i in range(0, len(directions), self._chunk):
+            chunk = slice(i, i + self._chunk)
+            colors[chunk], ids[chunk] = self.sample(
+                origins[chunk], directions[chunk])
+
+        return colors, ids
+
+    def primaries(self, camera, f, s, u, eye, xs, ys):
+        """
+        Returns the origins and directions of the primary rays
+        through the given pixel coordinates (@see Camera.sweep).
+        """
+        pw = camera.width / (camera.reswidth - 1)
+        ph = camera.height / (camera.resheight - 1)
+
+        a = np.asarray(xs, float) * pw - camera.width / 2
+        b = np.asarray(ys, float) * ph - camera.height / 2
+
+        f, s, u = (np.array(v.raw) for v in (f, s, u))
+        directions = f + s * a[:, None] + u * b[:, None]
+
+        directions = normalize(directions.reshape(-1, 3))
+        origins = np.empty_like(directions)
+        origins[:] = eye.raw
+        return origins, directions
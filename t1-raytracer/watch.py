@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import json
+
+import bodies as bd
+
+
+"""
+
+Hot reloading of edited scenes (@see raytracer.watch).
+
+The scene stays in memory while its json file (and the obj
+files of its meshes) are polled for changes. A changed file
+gets parsed again and compared to the scene entry by entry,
+instead of importing everything from scratch:
+
+    - bodies whose geometry did not change keep their body
+      (and id), changed materials are applied to it
+    - bodies that are gone get removed, new entries get
+      imported; the acceleration structure is edited in
+      place (@see World.updateBodies)
+    - lights and the settings of the world get replaced if
+      they changed
+
+Bodies are matched by their json entries without the
+material, so a moved sphere counts as removed and added.
+Meshes are only loaded again if their entry or obj file
+changed.
+
+"""
+
+
+# seconds between two polls of the files
+POLL = .5
+
+# keys of the json entry of a body that make its material
+MATERIAL = ('color', 'texture', 'shininess', 'smoothness')
+
+
+def geometrykey(raw, path):
+    """
+    Returns a string identifying the geometry of the
+    json entry of a body.
+
+    raw  -- json configuration of the body
+    path -- Directory the obj files are relative to
+    """
+    geometry = dict((k, v) for k, v in raw.items() if k not in MATERIAL)
+    if raw['type'] == 'mesh':
+        geometry['mtime'] = os.path.getmtime(os.path.join(path, raw['file']))
+    return json.dumps(geometry, sort_keys=True)
+
+
+def materialkey(raw):
+    """
+    Returns a string identifying the material
+    of the json entry of a body.
+    """
+    return json.dumps(
+        dict((k, raw[k]) for k in MATERIAL if k in raw), sort_keys=True)
+
+
+def stamps(fname, config):
+    """
+    Returns the modification times of a scene file
+    and the obj files it references (None if missing).
+
+    fname  -- File name of the json configuration
+    config -- The parsed json configuration
+    """
+    path = os.path.dirname(fname)
+    files = [fname] + sorted(set(
+        os.path.join(path, raw['file']) for raw in config.get('bodies', ())
+        if raw.get('type') == 'mesh'))
+    return dict(
+        (name, os.path.getmtime(name) if os.path.exists(name) else None)
+        for name in files)
+
+
+def _material(imp, raw):
+    """
+    Returns the material of the json entry of a body
+    without applying it (@see _apply).
+
+    imp -- raytracer.Importer of the configuration
+    raw -- json configuration of the body
+    """
+    material = bd.Material(None)
+    imp.material(material, raw)
+    return material
+
+
+def _apply(material, body):
+    """
+    Copies a material built by _material to a body.
+    """
+    body.texture = material.texture
+    if material.texture is None:
+        body.color = material.color.raw
+    body.shininess = material.shininess
+    body.smoothness = material.smoothness
+
+
+class Changes(object):
+    """
+    Summary of one reload of a scene.
+    """
+
+    def __str__(self):
+        parts = []
+        for count, what in ((len(self.added), 'added'),
+                            (len(self.removed), 'removed'),
+                            (self.materials, 'with new materials')):
+            if count:
+                parts.append('%d bodies %s' % (count, what))
+        if self.lights:
+            parts.append('lights changed')
+        if self.settings:
+            parts.append('%s changed' % ', '.join(self.settings))
+        return ', '.join(parts) or 'nothing changed'
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.materials = 0
+        self.lights = False
+        # names of the changed sections (world, camera...)
+        self.settings = []
+        # acceleration structure edited in place
+        self.inplace = True
+
+
+class Scene(object):
+    """
+    A scene in memory together with the json entries
+    its bodies were imported from.
+    """
+
+    def __str__(self):
+        return "scene %s (%d bodies)" % (self.fname, len(self._entries))
+
+    def __init__(self, fname, config, world):
+        """
+        fname  -- File name of the json configuration
+        config -- The parsed json configuration
+        world  -- raytracer.World with the bodies of the
+                  configuration in the order of their ids
+        """
+        self.fname = fname
+        self.config = config
+        self._path = os.path.dirname(fname)
+        self._world = world
+
+        objs = sorted(world.bodies, key=world.bodyid)
+        self._entries = [
+            (geometrykey(raw, self._path), materialkey(raw), body)
+            for raw, body in zip(config['bodies'], objs)]
+
+    @property
+    def world(self):
+        return self._world
+
+    def update(self, imp):
+        """
+        Applies a reloaded configuration to the world.
+        Returns a Changes instance. A broken configuration
+        raises before anything of it is applied.
+
+        imp -- raytracer.Importer of the new configuration
+        """
+        config, world = imp.json, self._world
+        changes = Changes()
+
+        # geometry -> entries of the bodies that are left
+        pool = {}
+        for entry in self._entries:
+            pool.setdefault(entry[0], []).append(entry)
+
+        # everything gets built before the world is touched,
+        # a broken entry leaves the scene as it was
+        new = imp.world
+        entries, materials = [], []
+        for raw in config['bodies']:
+            key, material = geometrykey(raw, self._path), materialkey(raw)
+            left = pool.get(key)
+            if left:
+                _, before, body = left.pop(0)
+                if material != before:
+                    materials.append((body, _material(imp, raw)))
+            else:
+                body = imp.body(raw)
+                changes.added.append(body)
+            entries.append((key, material, body))
+
+        changes.materials = len(materials)
+        changes.removed = [
+            entry[2] for left in pool.values() for entry in left]
+
+        changes.lights = config['lights'] != self.config['lights']
+        if changes.lights:
+            imp.lights()
+
+        changes.settings = [
+            section for section in sorted(config)
+            if section not in ('bodies', 'lights') and
+            config[section] != self.config.get(section)]
+
+        for body, material in materials:
+            _apply(material, body)
+        if changes.added or changes.removed:
+            changes.inplace = world.updateBodies(
+                changes.added, changes.removed)
+        if changes.lights:
+            del world.lights[:]
+            for light in new.lights:
+                world.addLight(light)
+        if 'world' in changes.settings:
+            self._settings(new)
+
+        self.config = config
+        self._entries = entries
+        return changes
+
+    def _settings(self, new):
+        """
+        Copies the settings of the world section.
+        """
+        world = self._world
+        world.center = new.center.raw
+        world.lightness = new.lightness
+        world.background = new.background.raw
+        world.maxdist = new.maxdist
+        if new.accelerator != world.accelerator:
+            world.accelerator = new.accelerator
+            world.accelerate()